@@ -0,0 +1,292 @@
+"""
+Historical replay of the portfolio optimiser.
+Reruns the optimiser over stored market snapshots. Data preparation does not
+depend on positions and runs in parallel in a process pool, the solves run
+in snapshot order in a single GAMS workspace as positions of each step are
+carried forward to the next one. Held instruments dropped by the data preparation,
+ie. for missing greeks, are kept and marked at their latest mid until they are no
+longer in the snapshots. Results go to a compact table with P&L,
+trades, greeks, margin and stage timings per snapshot.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from datetime import datetime
+from optimiser import Optimiser, OptException
+from quant import margins
+from utils.logger import Logger, LogLevel
+from utils.store import RunStore
+import pandas as pd
+import numpy as np
+import argparse
+import time
+import os
+import sys
+
+# Optimiser of the worker process, kept between the snapshots
+_worker = None
+
+# Snapshots prepared ahead of the solves per worker process, bounds the prepared frames held in memory
+READ_AHEAD = 2
+
+
+def init_worker(cf: str, loglevel: LogLevel):
+    """
+    Initialises the worker process, margin model is downloaded once per worker
+    :param cf: config file path
+    :param loglevel: logging level
+    :return:
+    """
+    global _worker
+    _worker = Optimiser(cf, loglevel=loglevel)
+    _worker.opt["reduce.universe"] = "no"
+    _worker.margin_fit = margins.load_model(_worker.opt["s3storage"])
+
+
+def prepare_snapshot(dtg: str, store_path: str = None, key: str = None) -> dict:
+    """
+    Reads a snapshot and prepares it for the optimiser without positions. Runs in a worker process.
+    :param dtg: snapshot timestamp
+    :param store_path: run store path, snapshot is read from Dynamo DB if None
+    :param key: snapshot artefact in the run store
+    :return: dict with prepared data frame, mid prices of all quoted instruments of the snapshot
+     and preparation timings
+    """
+    o = _worker
+    o.timer.reset()
+    if store_path is None:
+        o.get_mkt_data_dynamo(dtg=dtg)
+    else:
+        o.df = RunStore(store_path).get(key)
+
+    quoted = o.df[pd.to_numeric(o.df["Mid"], errors="coerce").notnull()]
+    mids = dict(zip(quoted["Financial Instrument"].astype(str), quoted["Mid"].astype(float)))
+    with o.timer.stage("prepare"):
+        o.prepare_data(ignore_existing=True)
+    return {"dtg": dtg, "df": o.df, "mids": mids, "timing": o.timer.to_dict()["stages"]}
+
+
+def list_snapshots(o: Optimiser, dtg_from: str, dtg_to: str, store: RunStore = None) -> list:
+    """
+    Lists snapshots in the date range
+    :param o: optimiser for Dynamo DB access
+    :param dtg_from: earliest timestamp (yymmddHHMMSS)
+    :param dtg_to: latest timestamp (yymmddHHMMSS)
+    :param store: run store to read the snapshots from, Dynamo DB if None
+    :return: list of (dtg, artefact key) tuples in time order, key is None for Dynamo DB
+    """
+    if store is None:
+        return [(str(item), None) for item in o.list_dtg(dtg_from, dtg_to)]
+
+    res = {}
+    for r in store.list_runs():
+        if int(dtg_from) <= int(r["dtg"]) <= int(dtg_to) and "snapshot" in r["artefacts"]:
+            res[r["dtg"]] = r["artefacts"]["snapshot"]
+    return sorted(res.items())
+
+
+def carry_positions(df: pd.DataFrame, pos: dict) -> pd.DataFrame:
+    """
+    Sets the simulated positions into prepared snapshot data
+    :param df: prepared data frame
+    :param pos: dict of instrument and position
+    :return:
+    """
+    df["Position"] = df["Financial Instrument"].map(pos).fillna(0)
+    df["long"] = np.where(df["Position"] > 0, df["Position"], 0)
+    df["short"] = np.where(df["Position"] < 0, -df["Position"], 0)
+    return df
+
+
+def mark_positions(pos: dict, mids: dict, cur: dict, quoted: dict, mult: float) -> (float, dict, dict, int):
+    """
+    Marks positions to market. Positions missing from the prepared data but still quoted in the snapshot
+    are kept outside the model, positions no longer in the snapshot are closed at their last price.
+    :param pos: positions after the previous step
+    :param mids: mid prices of the previous step
+    :param cur: mid prices of the prepared data
+    :param quoted: mid prices of all quoted instruments of the snapshot
+    :param mult: contract multiplier
+    :return: P&L, positions kept outside the model, mid prices after the step and number of closed positions
+    """
+    marks = dict(mids)
+    marks.update({k: v for k, v in quoted.items() if k in pos})
+    marks.update(cur)
+    pnl = mult * sum([v * (marks.get(k, 0) - mids.get(k, marks.get(k, 0))) for k, v in pos.items()])
+    kept = {k: v for k, v in pos.items() if k not in cur and k in quoted}
+    closed = len([k for k in pos.keys() if k not in cur and k not in quoted])
+    return pnl, kept, {k: v for k, v in marks.items() if k in cur or k in kept}, closed
+
+
+def stage_times(stages: list) -> dict:
+    """
+    Sums wall times of the stage records by stage name
+    :param stages: list of timing records
+    :return: dict of "t <stage>" and seconds
+    """
+    res = {}
+    for r in stages:
+        k = "t " + r["stage"]
+        res[k] = res.get(k, 0) + r["wall"]
+    return res
+
+
+def replay_step(o: Optimiser, prep: dict, pos: dict, mids: dict, model: str, mip_fn: str) -> (dict, dict, dict):
+    """
+    Solves one snapshot with positions carried from the previous step
+    :param o: optimiser used for all the solves
+    :param prep: prepared snapshot from the worker
+    :param pos: positions after the previous step
+    :param mids: mid prices of the previous step
+    :param model: GAMS model file
+    :param mip_fn: MIP start file
+    :return: results row, positions and mid prices after the step
+    """
+    mult = float(o.opt["mult"])
+    o.timer.reset()
+    o.new_database()
+    o.df = carry_positions(prep["df"].copy(), pos)
+    o.data_date = datetime.strptime(prep["dtg"], "%y%m%d%H%M%S")
+
+    row = {"dtg": prep["dtg"]}
+
+    # Mark to market, positions missing from the snapshot are closed at their last price
+    cur = dict(zip(o.df["Financial Instrument"], o.df["Mid"]))
+    row["pnl"], kept, marks, row["expired"] = mark_positions(pos, mids, cur, prep.get("mids", {}), mult)
+    row["held out"] = len(kept)
+
+    if o.opt.getboolean("reduce.universe", fallback=True):
+        o.reduce_universe()
+
+    try:
+        o.load_mip_start(mip_fn)
+        o.write_gdx()
+        o.run_gams(model)
+        d = o.import_gdx()
+        o.add_trades_to_df(d)
+    except OptException:
+        row["status"] = "no trades"
+        row.update(stage_times(prep["timing"] + o.timer.to_dict()["stages"]))
+        return row, {k: v for k, v in pos.items() if k in cur or k in kept}, marks
+
+    o.save_mip_start(d, mip_fn)
+
+    trades = o.df["Trade"].abs().sum()
+    row["status"] = "ok"
+    row["objective"] = next(iter(d["z"].values()))
+    row["legs"] = int((o.df["Trade"] != 0).sum())
+    row["trades"] = trades
+    row["cost"] = trades * float(o.opt["trans.cost"])
+    row["pnl"] = row["pnl"] - row["cost"]
+
+    g = d["total_greeks"].set_index("s_greeks")["new"]
+    for i in ["delta", "gamma", "theta", "vega"]:
+        row[i] = g.get(i, 0)
+    row["margin"] = d["total_margin"]["val"].max() if len(d["total_margin"]) > 0 else 0
+    row["solve time"] = d["solve_stats"].get("time", float("nan"))
+    row.update(stage_times(prep["timing"] + o.timer.to_dict()["stages"]))
+
+    new_pos = o.df[o.df["NewPosition"] != 0]
+    new_pos = dict(zip(new_pos["Financial Instrument"], new_pos["NewPosition"]))
+    new_pos.update(kept)
+    return row, new_pos, marks
+
+
+def run_backtest(o: Optimiser, cf: str, snapshots: list, model: str, store_path: str = None,
+                 workers: int = None) -> pd.DataFrame:
+    """
+    Replays the optimiser over the snapshots. Snapshots are prepared in parallel ahead of the solves.
+    :param o: optimiser used for the solves
+    :param cf: config file path
+    :param snapshots: list of (dtg, artefact key) tuples in time order
+    :param model: GAMS model file
+    :param store_path: run store path, snapshots are read from Dynamo DB if None
+    :param workers: number of preparation processes, defaults to CPU count
+    :return: results table indexed by dtg
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    o.logger.log("Replaying " + str(len(snapshots)) + " snapshots")
+    mip_fn = os.path.join(o.working_dir, "backtest_mip_start.json")
+    if os.path.isfile(mip_fn):
+        os.remove(mip_fn)
+
+    rows = []
+    pos = {}
+    mids = {}
+    t = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cf, LogLevel.error)) as pool:
+        # Sliding window of preparations, each is dropped once its snapshot is solved
+        pending = deque()
+        ahead = 0
+        for n in range(len(snapshots)):
+            while ahead < len(snapshots) and ahead < n + READ_AHEAD * workers:
+                pending.append(pool.submit(prepare_snapshot, snapshots[ahead][0], store_path, snapshots[ahead][1]))
+                ahead += 1
+
+            try:
+                prep = pending.popleft().result()
+            except Exception as e:
+                o.logger.error("Snapshot " + snapshots[n][0] + " failed: " + repr(e))
+                rows.append({"dtg": snapshots[n][0], "status": "error: " + repr(e)})
+                continue
+
+            row, pos, mids = replay_step(o, prep, pos, mids, model, mip_fn)
+            rows.append(row)
+            o.logger.log(row["dtg"] + " " + row["status"] + ", P&L " + "{:.2f}".format(row["pnl"]) + ", " +
+                         str(n + 1) + "/" + str(len(snapshots)) + " in " +
+                         "{:.0f}".format(time.perf_counter() - t) + "s")
+
+    df = pd.DataFrame(rows).set_index("dtg")
+    if "pnl" in df:
+        df["cum pnl"] = df["pnl"].fillna(0).cumsum()
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimiser backtest over stored market snapshots")
+    parser.add_argument("dtg_from", help="First snapshot timestamp, yymmddHHMMSS")
+    parser.add_argument("dtg_to", help="Last snapshot timestamp, yymmddHHMMSS")
+    parser.add_argument("-c", action="store", help="Configuration file", default="config.cf")
+    parser.add_argument("-m", action="store", help="GAMS model file, latest formulation from Dynamo if not given")
+    parser.add_argument("-o", "--out", action="store", help="Output CSV for results table",
+                        default="./data/backtest.csv")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Quiet mode. Log only errors.", default=False)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging", default=False)
+    parser.add_argument("--store", action="store", help="Read snapshots from local run store instead of Dynamo DB")
+    parser.add_argument("--workers", action="store", type=int, help="Number of data preparation processes")
+
+    args = parser.parse_args()
+
+    log = LogLevel.normal
+    if args.quiet:
+        log = LogLevel.error
+    if args.verbose:
+        log = LogLevel.verbose
+    logger = Logger(log, "Backtest")
+
+    wd = os.path.abspath("./tmp/backtest/")
+    os.makedirs(wd, exist_ok=True)
+    if os.path.dirname(args.out) != "":
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    opt = Optimiser(args.c, loglevel=log, working_dir=wd)
+
+    store = RunStore(args.store) if args.store is not None else None
+    snaps = list_snapshots(opt, args.dtg_from, args.dtg_to, store)
+    if len(snaps) == 0:
+        logger.error("No snapshots between " + args.dtg_from + " and " + args.dtg_to)
+        sys.exit(1)
+
+    # Same formulation for the whole replay
+    model_fn = args.m
+    if model_fn is None:
+        model_fn = os.path.join(wd, "model.gms")
+        with open(model_fn, "w") as f:
+            f.write(opt.get_formulation())
+
+    res = run_backtest(opt, args.c, snaps, os.path.abspath(model_fn), args.store, args.workers)
+    res.to_csv(args.out)
+    logger.log("Results of " + str(len(res)) + " snapshots written to " + args.out)
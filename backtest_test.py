@@ -0,0 +1,26 @@
+"""
+Unit testing for backtest position marking
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+import backtest
+
+
+class BacktestTests(unittest.TestCase):
+    def test_mark_positions(self):
+        pos = {"A": 2, "B": -1, "C": 1}
+        mids = {"A": 1.0, "B": 2.0, "C": 3.0}
+
+        # A is prepared, B is dropped by the preparation but still quoted, C is no longer in the snapshot
+        pnl, kept, marks, closed = backtest.mark_positions(pos, mids, {"A": 1.5, "D": 0.5},
+                                                            {"A": 1.5, "B": 2.5, "D": 0.5}, 10)
+        self.assertAlmostEqual(10 * (2 * 0.5 - 1 * 0.5), pnl)
+        self.assertEqual({"B": -1}, kept)
+        self.assertEqual({"A": 1.5, "B": 2.5, "D": 0.5}, marks)
+        self.assertEqual(1, closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
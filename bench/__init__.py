@@ -0,0 +1,23 @@
+"""
+Copyright (C) 2018 Sigma Research OÜ. All rights reserved.
+"""
+
+"""
+Package implementing synthetic data, local stand-ins for external
+services and performance benchmarks for the optimiser pipeline.
+"""
+
+VERSION = {
+    'major': 0,
+    'minor': 1,
+    'micro': 0}
+
+
+def get_version_string():
+    version = '{major}.{minor}.{micro}'.format(**VERSION)
+    return version
+
+
+__version__ = get_version_string()
+
+__all__ = ["chain", "run", "stubs"]
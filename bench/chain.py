@@ -0,0 +1,104 @@
+"""
+Synthetic option chain generator.
+Produces market snapshots in the same format as the TWS snapshot scraper,
+CL futures options by default, with a volatility smile, bid/ask spreads,
+existing positions and randomly missing quotes, volatilities and greeks.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from quant import greeks
+import pandas as pd
+import numpy as np
+
+
+def smile(mny, t, atm: float = 0.35, skew: float = -0.15, curvature: float = 0.6, term: float = 0.05):
+    """
+    Implied volatility smile
+    :param mny: log moneyness, log(strike / underlying)
+    :param t: time to expiry in years
+    :param atm: at the money volatility
+    :param skew: slope of the smile
+    :param curvature: curvature of the smile
+    :param term: additional volatility for the front months
+    :return: implied volatility
+    """
+    return atm + term / np.sqrt(12 * t) + skew * mny + curvature * mny * mny
+
+
+def make_chain(rows: int = 1000, months: int = 12, spot: float = 60.0, width: float = 0.4,
+               symbol: str = "CL", trading_class: str = "LO", exchange: str = "NYMEX", start: str = "201902",
+               missing_quotes: float = 0.05, missing_vol: float = 0.02, missing_greeks: float = 0.01,
+               held: float = 0.01, seed: int = 0, **kwargs) -> pd.DataFrame:
+    """
+    Creates a synthetic market snapshot
+    :param rows: approximate number of instruments, calls and puts over all months
+    :param months: number of contract months
+    :param spot: underlying price of the front month
+    :param width: strikes range from spot * (1 - width) to spot * (1 + width)
+    :param symbol: underlying symbol
+    :param trading_class: option trading class
+    :param exchange: exchange
+    :param start: first contract month, yyyymm
+    :param missing_quotes: share of instruments without bid and ask
+    :param missing_vol: share of instruments without implied volatility
+    :param missing_greeks: share of instruments without greeks
+    :param held: share of instruments with existing positions
+    :param seed: random seed
+    :param kwargs: smile parameters, see smile()
+    :return: data frame with the columns of a TWS snapshot
+    """
+    rnd = np.random.RandomState(seed)
+    n = max(1, int(rows / months / 2))
+    step = max(0.01, round(2 * width * spot / n, 2))
+    strikes = np.round(spot * (1 - width) + step * np.arange(0, n), 2)
+
+    m0 = datetime.strptime(start, "%Y%m")
+    frames = []
+    for m in range(0, months):
+        mon = m0 + relativedelta(months=m)
+        days = 20 + 30 * m
+        und = spot * (1 + 0.005 * m)
+        for side in ["CALL", "PUT"]:
+            frames.append(pd.DataFrame({
+                "Financial Instrument": [symbol + " FOP (" + trading_class + ") " + mon.strftime("%b'%y") + " " +
+                                         "{:g}".format(k) + " " + side + " @" + exchange for k in strikes],
+                "Underlying Price": und,
+                "Strike": strikes,
+                "Side": "c" if side == "CALL" else "p",
+                "Days to Last Trading Day": days}))
+    df = pd.concat(frames, ignore_index=True)
+
+    t = df["Days to Last Trading Day"].values / 365
+    s = df["Underlying Price"].values
+    k = df["Strike"].values
+    side = df["Side"].values
+    vol = smile(np.log(k / s), t, **kwargs)
+
+    mid = np.maximum(greeks.val(s, k, 0.01, 0, vol, t, side), 0.01)
+    spread = np.maximum(0.01, np.round(mid * rnd.uniform(0.005, 0.05, len(df)), 2))
+    df["Bid"] = np.maximum(0, np.round(mid - spread / 2, 2))
+    df["Ask"] = np.round(df["Bid"] + spread, 2)
+    df["Mid"] = (df["Bid"] + df["Ask"]) / 2
+    df["Spread"] = df["Ask"] - df["Bid"]
+    df["Implied Vol. %"] = vol * 100
+    df["Delta"] = greeks.delta(s, k, 0.01, 0, vol, t, side)
+    df["Gamma"] = greeks.gamma(s, k, 0.01, 0, vol, t)
+    df["Vega"] = greeks.vega(s, k, 0.01, 0, vol, t) / 100
+    df["Theta"] = greeks.theta(s, k, 0.01, 0, vol, t, side)
+
+    # Existing positions
+    pos = np.where(rnd.uniform(size=len(df)) < held, rnd.randint(-5, 6, len(df)), 0)
+    df["Position"] = pos
+    df["Avg Price"] = np.where(pos != 0, df["Mid"], 0)
+
+    # Missing data
+    no_quote = rnd.uniform(size=len(df)) < missing_quotes
+    df.loc[no_quote & (pos == 0), ["Bid", "Ask", "Mid", "Spread"]] = np.nan
+    df.loc[rnd.uniform(size=len(df)) < missing_vol, "Implied Vol. %"] = np.nan
+    df.loc[rnd.uniform(size=len(df)) < missing_greeks, ["Delta", "Gamma", "Vega", "Theta"]] = np.nan
+
+    df["conid"] = np.arange(100000000, 100000000 + len(df))
+    return df.drop(columns=["Strike", "Side"])
@@ -0,0 +1,34 @@
+"""
+Unit testing for synthetic option chain generation
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from bench import chain
+from utils import parse
+
+
+class ChainTests(unittest.TestCase):
+    def test_chain(self):
+        df = chain.make_chain(rows=2400, months=12, seed=1)
+        self.assertEqual(2400, len(df))
+        self.assertEqual(len(df), df["Financial Instrument"].nunique())
+
+        p = parse.parse_instruments(df["Financial Instrument"])
+        self.assertFalse(p["Strike"].isna().any())
+        self.assertEqual(12, p["Contract Month"].nunique())
+
+        quoted = df[df["Bid"].notnull()]
+        self.assertTrue((quoted["Ask"] > quoted["Bid"]).all())
+        self.assertTrue(df["Bid"].isna().any())
+        self.assertTrue(df["Implied Vol. %"].isna().any())
+
+    def test_seed(self):
+        a = chain.make_chain(rows=500, seed=3)
+        b = chain.make_chain(rows=500, seed=3)
+        self.assertTrue(a.equals(b))
+
+
+if __name__ == "__main__":
+    unittest.main()
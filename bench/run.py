@@ -0,0 +1,347 @@
+"""
+Performance benchmarks for the optimiser pipeline.
+Runs each pipeline stage on synthetic option chains of different sizes with
+local stand-ins for the external services and writes a JSON report. Stages
+whose dependencies (sklearn, ibapi, GAMS) are not installed are reported as
+skipped. A report can be compared to a baseline report of an earlier commit.
+
+Usage: python -m bench.run --sizes 1000 10000 100000 -o bench.json --compare baseline.json
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from bench import chain, stubs
+from quant import greeks, universe
+from utils import parse
+from utils.logger import Logger, LogLevel
+from utils.timing import peak_rss
+import pandas as pd
+import numpy as np
+import subprocess
+import importlib
+import platform
+import datetime
+import tempfile
+import argparse
+import json
+import time
+import sys
+import os
+
+
+# Optimiser settings used for the benchmarks
+OPTIONS = {"gams": "", "account": "DU000000", "s3storage": "stub",
+           "symbol": "CL", "class": "LO", "sectype": "FOP", "currency": "USD", "exchange": "NYMEX", "mult": "1000",
+           "direction": "1", "trans.cost": "2.5", "risk.pct": "0.03",
+           "max.delta": "0.05", "max.gamma": "0.30", "min.theta": "0.20", "max.vega": "0.20", "max.speed": "0.01",
+           "alpha": "1", "min.price": "0.05", "max.price": "8.0", "max.spread": "0.08",
+           "max.pos": "6", "max.pos.tot": "40", "max.pos.mon": "6", "max.margin": "45000", "max.trades": "20",
+           "max.risk": "5", "min.days": "10", "reduce.universe": "yes",
+           "price.from": "30", "price.to": "90", "price.step": "0.5",
+           "rel.start.month": "1", "rel.step.month": "1", "months": "12"}
+
+# Default limits of instruments for the slow stages
+MAX_ROWS = {"iv": 20000, "snapshot": 20000}
+
+
+def base_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Minimal preparation of the synthetic snapshot for the stages that need parsed columns
+    :param df: synthetic snapshot
+    :return: data frame with Strike, Side, Days and Vol
+    """
+    df = df[df[["Delta", "Gamma", "Theta", "Vega"]].notnull().all(axis=1)].copy()
+    df["Bid"] = df["Bid"].fillna(0.0)
+    df["Ask"] = df["Ask"].fillna(1000)
+    df["Spread"] = df["Spread"].fillna(1000)
+    parsed = parse.parse_instruments(df["Financial Instrument"])
+    for i in ["Class", "Side", "Put", "Call", "Strike", "Contract Month"]:
+        df[i] = parsed[i]
+    df["Days"] = df["Days to Last Trading Day"] / 365
+    df["Vol"] = df["Implied Vol. %"] / 100
+    return df
+
+
+def bench_parse(df: pd.DataFrame) -> dict:
+    """
+    Instrument string parsing with an empty cache
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    parse.clear_cache()
+    t = time.perf_counter()
+    parse.parse_instruments(df["Financial Instrument"])
+    return {"parse": time.perf_counter() - t}
+
+
+def bench_greeks(df: pd.DataFrame) -> dict:
+    """
+    Higher order greeks and up and down risk
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    x = base_frame(df)
+    x["Vol"] = x["Vol"].fillna(x["Vol"].median())
+    t = time.perf_counter()
+    greeks.add_risk(x, 0.03)
+    return {"greeks": time.perf_counter() - t}
+
+
+def bench_iv(df: pd.DataFrame) -> dict:
+    """
+    Implied volatility fill with the neural net
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    from quant import nnet
+    x = base_frame(df)
+    t = time.perf_counter()
+    nnet.fit_iv(x)
+    return {"iv fill": time.perf_counter() - t}
+
+
+def bench_margins(df: pd.DataFrame) -> dict:
+    """
+    Margin estimation with the stand-in margin model
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    from quant import margins
+    x = base_frame(df)
+    t = time.perf_counter()
+    margins.add_margins(x, "stub", stubs.margin_fit())
+    return {"margins": time.perf_counter() - t}
+
+
+def bench_universe(df: pd.DataFrame) -> dict:
+    """
+    Instrument universe reduction
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    x = base_frame(df)
+    t = time.perf_counter()
+    universe.reduce(x, OPTIONS)
+    return {"universe": time.perf_counter() - t}
+
+
+def bench_curves(df: pd.DataFrame) -> dict:
+    """
+    P&L and greek curves of the existing and new positions over four horizons
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    x = base_frame(df)
+    x["Vol"] = x["Vol"].fillna(x["Vol"].median())
+    x["Mid"] = x["Mid"].fillna(0)
+    x["NewPosition"] = x["Position"] - np.sign(x["Position"])
+    t = time.perf_counter()
+    greeks.curves(x, ["NewPosition", "Position"], horizons=[0, 1, 5, "exp"])
+    return {"curves": time.perf_counter() - t}
+
+
+def bench_snapshot(df: pd.DataFrame) -> dict:
+    """
+    Snapshot scraper callbacks for the whole chain, fed by the stand-in tick feed
+    :param df: synthetic snapshot
+    :return: dict of stage and seconds
+    """
+    from tws.snapshot import Snapshot
+    s = Snapshot(config=OPTIONS, log_level=LogLevel.error)
+    feed = stubs.TickFeed(df)
+    rows = feed.chain()
+    s.new_chain(len(rows))
+    for r in rows:
+        s.requests.add(r["id"], s.ticks.add(r["id"], **{"Financial Instrument": r["Financial Instrument"]}))
+    t = time.perf_counter()
+    feed.replay(s)
+    return {"snapshot callbacks": time.perf_counter() - t}
+
+
+def bench_pipeline(df: pd.DataFrame, model: str = None) -> dict:
+    """
+    Full optimiser pipeline: data preparation, GDX build, solve and result import
+    :param df: synthetic snapshot
+    :param model: GAMS model file
+    :return: dict of stage and seconds
+    """
+    from optimiser import Optimiser
+    if OPTIONS["gams"] == "" or not os.path.exists(OPTIONS["gams"]):
+        raise ImportError("GAMS system directory not given")
+
+    wd = tempfile.mkdtemp(prefix="bench_")
+    cf = os.path.join(wd, "bench.cf")
+    with open(cf, "w") as f:
+        f.write("[data]\nmkt.table = mktData\n\n[optimiser]\n")
+        for k, v in OPTIONS.items():
+            f.write(k + " = " + v + "\n")
+
+    o = Optimiser(cf, loglevel=LogLevel.error, working_dir=wd)
+    o._dynamo = stubs.StubDynamo()
+    o.margin_fit = stubs.margin_fit()
+    o.df = df.copy()
+
+    o.prepare_data()
+    o.new_database()
+    o.write_gdx()
+    if model is not None:
+        o.run_gams(model)
+        o.import_gdx()
+
+    res = {}
+    for r in o.timer.to_dict()["stages"]:
+        res[r["stage"]] = res.get(r["stage"], 0) + r["wall"]
+    return res
+
+
+def bench_startup(df: pd.DataFrame = None) -> dict:
+    """
+    Start up time of the command line tools, measured with --help so nothing else is done
+    :param df: not used
+    :return: dict of stage and seconds
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    res = {}
+    for i in ["optimiser.py", "uploader.py", "service.py"]:
+        t = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(root, i), "--help"], cwd=root,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        res["startup " + i] = time.perf_counter() - t
+    return res
+
+
+BENCHMARKS = {"parse": bench_parse, "greeks": bench_greeks, "iv": bench_iv, "margins": bench_margins,
+              "universe": bench_universe, "curves": bench_curves, "snapshot": bench_snapshot,
+              "pipeline": bench_pipeline, "startup": bench_startup}
+
+# Benchmarks that do not depend on the chain size and are run only once
+SIZELESS = ["startup"]
+
+
+def run(sizes: list, repeat: int = 3, names: list = None, model: str = None, logger: Logger = None) -> dict:
+    """
+    Runs the benchmarks
+    :param sizes: list of chain sizes
+    :param repeat: number of repetitions, best and median time are reported
+    :param names: benchmarks to run, all if None
+    :param model: GAMS model for the pipeline benchmark, solve and import are skipped if None
+    :param logger: logger
+    :return: report dict
+    """
+    if logger is None:
+        logger = Logger(LogLevel.normal, "Benchmark")
+    if names is None:
+        names = list(BENCHMARKS.keys())
+
+    results = []
+    for n in sizes:
+        df = chain.make_chain(rows=n)
+        for name in names:
+            if name in SIZELESS and n != sizes[0]:
+                continue
+            rows = 0 if name in SIZELESS else n
+            times = {}
+            status = "ok"
+            if n > MAX_ROWS.get(name, n):
+                status = "skipped: over " + str(MAX_ROWS[name]) + " rows"
+            for i in range(0, repeat if status == "ok" else 0):
+                try:
+                    if name == "pipeline":
+                        r = bench_pipeline(df, model)
+                    else:
+                        r = BENCHMARKS[name](df)
+                except (ImportError, subprocess.CalledProcessError) as e:
+                    status = "skipped: " + str(e)
+                    break
+                for k, v in r.items():
+                    times.setdefault(k, []).append(v)
+
+            if status != "ok":
+                logger.log("{: <10}".format(name) + "{: >8}".format(rows) + "  " + status)
+                results.append({"bench": name, "stage": name, "rows": rows, "status": status})
+                continue
+
+            for k, v in times.items():
+                results.append({"bench": name, "stage": k, "rows": rows, "status": "ok", "runs": len(v),
+                                "best": min(v), "median": float(np.median(v))})
+                logger.log("{: <10}".format(name) + "{: >8}".format(rows) + "  " + "{: <20}".format(k) +
+                           "{:10.4f}".format(min(v)) + "s")
+
+    return {"meta": meta(), "peak_rss": peak_rss(), "results": results}
+
+
+def meta() -> dict:
+    """
+    Describes the code version and the environment of the benchmark run
+    :return: dict
+    """
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    versions = {}
+    for m in ["numpy", "pandas", "scipy", "sklearn", "gams", "ibapi"]:
+        try:
+            versions[m] = getattr(importlib.import_module(m), "__version__", "?")
+        except ImportError:
+            versions[m] = None
+
+    return {"commit": commit, "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "versions": versions}
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2) -> pd.DataFrame:
+    """
+    Compares median times of the report to a baseline report
+    :param report: new report
+    :param baseline: baseline report
+    :param tolerance: relative slowdown that is considered a regression
+    :return: data frame with stage, rows, both median times, ratio and regression flag
+    """
+    cols = ["stage", "rows", "median"]
+    new = pd.DataFrame([r for r in report["results"] if r["status"] == "ok"], columns=cols)
+    old = pd.DataFrame([r for r in baseline["results"] if r["status"] == "ok"], columns=cols)
+    df = pd.merge(new, old, on=["stage", "rows"], suffixes=("", " baseline"))
+    df["ratio"] = df["median"] / df["median baseline"]
+    df["regression"] = df["ratio"] > 1 + tolerance
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimiser pipeline benchmarks")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000],
+                        help="Number of instruments in the synthetic chains")
+    parser.add_argument("--bench", nargs="+", choices=list(BENCHMARKS.keys()), help="Benchmarks to run, all if none")
+    parser.add_argument("--repeat", action="store", type=int, default=3, help="Number of repetitions")
+    parser.add_argument("--gams", action="store", help="GAMS system directory for the pipeline benchmark")
+    parser.add_argument("-m", action="store", help="GAMS model file, solve and import are timed if given")
+    parser.add_argument("-o", "--out", action="store", help="Output JSON report", default="./tmp/bench.json")
+    parser.add_argument("--compare", action="store", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", action="store", type=float, default=0.2,
+                        help="Relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    log = Logger(LogLevel.normal, "Benchmark")
+    if args.gams is not None:
+        OPTIONS["gams"] = args.gams
+
+    rep = run(args.sizes, args.repeat, args.bench, args.m, log)
+    d = os.path.dirname(args.out)
+    if d != "":
+        os.makedirs(d, exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(rep, f, indent=1)
+    log.log("Report written to " + args.out)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            base = json.load(f)
+        cmp = compare(rep, base, args.tolerance)
+        for i, r in cmp.iterrows():
+            log.log("{: <20}".format(r["stage"]) + "{: >8}".format(r["rows"]) + "{:10.4f}".format(r["median"]) +
+                    "s  x" + "{:.2f}".format(r["ratio"]) + ("  REGRESSION" if r["regression"] else ""))
+        if cmp["regression"].any():
+            log.error(str(cmp["regression"].sum()) + " stages slower than the baseline")
+            sys.exit(1)
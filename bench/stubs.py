@@ -0,0 +1,180 @@
+"""
+Local stand-ins for Dynamo DB, the S3 margin model and the TWS market data feed,
+so the pipeline stages can be run and timed without external services.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import pandas as pd
+import numpy as np
+
+
+class StubTable:
+    """
+    In-memory Dynamo DB table with the subset of the boto3 Table interface used in the code
+    """
+    def __init__(self, key: str = "dtg", page: int = 100):
+        """
+        Constructor
+        :param key: hash key of the table
+        :param page: number of items returned by one scan call
+        """
+        self.key = key
+        self.page = page
+        self.items = {}
+
+    @staticmethod
+    def _ok() -> dict:
+        """
+        Successful response metadata
+        :return:
+        """
+        return {"ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def put_item(self, Item: dict) -> dict:
+        """
+        Saves an item
+        :param Item: item dict, has to contain the key
+        :return: response
+        """
+        self.items[Item[self.key]] = dict(Item)
+        return self._ok()
+
+    def get_item(self, Key: dict) -> dict:
+        """
+        Reads an item
+        :param Key: dict with the key value
+        :return: response with the item
+        """
+        res = self._ok()
+        res["Item"] = self.items[Key[self.key]]
+        return res
+
+    def scan(self, AttributesToGet=None, ExclusiveStartKey=None) -> dict:
+        """
+        Reads a page of items in key order
+        :param AttributesToGet: list of attributes, all if None
+        :param ExclusiveStartKey: last key of the previous page
+        :return: response with items and LastEvaluatedKey if there are more pages
+        """
+        keys = sorted(self.items.keys())
+        start = 0 if ExclusiveStartKey is None else keys.index(ExclusiveStartKey[self.key]) + 1
+        page = keys[start:start + self.page]
+
+        res = self._ok()
+        res["Items"] = [{a: self.items[k][a] for a in AttributesToGet} if AttributesToGet is not None
+                        else self.items[k] for k in page]
+        if start + self.page < len(keys):
+            res["LastEvaluatedKey"] = {self.key: page[-1]}
+        return res
+
+    def query(self, KeyConditionExpression) -> dict:
+        """
+        Queries items, only equality condition on the hash key is supported
+        :param KeyConditionExpression: boto3 key condition
+        :return: response with items
+        """
+        v = KeyConditionExpression.get_expression()["values"][1]
+        res = self._ok()
+        res["Items"] = [self.items[v]] if v in self.items else []
+        return res
+
+
+class StubDynamo:
+    """
+    In-memory Dynamo DB resource, assign to PortfolioStrategy._dynamo to use it instead of AWS
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.tables = {}
+
+    def Table(self, name: str) -> StubTable:
+        """
+        Returns table, creates it if necessary
+        :param name: table name
+        :return:
+        """
+        if name not in self.tables:
+            self.tables[name] = StubTable()
+        return self.tables[name]
+
+
+class StubNet:
+    """
+    Stand-in for the fitted margin neural net, smooth function of the same inputs
+    """
+    def __init__(self, sign: float = 1.0):
+        """
+        Constructor
+        :param sign: direction of the moneyness effect
+        """
+        self.sign = sign
+
+    def predict(self, x):
+        """
+        Predicts scaled margin
+        :param x: matrix of moneyness, time in years and delta
+        :return: values between -1 and 1
+        """
+        x = np.asarray(x, dtype=float)
+        return np.tanh(self.sign * 2 * x[:, 0] + 0.5 * x[:, 1] + x[:, 2])
+
+
+def margin_fit() -> dict:
+    """
+    Margin model in the format stored in S3 by margins.train_model
+    :return: dict with limits and the two nets
+    """
+    return {"limits": {"short_min": 500.0, "short_max": 9000.0, "long_min": 10.0, "long_max": 3000.0},
+            "long": StubNet(-1.0),
+            "short": StubNet(1.0),
+            "version": "stub"}
+
+
+class TickFeed:
+    """
+    Replays market data of a snapshot data frame as TWS callbacks
+    """
+    def __init__(self, df: pd.DataFrame, first_id: int = 1):
+        """
+        Constructor
+        :param df: snapshot data frame
+        :param first_id: request ID of the first instrument
+        """
+        self.df = df.reset_index(drop=True)
+        self.ids = np.arange(first_id, first_id + len(self.df))
+
+    def chain(self) -> list:
+        """
+        Request IDs and instrument names of the chain
+        :return: list of dicts
+        """
+        return [{"id": int(self.ids[i]),
+                 "Financial Instrument": r["Financial Instrument"]} for i, r in self.df.iterrows()]
+
+    def replay(self, wrapper, shuffle: bool = True, seed: int = 0):
+        """
+        Calls tickPrice (bid and ask) and tickOptionComputation of the wrapper for every instrument
+        :param wrapper: object implementing the EWrapper callbacks
+        :param shuffle: deliver instruments in random order, like TWS does
+        :param seed: random seed
+        :return: number of callbacks made
+        """
+        order = np.random.RandomState(seed).permutation(len(self.df)) if shuffle else range(0, len(self.df))
+        bid = self.df["Bid"].values
+        ask = self.df["Ask"].values
+        und = self.df["Underlying Price"].values
+        iv = self.df["Implied Vol. %"].values / 100
+        g = self.df[["Delta", "Gamma", "Vega", "Theta"]].values
+        mid = self.df["Mid"].values
+
+        n = 0
+        for i in order:
+            req_id = int(self.ids[i])
+            wrapper.tickPrice(req_id, 1, bid[i], None)
+            wrapper.tickPrice(req_id, 2, ask[i], None)
+            wrapper.tickOptionComputation(req_id, 13, iv[i], g[i, 0], mid[i], 0, g[i, 1], g[i, 2], g[i, 3], und[i])
+            n = n + 3
+        return n
@@ -0,0 +1,264 @@
+"""
+Multi-book optimisation.
+Optimises several underlyings in one go. Each book has its own configuration
+section [optimiser.<symbol>] that inherits the common [optimiser] settings.
+Chains are fetched concurrently, books are prepared and solved on a bounded
+pool of worker processes with their own GAMS workspaces and the results are
+exported as one batch. The joint margin limit max.margin.total is split between
+the books, books over it are solved again with scaled limits and results still
+over it are not exported.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from optimiser import Optimiser, OptException
+from tws import tools
+from utils.logger import Logger, LogLevel
+import pandas as pd
+import functools
+import argparse
+from utils import data
+import os
+import sys
+
+
+# Number of times the books are solved again with scaled margin limits when their total margin is over the limit
+MARGIN_RESOLVES = 2
+
+
+def book_sections(config, books: list = None) -> list:
+    """
+    Finds configuration sections of the books
+    :param config: config parser object
+    :param books: list of symbols, all [optimiser.*] sections if None
+    :return: list of section names
+    """
+    if books is not None:
+        return ["optimiser." + item for item in books]
+    return [item for item in config.sections() if item.startswith("optimiser.")]
+
+
+def margin_budget(o: Optimiser, sections: list) -> dict:
+    """
+    Splits the joint margin limit between the books according to margin.weight of each book
+    :param o: optimiser with common configuration
+    :param sections: book sections
+    :return: dict of section and its margin limit, empty if there is no joint limit
+    """
+    if "max.margin.total" not in o.opt:
+        return {}
+
+    total = float(o.opt["max.margin.total"])
+    w = {item: float(o.config[item].get("margin.weight", fallback="1")) for item in sections}
+    return {k: total * v / sum(w.values()) for k, v in w.items()}
+
+
+def book_margin(o: Optimiser, margin: float) -> float:
+    """
+    Margin limit of a book, its share of the joint limit never loosens max.margin of the book itself
+    :param o: optimiser of the book
+    :param margin: share of the joint margin limit, None if there is no joint limit
+    :return: margin limit, None to use max.margin of the book
+    """
+    if margin is None or "max.margin" not in o.opt:
+        return margin
+    return min(float(o.opt["max.margin"]), margin)
+
+
+def fetch_book(cf: str, section: str, args, loglevel: LogLevel) -> pd.DataFrame:
+    """
+    Gets market data for a book. Runs in a thread, TWS sessions need distinct id in each book section.
+    :param cf: config file path
+    :param section: book section
+    :param args: command line arguments
+    :param loglevel: logging level
+    :return: market data frame
+    """
+    o = Optimiser(cf, loglevel=loglevel, section=section)
+    if args.tws:
+        o.get_mkt_data_snapshot(export_dynamo=args.db)
+    elif "input" in o.opt:
+        o.get_mkt_data_csv(o.opt["input"])
+    else:
+        o.get_mkt_data_dynamo(dtg=o.opt.get("dtg"))
+    return o.df
+
+
+def solve_book(cf: str, section: str, df: pd.DataFrame, model: str, margin: float,
+               ignore_existing: bool, loglevel: LogLevel, prepared: bool = False) -> dict:
+    """
+    Prepares data and solves the model for a book. Runs in a worker process.
+    :param cf: config file path
+    :param section: book section
+    :param df: market data frame
+    :param model: GAMS model file, latest formulation if None
+    :param margin: margin limit for the book, None to use max.margin of the book
+    :param ignore_existing: whether we ignore existing positions
+    :param loglevel: logging level
+    :param prepared: whether df is already prepared, then only the GDX is written
+    :return: dict with results and the prepared data frame, None in "res" if nothing to trade
+    """
+    wd = os.path.abspath(os.path.join("./tmp/books", section))
+    os.makedirs(wd, exist_ok=True)
+
+    o = Optimiser(cf, loglevel=loglevel, working_dir=wd, section=section)
+    o.df = df
+    margin = book_margin(o, margin)
+    if margin is not None:
+        o.opt["max.margin"] = str(margin)
+
+    o.load_mip_start(os.path.join(wd, "mip_start.json"))
+    if prepared:
+        o.write_gdx()
+    else:
+        o.create_gdx(ignore_existing)
+    df = o.df.copy()
+    o.run_gams(model)
+    d = o.import_gdx()
+
+    try:
+        o.add_trades_to_df(d)
+    except OptException:
+        return {"section": section, "res": None, "prepared": df, "timing": o.timer.to_dict()}
+    o.save_mip_start(d, os.path.join(wd, "mip_start.json"))
+
+    return {"section": section, "res": d, "df": o.df, "prepared": df, "timing": o.timer.to_dict(),
+            "curves": o.curves}
+
+
+def solve_books(cf: str, books: dict, model: str, budget: dict, ignore_existing: bool, loglevel: LogLevel,
+                workers: int = None, prepared: bool = False) -> list:
+    """
+    Solves the books in parallel worker processes
+    :param cf: config file path
+    :param books: dict of section and market data frame
+    :param model: GAMS model file
+    :param budget: dict of section and margin limit
+    :param ignore_existing: whether we ignore existing positions
+    :param loglevel: logging level
+    :param workers: number of worker processes, number of CPUs if None
+    :param prepared: whether the market data frames are already prepared
+    :return: list of solve_book results
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_book, cf, k, v, model, budget.get(k), ignore_existing, loglevel, prepared)
+                   for k, v in books.items()]
+        return [item.result() for item in futures]
+
+
+def joint_margin(results: list) -> float:
+    """
+    Total margin of the solved books
+    :param results: list of solve_book results
+    :return: margin
+    """
+    return sum([r["res"]["total_margin"]["val"].max() for r in results if r["res"] is not None])
+
+
+def export_batch(main: Optimiser, books: dict, args):
+    """
+    Exports results of all books as one batch, exports run concurrently
+    :param main: optimiser with common configuration, runs the exports
+    :param books: dict of section and tuple of optimiser and its results
+    :param args: command line arguments
+    :return: data frame with export statuses
+    """
+    def export_csv():
+        basket = pd.concat([o.make_basket() for o, res in books.values()], ignore_index=True)
+        basket.to_csv(args.csv, index=False)
+        data.remove_last_csv_newline(args.csv)
+
+    def export_xml():
+        if main.contract_ids is None:
+            main.contract_ids = tools.get_contract_ids("instruments")
+        tools.export_portfolio_xml(pd.concat([o.df for o, res in books.values()], ignore_index=True), args.xml,
+                                   loglevel=main.loglevel, ids=main.contract_ids)
+
+    sinks = {}
+    if args.db:
+        for k, (o, res) in books.items():
+            sinks["dynamo " + k] = functools.partial(o.export_results_dynamo, res)
+    if args.csv:
+        sinks["csv"] = export_csv
+    if args.xml:
+        sinks["xml"] = export_xml
+    return main.export_results(sinks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-book portfolio optimiser")
+    parser.add_argument("books", nargs="*", help="Book symbols, all [optimiser.*] sections if none given")
+    parser.add_argument("-c", action="store", help="Configuration file", default="config.cf")
+    parser.add_argument("-m", action="store", help="GAMS model file, latest formulation from Dynamo if not given")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Quiet mode. Log only errors.", default=False)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging", default=False)
+    parser.add_argument("--tws", action="store_true", help="Import market data from TWS", default=False)
+    parser.add_argument("--db", action="store_true", help="Export optimisation results to Dynamo DB", default=False)
+    parser.add_argument("--xml", action="store", help="Export basket as TWS compatible XML")
+    parser.add_argument("--csv", action="store", help="Export basket as TWS compatible CSV")
+    parser.add_argument("--workers", action="store", type=int, help="Number of solver processes")
+    parser.add_argument("--ignore_existing", action="store_true",
+                        help="Ignore existing positions in dataset", default=False)
+
+    args = parser.parse_args()
+
+    log = LogLevel.normal
+    if args.quiet:
+        log = LogLevel.error
+    if args.verbose:
+        log = LogLevel.verbose
+    logger = Logger(log, "Books")
+
+    main = Optimiser(args.c, loglevel=log)
+    sections = book_sections(main.config, args.books if len(args.books) > 0 else None)
+    if len(sections) == 0:
+        logger.error("No books configured")
+        sys.exit(1)
+    budget = margin_budget(main, sections)
+
+    # Same formulation for all books
+    model_fn = args.m
+    if model_fn is None:
+        model_fn = os.path.abspath("./tmp/books/model.gms")
+        os.makedirs(os.path.dirname(model_fn), exist_ok=True)
+        with open(model_fn, "w") as f:
+            f.write(main.get_formulation())
+
+    logger.log("Fetching data for " + str(len(sections)) + " books")
+    with ThreadPoolExecutor(max_workers=len(sections)) as pool:
+        books_by_section = dict(zip(sections, pool.map(lambda x: fetch_book(args.c, x, args, log), sections)))
+
+    logger.log("Solving books")
+    limit = float(main.opt["max.margin.total"]) if len(budget) > 0 else None
+    for i in range(MARGIN_RESOLVES + 1):
+        results = solve_books(args.c, books_by_section, os.path.abspath(model_fn), budget, args.ignore_existing,
+                              log, args.workers, prepared=i > 0)
+        total_margin = joint_margin(results)
+        if limit is None:
+            break
+        logger.log("Total margin of all books " + "{:.0f}".format(total_margin) + ", limit " + "{:.0f}".format(limit))
+        if total_margin <= limit or i == MARGIN_RESOLVES:
+            break
+        # Data of the books is prepared once, the solves again only rewrite the GDX with the new limits
+        books_by_section = {r["section"]: r["prepared"] for r in results}
+        budget = {k: v * limit / total_margin for k, v in budget.items()}
+        logger.log("Solving books again with margin limits scaled by " + "{:.3f}".format(limit / total_margin))
+
+    if limit is not None and total_margin > limit:
+        logger.error("Joint margin limit exceeded, results are not exported")
+        sys.exit(1)
+
+    # Results are loaded into optimisers of the books for the exports
+    books = {}
+    for r in results:
+        if r["res"] is None:
+            logger.log("No trades for " + r["section"])
+            continue
+        o = Optimiser(args.c, loglevel=log, section=r["section"])
+        o.df = r["df"]
+        o.curves = r["curves"]
+        o.opt_summary(r["res"])
+        books[r["section"]] = (o, r["res"])
+
+    export_batch(main, books, args)
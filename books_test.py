@@ -0,0 +1,78 @@
+"""
+Unit testing for multi-book batch exports
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from optimiser import Optimiser
+from argparse import Namespace
+import pandas as pd
+import tempfile
+import books
+import os
+
+
+CONFIG = """
+[optimiser]
+symbol=   CL
+sectype=  FOP
+exchange= NYMEX
+currency= USD
+account=  U1
+mult=     1000
+
+[optimiser.CL]
+
+[optimiser.NG]
+symbol=   NG
+"""
+
+
+class BooksTests(unittest.TestCase):
+    def test_export_csv(self):
+        wd = tempfile.mkdtemp()
+        cf = os.path.join(wd, "config.cf")
+        with open(cf, "w") as f:
+            f.write(CONFIG)
+
+        res = {}
+        for k, trade in [("optimiser.CL", [1, 0]), ("optimiser.NG", [-2, 0])]:
+            o = Optimiser(cf, section=k)
+            o.df = pd.DataFrame({"Trade": trade, "Contract Month": [201902, 201903], "Strike": [52.55, 50.0],
+                                 "Side": ["c", "p"], "Mid": [1.234, 0.5]})
+            res[k] = (o, {})
+
+        args = Namespace(db=False, csv=os.path.join(wd, "basket.csv"), xml=None)
+        status = books.export_batch(Optimiser(cf), res, args)
+        self.assertEqual([True], status["ok"].tolist())
+
+        basket = pd.read_csv(args.csv)
+        self.assertEqual(["BUY", "SELL"], basket["Action"].tolist())
+        self.assertEqual(["CL", "NG"], basket["Symbol"].tolist())
+        self.assertEqual([52.55, 52.55], basket["Strike"].tolist())
+        with open(args.csv) as f:
+            self.assertFalse(f.read().endswith("\n"))
+
+    def test_joint_margin(self):
+        results = [{"section": "optimiser.CL", "res": {"total_margin": pd.DataFrame({"val": [30000.0]})}},
+                   {"section": "optimiser.NG", "res": None},
+                   {"section": "optimiser.HO", "res": {"total_margin": pd.DataFrame({"val": [25000.5]})}}]
+        self.assertEqual(55000.5, books.joint_margin(results))
+        self.assertEqual(0, books.joint_margin([]))
+
+    def test_book_margin(self):
+        wd = tempfile.mkdtemp()
+        cf = os.path.join(wd, "config.cf")
+        with open(cf, "w") as f:
+            f.write(CONFIG + "max.margin= 40000\n")
+
+        o = Optimiser(cf, section="optimiser.NG")
+        self.assertEqual(40000, books.book_margin(o, 60000))
+        self.assertEqual(30000, books.book_margin(o, 30000))
+        self.assertIsNone(books.book_margin(o, None))
+        self.assertEqual(60000, books.book_margin(Optimiser(cf, section="optimiser.CL"), 60000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ Author: Peeter Meos
 Date: 15. December 2018
 """
 from tws.tws import TwsTool
+from tws.contracts import ContractCache
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from ibapi.contract import ContractDetails
@@ -37,6 +38,7 @@ class IdScraper(TwsTool):
         self.strikes = instrument.make_strike_chain(start_strike, end_strike, add_d["strike_step"])
         self.months = []
         self.data = []
+        self.contracts = ContractCache(self.opt.get("contracts.path", fallback="./tmp/contracts.db"))
 
         m1 = int(self.opt["rel.start.month"])
         m2 = int(self.opt["months"])
@@ -51,10 +53,15 @@ class IdScraper(TwsTool):
         """
         self.logger.log("Creating option chain and requesting details")
         o = self.nextId
+        cached = self.contracts.load(self.c.symbol, self.c.tradingClass)
+        grid = self.request_grid(self.c, self.months, self.strikes,
+                                 self.opt.getboolean("chain.discovery", fallback=True),
+                                 self.opt.get("chain.path", fallback="./tmp/chains/"))
 
-        for m in self.months:
+        for m, strikes in grid.items():
             self.logger.log("We are at month " + m)
-            for j in self.strikes:
+            for j in strikes:
+                j = "{:g}".format(j)
                 for k in ["P", "C"]:
                     self.c.lastTradeDateOrContractMonth = m
                     self.c.strike = j
@@ -69,8 +76,13 @@ class IdScraper(TwsTool):
                                       "side": self.c.right,
                                       "strike": self.c.strike,
                                       "conid": 0})
-                    self.reqContractDetails(o, contract=self.c)
-                    time.sleep(1/40)
+                    d = cached.get(ContractCache.key(self.c.symbol, self.c.tradingClass, m, j, k))
+                    if d is None:
+                        self.pace()
+                        self.reqContractDetails(o, contract=self.c)
+                    else:
+                        self.data[-1]["conid"] = d["conid"]
+                        self.data[-1]["contr_month"] = d["last_trade"]
                     o = o + 1
 
     def contractDetails(self, req_id: int, contract_details: ContractDetails):
@@ -85,6 +97,10 @@ class IdScraper(TwsTool):
             if m["id"] == req_id:
                 m["conid"] = contract_details.contract.conId
                 m["contr_month"] = contract_details.contract.lastTradeDateOrContractMonth
+                self.contracts.put(m["symbol"], m["class"], m["expiry"], m["strike"], m["side"],
+                                   contract_details.contract.conId,
+                                   contract_details.contract.lastTradeDateOrContractMonth,
+                                   contract_details.realExpirationDate)
 
     def wait_for_finish(self):
         """
@@ -99,6 +115,7 @@ class IdScraper(TwsTool):
                 if m["conid"] == 0:
                     have_all = False
             time.sleep(0.5)
+        self.contracts.flush()
         self.logger.log("All data received, proceeding")
 
     def postprocess(self):
@@ -4,8 +4,6 @@ Code for handling GAMS optimisation code
 Author: Peeter Meos
 Date: 10. December 2018
 """
-import boto3
-from boto3.dynamodb.conditions import Key
 import pandas as pd
 from utils.logger import Logger, LogLevel
 
@@ -18,6 +16,9 @@ def get_code(tbl: str, version: int = None, loglevel=LogLevel.normal):
     :param loglevel:
     :return: list of code (string) and options file (string)
     """
+    from boto3.dynamodb.conditions import Key
+    import boto3
+
     log = Logger(loglevel, name="GAMS code import")
     db = boto3.resource('dynamodb', region_name='us-east-1',
                         endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
@@ -63,6 +64,7 @@ def upload_code(tbl: str, fn: str, opt: str = None, version=None):
         opts = " "
 
     # Open the data table and insert item
+    import boto3
     db = boto3.resource('dynamodb', region_name='us-east-1',
                         endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
     table = db.Table(tbl)
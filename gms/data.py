@@ -4,12 +4,11 @@ Utility functions for GAMS GDX creation
 Author: Peeter Meos
 Date: 3. December 2018
 """
-from gams import GamsDatabase, GamsParameter
 import pandas as pd
 import json
 
 
-def create_parameter(db: GamsDatabase, name, desc, uel, form, val):
+def create_parameter(db: "GamsDatabase", name, desc, uel, form, val):
     """
     Creates multi dimensional parameter array for GAMS GDX export
     :param db: GAMS database object
@@ -20,6 +19,7 @@ def create_parameter(db: GamsDatabase, name, desc, uel, form, val):
     :param val: value object
     :return: Nothing
     """
+    from gams import GamsParameter
     v = GamsParameter(db, name, len(uel), desc)
     if form == "full":
         lst = list(uel[0])
@@ -32,7 +32,7 @@ def create_parameter(db: GamsDatabase, name, desc, uel, form, val):
     return v
 
 
-def create_scalar(db: GamsDatabase, name, desc, val):
+def create_scalar(db: "GamsDatabase", name, desc, val):
     """
     Creates a GDX structure to represent a scalar
     :param db GAMS database
@@ -48,7 +48,7 @@ def create_scalar(db: GamsDatabase, name, desc, val):
     return v
 
 
-def create_set(db: GamsDatabase, name, desc, val, dim=1):
+def create_set(db: "GamsDatabase", name, desc, val, dim=1):
     """
     Creates GAMS set for GDX export
     :param db: Target GAMS database
@@ -64,7 +64,7 @@ def create_set(db: GamsDatabase, name, desc, val, dim=1):
         v.add_record(str(i))
 
 
-def read_gdx_param(db: GamsDatabase, tbl: str) -> pd.DataFrame:
+def read_gdx_param(db: "GamsDatabase", tbl: str) -> pd.DataFrame:
     """
     Reads a table from GDX
     :param db: GAMS Database
@@ -85,7 +85,7 @@ def read_gdx_param(db: GamsDatabase, tbl: str) -> pd.DataFrame:
     return pd.read_json(json.dumps(lst), orient="records")
 
 
-def read_gdx_var(db: GamsDatabase, var: str) -> dict:
+def read_gdx_var(db: "GamsDatabase", var: str) -> dict:
     """
     Reads a variable from GDX
     :param db: GAMS database
@@ -94,3 +94,18 @@ def read_gdx_var(db: GamsDatabase, var: str) -> dict:
     """
     d = dict((tuple(rec.keys), rec.level) for rec in db[var])
     return d
+
+
+def has_symbol(db: "GamsDatabase", name: str) -> bool:
+    """
+    Checks whether a symbol exists in GDX, older formulations may not export all of them
+    :param db: GAMS database
+    :param name: symbol name
+    :return: True if symbol is present
+    """
+    from gams import GamsException
+    try:
+        db.get_symbol(name)
+    except GamsException:
+        return False
+    return True
@@ -16,6 +16,8 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import boto3
 from tws.tws import TwsTool
+from tws.contracts import ContractCache
+from tws import selection
 import configparser
 from utils import instrument
 
@@ -59,6 +61,8 @@ class MarginCalc(TwsTool):
         self.ul.currency = self.cont.currency
         self.ul.secType = self.opt["sectype.ul"]
 
+        self.contracts = ContractCache(self.opt.get("contracts.path", fallback="./tmp/contracts.db"))
+
     def connect_tws(self):
         """
         Connect override
@@ -75,19 +79,32 @@ class MarginCalc(TwsTool):
         :return:
         """
 
+        grid = self.request_grid(self.cont, self.months, self.strikes,
+                                 self.opt.getboolean("chain.discovery", fallback=True),
+                                 self.opt.get("chain.path", fallback="./tmp/chains/"))
+
+        # Instruments the snapshots found worth requesting
         sides = ["c", "p"]
+        plan, skipped = selection.select(
+            grid, sides, selection.QuoteHistory(self.opt.get("select.path", fallback="./tmp/quotes/")).load(
+                self.cont.symbol, self.cont.tradingClass),
+            bands=selection.parse_bands(self.opt.get("select.band", fallback="")),
+            min_delta=float(self.opt.get("select.min.delta", fallback="0")),
+            max_misses=int(self.opt.get("select.misses", fallback="0")),
+            recheck=int(self.opt.get("select.recheck", fallback="5")))
+        self.logger.log(selection.summary(skipped))
+
         o = int(self.nextId)
-        for m in self.months:
-            for i in self.strikes:
-                for j in sides:
-                    self.chain.append({"id_long": o,
-                                       "id_short": o + 1,
-                                       "strike": i,
-                                       "side": j,
-                                       "expiry": m,
-                                       "delta_bid": 0,
-                                       "delta_ask": 0})
-                    o = o + 2
+        for m, items in plan.items():
+            for i, j in items:
+                self.chain.append({"id_long": o,
+                                   "id_short": o + 1,
+                                   "strike": "{:g}".format(i),
+                                   "side": j,
+                                   "expiry": m,
+                                   "delta_bid": 0,
+                                   "delta_ask": 0})
+                o = o + 2
 
         # And same for futures
         for m in self.months:
@@ -104,12 +121,11 @@ class MarginCalc(TwsTool):
         self.logger.log("Requesting market data for underlyings")
         for i in self.ul_chain:
             self.ul.lastTradeDateOrContractMonth = i["expiry"]
-            self.reqMktData(i["id"], self.ul, genericTickList="",
-                            snapshot=True, regulatorySnapshot=False,
-                            mktDataOptions=[])
+            self.req_snapshot(i["id"], self.ul)
 
         # Request data for option chain
         self.logger.log("Requesting market and margin data for option chain")
+        cached = self.contracts.load(self.cont.symbol, self.cont.tradingClass)
         for i in self.chain:
             self.cont.right = i["side"].upper()
             self.cont.strike = i["strike"]
@@ -122,21 +138,22 @@ class MarginCalc(TwsTool):
 
             order.orderId = i["id_long"]
             order.action = "BUY"
+            self.pace()
             self.placeOrder(i["id_long"], self.cont, order)
-            time.sleep(1/50)
-            self.reqMktData(i["id_long"], self.cont, genericTickList="",
-                            snapshot=True, regulatorySnapshot=False,
-                            mktDataOptions=[])
-            time.sleep(1/50)
-            self.reqContractDetails(i["id_long"], self.cont)
+            self.req_snapshot(i["id_long"], self.cont)
+            d = cached.get(ContractCache.key(self.cont.symbol, self.cont.tradingClass, i["expiry"], i["strike"],
+                                             i["side"]))
+            if d is None:
+                self.pace()
+                self.reqContractDetails(i["id_long"], self.cont)
+            else:
+                i["lastTradingDay"] = d["real_expiry"]
 
             order.orderId = i["id_short"]
             order.action = "SELL"
+            self.pace()
             self.placeOrder(i["id_short"], self.cont, order)
-            time.sleep(1/50)
-            self.reqMktData(i["id_short"], self.cont, genericTickList="",
-                            snapshot=True, regulatorySnapshot=False,
-                            mktDataOptions=[])
+            self.req_snapshot(i["id_short"], self.cont)
 
     def contractDetails(self, req_id: int, contract_details: ContractDetails):
         """
@@ -149,6 +166,10 @@ class MarginCalc(TwsTool):
         for i in self.chain:
             if req_id == i["id_long"]:
                 i["lastTradingDay"] = contract_details.realExpirationDate
+                self.contracts.put(self.cont.symbol, self.cont.tradingClass, i["expiry"], i["strike"], i["side"],
+                                   contract_details.contract.conId,
+                                   contract_details.contract.lastTradeDateOrContractMonth,
+                                   contract_details.realExpirationDate)
 
     def tickPrice(self, req_id: int, tick_type: TickType, price: float,
                   attrib: TickAttrib):
@@ -224,6 +245,7 @@ class MarginCalc(TwsTool):
         :return:
         """
         self.logger.log("Waiting for dataset completion")
+        self.wait_in_flight()
         found = False
         while not found:
             found = True
@@ -231,6 +253,7 @@ class MarginCalc(TwsTool):
                 if "marginLong" not in i or "marginShort" not in i:
                     found = False
             time.sleep(0.5)
+        self.contracts.flush()
         self.logger.log("Done")
 
     def summarise_chain(self):
@@ -4,23 +4,32 @@ Portfolio optimisation code ported mostly from R
 Author: Peeter Meos, Sigma Research OÜ
 Date: 2. December 2018
 """
-from gams import *
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from strategy import PortfolioStrategy
-from quant import greeks, margins, nnet
+from quant import greeks, margins, nnet, universe
 from gms import data, code
-import boto3
 import json
 import utils
-from utils import logger, instrument
+from utils import logger, parse
 from utils.logger import LogLevel
-from tws import tools, snapshot, tws
-from ibapi.order import Order
+from utils.store import RunStore
+from utils.cache import SolutionCache
+from utils.timing import timed
+from tws import tools
 import argparse
+import copy
+import time
 import os
 import sys
+import re
+import fcntl
+
+
+# $gdxin statement with a file name, older formulations read their input from the fixed _gams_py_gdb0.gdx
+GDXIN = re.compile(r"^([ \t]*\$gdxin[ \t]+)(\S+)", re.IGNORECASE | re.MULTILINE)
 
 
 class OptException(Exception):
@@ -31,21 +40,64 @@ class OptException(Exception):
 
 
 class Optimiser(PortfolioStrategy):
-    def __init__(self, cf: str, loglevel: LogLevel = LogLevel.normal):
+    def __init__(self, cf: str, loglevel: LogLevel = LogLevel.normal, working_dir: str = "./tmp/",
+                 section: str = "optimiser"):
         """
-        Constructor initialises GAMS workspace and reads configuration
+        Constructor reads configuration, GAMS workspace is initialised when first needed
         :param cf: config file path
+        :param loglevel: logging level
+        :param working_dir: GAMS working directory, separate runs need separate directories
+        :param section: configuration section, options missing from it are taken from [optimiser]
         """
         super().__init__("Optimiser", loglevel=loglevel)
 
         # Get the config
-        if not os.path.isfile(conf_file):
-            self.logger.error("Cannot find config file " + conf_file)
+        if not os.path.isfile(cf):
+            self.logger.error("Cannot find config file " + cf)
             raise OSError
 
         self.config.read(cf)
-        gams_path = self.config["optimiser"]["gams"]
-        self.opt = self.config["optimiser"]
+        if section not in self.config:
+            self.logger.error("Cannot find section " + section + " in config file " + cf)
+            raise OptException
+
+        # Book specific sections inherit the common optimiser settings
+        self.opt = self.config[section]
+        for k, v in self.config["optimiser"].items():
+            if k not in self.opt:
+                self.opt[k] = v
+
+        # Market data snapshots in Dynamo are read for the symbol of the book only
+        self.inst = self.opt.get("symbol", fallback="")
+
+        self.working_dir = working_dir
+        self._ws = None
+        self.db = None
+
+        # P&L and greek curves of the new and current positions, see greeks.curves
+        self.curves = None
+
+        # Target positions from the previous run, used as MIP start
+        self.mip_start = None
+
+        # Models and connections that can be kept between runs, created on demand when None
+        self.model_code = None
+        self.margin_fit = None
+        self.iv_model = None
+        self.contract_ids = None
+        self.snap = None
+
+    @property
+    def ws(self):
+        """
+        GAMS workspace, created on first use so that exports and plots of stored runs do not need GAMS
+        :return: GamsWorkspace
+        """
+        if self._ws is not None:
+            return self._ws
+
+        from gams import GamsWorkspace, DebugLevel
+        gams_path = self.opt["gams"]
 
         # Init GAMS
         if self.loglevel == logger.LogLevel.normal:
@@ -59,13 +111,18 @@ class Optimiser(PortfolioStrategy):
             self.logger.error("Cannot find GAMS path " + gams_path)
             raise OSError
 
-        self.ws = GamsWorkspace(system_directory=gams_path,
-                                debug=gams_debug_level,
-                                working_directory="./tmp/")
-        self.db = self.ws.add_database()
+        self._ws = GamsWorkspace(system_directory=gams_path,
+                                 debug=gams_debug_level,
+                                 working_directory=self.working_dir)
+        return self._ws
 
-        self.df_greeks = pd.DataFrame()
-        self.df_greeks_before = pd.DataFrame()
+    def new_database(self):
+        """
+        Creates fresh GAMS database for the model input. It has a fixed name, so it cannot take
+        the automatically generated name of the model output, and the model reads it through %gdxincname%.
+        :return:
+        """
+        self.db = self.ws.add_database(database_name="spo_in", in_model_name="gdxincname")
 
     def get_opt(self, op: str):
         """
@@ -87,27 +144,39 @@ class Optimiser(PortfolioStrategy):
         :param: ignore_existing: whether  we ignore existing positions
         :return:
         """
+        self.prepare_data(ignore_existing)
+        self.write_gdx()
+
+    @timed("prepare")
+    def prepare_data(self, ignore_existing=False):
+        """
+        Cleans the market data snapshot and adds greeks, margins and risk figures needed by the model
+        :param ignore_existing: whether  we ignore existing positions
+        :return:
+        """
         self.logger.log("Preparing optimiser input")
 
         self.df.loc[pd.isna(self.df["Bid"]), "Bid"] = 0.0
         self.df.loc[pd.isna(self.df["Ask"]), "Ask"] = 1000
         self.df.loc[pd.isna(self.df["Spread"]), "Spread"] = 1000
 
-        self.df = self.df[pd.notnull(self.df['Delta'])]
-        self.df = self.df[pd.notnull(self.df['Gamma'])]
-        self.df = self.df[pd.notnull(self.df['Theta'])]
-        self.df = self.df[pd.notnull(self.df['Vega'])]
+        # Single mask for the rows with all greeks present instead of a copy per filter
+        self.df = self.df[self.df[['Delta', 'Gamma', 'Theta', 'Vega']].notnull().all(axis=1)]
 
         # If fresh portfolio, set positions to 0
         if ignore_existing:
             self.df["Position"] = 0
 
-        # Add sides
+        # Strike, side, class and contract month from the instrument string
         self.df['Financial Instrument'] = self.df['Financial Instrument'].astype(str)
-        self.df['Side'] = np.where(self.df["Financial Instrument"].str.contains("PUT"), "p", "c")
-
-        self.df['Put'] = np.where(self.df['Side'] == "p", 1, 0)
-        self.df['Call'] = np.where(self.df['Side'] == "c", 1, 0)
+        parsed = parse.parse_instruments(self.df['Financial Instrument'])
+        bad = ~self.df.index.isin(parsed.index)
+        if bad.any():
+            self.logger.error("Dropping " + str(int(bad.sum())) + " instruments not in the expected format: " +
+                              ", ".join(self.df.loc[bad, 'Financial Instrument'].unique()[0:5]))
+            self.df = self.df[~bad]
+        for i in ['Class', 'Side', 'Put', 'Call', 'Strike', 'Contract Month']:
+            self.df[i] = parsed[i]
 
         self.df['long'] = np.where(self.df['Position'] > 0, self.df['Position'], 0)
         self.df['short'] = np.where(self.df['Position'] < 0, -self.df['Position'], 0)
@@ -118,71 +187,53 @@ class Optimiser(PortfolioStrategy):
         # This is necessary for expiry days, so the greeks are at least somewhat finite
         self.df['Days'] = np.where(self.df['Days'] == 0, 0.00001, self.df['Days'])
 
-        # Strikes
-        self.df['Strike'] = self.df['Financial Instrument'].str.split(" ").map(lambda x: x[4])
-        self.df['Strike'] = self.df['Strike'].astype(float)
-
-        # Volatility in percent
-        self.df['Vol'] = self.df['Implied Vol. %'].str.replace('%', '')
-        self.df['Vol'] = self.df['Vol'].astype(float) / 100
+        # Volatility in percent, older snapshots have it as a string with percent sign
+        vol = self.df['Implied Vol. %']
+        if vol.dtype == object:
+            vol = pd.to_numeric(vol.astype(str).str.rstrip('%'), errors="coerce")
+        self.df['Vol'] = vol / 100
 
         # Use neural net to fix the missing volatility
         if self.df['Vol'].isna().any():
-            self.df = nnet.fit_iv(self.df)
-
-        # Create field for contract month
-        self.df['Contract Month'] = \
-            [datetime.strptime(item, "%b'%y").strftime("%Y%m") for item in self.df['Financial Instrument'].
-                str.split(" ").map(lambda x: x[3])]
-
-        # Add greeks
-        self.df['Underlying Price'] = self.df['Underlying Price'].as_matrix()
-        self.df['Strike'] = self.df['Strike'].as_matrix()
-        self.df['Vol'] = self.df['Vol'].as_matrix()
-        self.df['Days'] = self.df['Days'].as_matrix()
-        self.df['d1'] = greeks.d_one(self.df['Underlying Price'], self.df['Strike'], 0.01, 0,
-                                     self.df['Vol'], self.df['Days'])
-        self.df['d2'] = greeks.d_two(self.df['Underlying Price'], self.df['Strike'], 0.01, 0,
-                                     self.df['Vol'], self.df['Days'])
-        self.df['Speed'] = greeks.speed(self.df['Gamma'], self.df['Underlying Price'], self.df['d1'],
-                                        self.df['Vol'], self.df['Days'])
-        self.df['Vanna'] = greeks.vanna(self.df['Vega'], self.df['Underlying Price'], self.df['d1'],
-                                        self.df['Vol'], self.df['Days'])
-        self.df['Zomma'] = greeks.zomma(self.df['Gamma'], self.df['d2'], self.df['d1'], self.df['Vol'])
+            with self.timer.stage("iv fit"):
+                self.df = nnet.fit_iv(self.df, self.iv_model)
+
+        # Drop instruments the model would not trade anyway before computing the rest
+        if self.opt.getboolean("reduce.universe", fallback=True):
+            self.reduce_universe()
 
         # Margins
-        margins.add_margins(self.df, self.opt["s3storage"])
+        with self.timer.stage("margins") as rec:
+            margins.add_margins(self.df, self.opt["s3storage"], self.margin_fit)
+            rec["rows"] = self.df.shape[0]
 
-        # Calculate asset prices for given percent up and down. Right now lets set it at 3
-        #  3% is rather common to be useful for risk management. Actually that level should be
-        #  calculated backwards from VaR or something.
+        # Higher order greeks and the up and down risk
         try:
-            price_up = self.df["Underlying Price"] * (1 + float(self.get_opt("risk.pct")))
-            price_down = self.df["Underlying Price"] * (1 - float(self.get_opt("risk.pct")))
+            greeks.add_risk(self.df, float(self.get_opt("risk.pct")))
         except OptException:
             self.logger.error("Errors in configuration file, quitting")
             sys.exit(1)
 
-        self.df["Price Up"] = greeks.val(price_up, self.df["Strike"], 0.01, 0, self.df["Vol"],
-                                         self.df["Days"], self.df["Side"]) - greeks.val(self.df["Underlying Price"],
-                                                                                        self.df["Strike"], 0.01, 0,
-                                                                                        self.df["Vol"],
-                                                                                        self.df["Days"],
-                                                                                        self.df["Side"])
-
-        self.df["Price Down"] = greeks.val(price_down, self.df["Strike"], 0.01, 0,
-                                           self.df["Vol"], self.df["Days"],
-                                           self.df["Side"]) - greeks.val(self.df["Underlying Price"],
-                                                                         self.df["Strike"], 0.01, 0,
-                                                                         self.df["Vol"], self.df["Days"],
-                                                                         self.df["Side"])
+    def reduce_universe(self):
+        """
+        Removes unusable and dominated instruments from the data, keeps existing positions
+        :return:
+        """
+        n = self.df.shape[0]
+        self.df, report = universe.reduce(self.df, self.opt)
 
-        self.df["Theta Up"] = greeks.theta(price_up, self.df["Strike"], 0.01, 0, self.df["Vol"],
-                                           self.df["Days"], self.df["Side"])
+        self.logger.log("Universe reduced from " + str(n) + " to " + str(self.df.shape[0]) + " instruments")
+        for k, v in report.items():
+            self.logger.verbose("Removed by rule '" + k + "': " + str(v))
 
-        self.df["Theta Down"] = greeks.theta(price_down, self.df["Strike"], 0.01, 0,
-                                             self.df["Vol"], self.df["Days"],
-                                             self.df["Side"])
+    @timed("gdx")
+    def write_gdx(self):
+        """
+        Writes the prepared data frame and the configuration scalars to the GAMS database
+        :return:
+        """
+        if self.db is None:
+            self.new_database()
 
         # ACTUAL GDX CREATION STARTS HERE
         # Create sets for data
@@ -259,24 +310,152 @@ class Optimiser(PortfolioStrategy):
                               [self.df["Financial Instrument"], ["bid", "ask"]],
                               "full", self.df[["Financial Instrument", "Bid", "Ask"]])
 
-    def run_gams(self, fn=None):
+        # MIP start, either previous solution or zero trades
+        self.add_mip_start()
+        data.create_parameter(self.db, "p_x0", "Starting point for the MIP",
+                              [self.df["Financial Instrument"], ["long", "short"]], "full",
+                              self.df[["Financial Instrument", "x0 long", "x0 short"]])
+
+    def add_mip_start(self):
         """
-        Retrieves optimisation model from the model repo and runs it
-        :param fn: gets formulation from text file
+        Computes starting trades for the MIP. If we have target positions from the previous run,
+        the start is the trade that takes current position to that target, otherwise zero trades.
+        :return:
+        """
+        if self.mip_start is None:
+            self.logger.verbose("No previous solution, starting MIP from zero trades")
+            self.df["x0 long"] = 0
+            self.df["x0 short"] = 0
+            return
+
+        self.logger.log("Starting MIP from previous solution")
+        # Instruments not present in previous solution keep their current position
+        target = self.df["Financial Instrument"].map(self.mip_start)
+        target = target.fillna(self.df["Position"])
+        diff = target - self.df["Position"]
+
+        self.df["x0 long"] = np.where(diff > 0, diff, 0)
+        self.df["x0 short"] = np.where(diff < 0, -diff, 0)
+
+    def mip_start_key(self) -> str:
+        """
+        Key of the MIP start of this book, books can share the MIP start file
+        :return: configuration section and symbol
+        """
+        return self.opt.name + "|" + self.opt.get("symbol", fallback="")
+
+    def load_mip_start(self, fn: str = None):
+        """
+        Loads target positions of the previous optimisation run for warm starting the MIP.
+        Only a solution of the same book from earlier on the same day as the data is used.
+        :param fn: JSON file with previous solutions, if none given use mip.start from config
         :return:
         """
-        response = ""
         if fn is None:
+            fn = self.opt.get("mip.start", fallback="./tmp/mip_start.json")
+
+        self.mip_start = None
+        if not os.path.isfile(fn):
+            self.logger.verbose("No previous solution found at " + fn)
+            return
+
+        with open(fn, "r") as f:
+            x = json.load(f).get(self.mip_start_key())
+        if not isinstance(x, dict) or "positions" not in x:
+            self.logger.verbose("No previous solution for " + self.mip_start_key() + " in " + fn)
+            return
+
+        dtg = self.data_date.strftime("%y%m%d%H%M%S")
+        if x["dtg"][0:6] != dtg[0:6] or x["dtg"] > dtg:
+            self.logger.log("Previous solution in " + fn + " is from " + x["dtg"] + ", not used for " + dtg)
+            return
+
+        self.logger.log("Reading previous solution from " + fn)
+        self.mip_start = x["positions"]
+
+    def save_mip_start(self, res: dict, fn: str = None):
+        """
+        Saves target positions of the solution as the MIP start for the next run, solutions of other books
+        in the file are kept
+        :param res: dict with optimisation results
+        :param fn: JSON file for the solutions, if none given use mip.start from config
+        :return:
+        """
+        if fn is None:
+            fn = self.opt.get("mip.start", fallback="./tmp/mip_start.json")
+
+        # Target position is the current position plus the optimal trades
+        pos = dict(zip(self.df["Financial Instrument"], self.df["Position"]))
+        target = {}
+        for k, v in res["x"].items():
+            target[k[0]] = target.get(k[0], float(pos.get(k[0], 0))) + (v if k[1] == "long" else -v)
+
+        # Books solved in parallel processes share the file, the update is locked and replaces the file at once
+        self.logger.verbose("Saving solution as next MIP start to " + fn)
+        with open(fn + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stored = {}
+            if os.path.isfile(fn):
+                with open(fn, "r") as f:
+                    stored = {k: v for k, v in json.load(f).items() if isinstance(v, dict) and "positions" in v}
+            stored[self.mip_start_key()] = {"dtg": self.data_date.strftime("%y%m%d%H%M%S"), "positions": target}
+
+            with open(fn + ".tmp", "w") as f:
+                json.dump(stored, f)
+            os.replace(fn + ".tmp", fn)
+
+    def export_gdx(self, fn: str = None) -> str:
+        """
+        Writes the model input database to a GDX file
+        :param fn: filename, input.gdx in working directory if not given
+        :return: filename
+        """
+        if fn is None:
+            fn = os.path.join(self.working_dir, "input.gdx")
+        self.db.export(os.path.abspath(fn))
+        return fn
+
+    def get_formulation(self) -> str:
+        """
+        Returns the most recent optimisation formulation, retrieved from the model repo only once
+        :return: GAMS code
+        """
+        if self.model_code is None:
             self.logger.log("Getting the most recent formulation")
-            response = code.get_code("gamsCode")["code"]
+            self.model_code = code.get_code("gamsCode")["code"]
+        return self.model_code
 
+    @timed("solve")
+    def run_gams(self, fn=None):
+        """
+        Retrieves optimisation model from the model repo and runs it
+        :param fn: gets formulation from text file
+        :return:
+        """
         self.logger.log("Running GAMS job")
+        if fn is not None:
+            with open(fn, "r") as f:
+                src = f.read()
+        else:
+            src = self.get_formulation()
+
+        # A model reading a fixed GDX file name would solve on the input of some earlier run,
+        # older formulations are run with their $gdxin pointed to %gdxincname%
+        if "%gdxincname%" not in src:
+            src, n = GDXIN.subn(r"\1%gdxincname%", src)
+            if n == 0:
+                self.logger.error("The formulation does not read its input through $gdxin")
+                raise OptException
+            self.logger.error("Warning: the formulation reads a fixed GDX file, running it with %gdxincname%")
+            fn = None
+
         if fn is not None:
             model = self.ws.add_job_from_file(fn)
         else:
-            model = self.ws.add_job_from_string(response)
+            model = self.ws.add_job_from_string(src)
         model.run(databases=self.db)
 
+    @timed("import")
     def import_gdx(self, fn=None):
         """
         Imports optimisation results from the GDX file
@@ -287,7 +466,7 @@ class Optimiser(PortfolioStrategy):
             fn = "_gams_py_gdb1.gdx"
 
         self.logger.log("Importing from " + fn)
-        db_out = self.ws.add_database_from_gdx(gdx_file_name=fn, database_name="results")
+        db_out = self.ws.add_database_from_gdx(gdx_file_name=fn)
 
         # Initialise output dict, enumerate the results and read them from GDX
         x = {}
@@ -317,6 +496,17 @@ class Optimiser(PortfolioStrategy):
         x["z"] = data.read_gdx_var(db_out, "z")
         self.logger.log("Objective function value " + "{:9.4f}".format(next(iter(x["z"].values()))))
 
+        # Solver statistics, older formulations do not export them
+        x["solve_stats"] = {}
+        if data.has_symbol(db_out, "solve_stats"):
+            st = data.read_gdx_param(db_out, "solve_stats")
+            x["solve_stats"] = dict(zip(st["s_stat"], st["val"]))
+            x["solve_stats"]["mipstart"] = self.mip_start is not None
+            self.timer.annotate("solve", solver=x["solve_stats"])
+            self.logger.log("Solve time " + "{:.3f}".format(x["solve_stats"].get("time", 0)) + "s, " +
+                            "nodes " + str(x["solve_stats"].get("nodes", 0)) + ", " +
+                            "warm start " + ("yes" if self.mip_start is not None else "no"))
+
         # And we are done
         return x
 
@@ -345,6 +535,7 @@ class Optimiser(PortfolioStrategy):
                             str(r["q"]))
         self.logger.log("---------------------------------------------------")
 
+    @timed("curves")
     def add_trades_to_df(self, res: dict):
         """
         Adds optimiser results to the market data snapshot data frame
@@ -378,15 +569,13 @@ class Optimiser(PortfolioStrategy):
         self.df["Trade"] = self.df["buy"] - self.df["sell"]
         self.df["NewPosition"] = self.df["Position"] + self.df["Trade"]
 
-        self.df_greeks = greeks.build_curves(self.df,
-                                             ["Val", "Val_p1", "Val_exp", "Delta",
-                                              "Gamma", "Theta", "Vega"], "NewPosition")
-        self.df_greeks_before = greeks.build_curves(self.df, ["Val", "Val_p1", "Val_exp", "Delta",
-                                                              "Gamma", "Theta", "Vega"], "Position")
-        self.df_greeks = self.df_greeks.multiply(float(self.get_opt("mult")))
-        self.df_greeks_before = self.df_greeks_before.multiply(float(self.get_opt("mult")))
+        self.curves = greeks.curves(self.df, ["NewPosition", "Position"],
+                                    horizons=greeks.parse_horizons(self.opt.get("curve.horizons",
+                                                                                fallback="0, 1, exp")),
+                                    mult=float(self.get_opt("mult")))
         return 0
 
+    @timed("export dynamo")
     def export_results_dynamo(self, dt: dict, tbl: str = None):
         """
         Saves optimisation results to DynamoDB
@@ -394,7 +583,8 @@ class Optimiser(PortfolioStrategy):
         :param dt: List of data returned by the optimiser
         :return:
         """
-        dt["trades"].columns = ["s_names", "s_trade", "val"]
+        trades = dt["trades"].copy()
+        trades.columns = ["s_names", "s_trade", "val"]
 
         cols = ["Financial Instrument", "Bid", "Mid", "Ask", "Underlying Price", "Position", "NewPosition",
                 "Strike", "Side", "Days", "Vol", "Delta", "Gamma", "Theta", "Vega", "Contract Month"]
@@ -407,18 +597,20 @@ class Optimiser(PortfolioStrategy):
              "margin": dt["total_margin"].to_json(orient="records"),
              "opt": str(json.dumps(dict(self.opt))),
              "pos": dt["total_pos"].to_json(orient="records"),
-             "trades": dt["trades"].to_json(orient="records"),
-             "monGreeks": dt["monthly_greeks"].to_json(orient="records")
+             "trades": trades.to_json(orient="records"),
+             "monGreeks": dt["monthly_greeks"].to_json(orient="records"),
+             "stats": json.dumps(dt.get("solve_stats", {})),
+             "greek_curve": greeks.curve_frame(self.curves, "NewPosition").to_json(orient="records"),
+             "greek_curve_before": greeks.curve_frame(self.curves, "Position").to_json(orient="records"),
+             "timing": self.timer.to_json()
              }
 
         self.logger.log("Exporting optimisation results to Dynamo DB")
 
-        db = boto3.resource('dynamodb', region_name='us-east-1',
-                            endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
         if tbl is None:
             tbl = self.opt["results.table"]
 
-        table = db.Table(tbl)
+        table = self.dynamo.Table(tbl)
         response = table.put_item(Item=x)
         is_ok = response["ResponseMetadata"]["HTTPStatusCode"] == 200
 
@@ -427,6 +619,7 @@ class Optimiser(PortfolioStrategy):
         else:
             self.logger.error("Export failed`")
 
+    @timed("export csv")
     def export_trades_csv(self, fn: str):
         """
         Exports the list of trades in basket trader format (CSV)
@@ -439,6 +632,15 @@ class Optimiser(PortfolioStrategy):
         """
         self.logger.log("Exporting trades basket to " + fn)
 
+        df_new = self.make_basket()
+        df_new.to_csv(fn, index=False)
+        utils.data.remove_last_csv_newline(fn)
+
+    def make_basket(self) -> pd.DataFrame:
+        """
+        Composes the list of trades in basket trader format
+        :return: data frame with basket trader columns
+        """
         df_tmp = self.df[self.df["Trade"] != 0]
 
         df_new = pd.DataFrame(np.where(df_tmp["Trade"] > 0, "BUY", "SELL"))
@@ -460,54 +662,154 @@ class Optimiser(PortfolioStrategy):
         df_new["Account"] = self.opt["account"]
         df_new["OrderRef"] = "Basket"
         df_new["Multiplier"] = self.opt["mult"]
+        return df_new
 
-        df_new.to_csv(fn, index=False)
-        utils.data.remove_last_csv_newline(fn)
+    @timed("export xml")
+    def export_xml(self, fn: str):
+        """
+        Exports new portfolio in Risk Navigator XML format, contract ID table is read once and kept
+        :param fn: filename for exported data
+        :return:
+        """
+        if self.contract_ids is None:
+            self.contract_ids = tools.get_contract_ids("instruments")
+        tools.export_portfolio_xml(self.df, fn, loglevel=self.loglevel, ids=self.contract_ids)
 
-    def get_mkt_data_snapshot(self, export_dynamo=False):
+    def export_results(self, sinks: dict) -> pd.DataFrame:
+        """
+        Runs independent exports concurrently, failure of one export does not affect the others
+        :param sinks: dict of export name and function without arguments
+        :return: data frame with export name, status, wall time and error message
+        """
+        def run(name, f):
+            t = time.perf_counter()
+            try:
+                f()
+                return {"sink": name, "ok": True, "wall": time.perf_counter() - t, "error": ""}
+            except Exception as e:
+                self.logger.error("Export " + name + " failed: " + repr(e))
+                return {"sink": name, "ok": False, "wall": time.perf_counter() - t, "error": repr(e)}
+
+        if len(sinks) == 0:
+            return pd.DataFrame(columns=["sink", "ok", "wall", "error"])
+
+        with self.timer.stage("export") as rec:
+            with ThreadPoolExecutor(max_workers=len(sinks)) as pool:
+                res = list(pool.map(lambda x: run(*x), sinks.items()))
+            rec["sinks"] = res
+
+        for r in res:
+            self.logger.log("Export " + "{: <10}".format(r["sink"]) + ("ok" if r["ok"] else "FAILED") +
+                            " in " + "{:.3f}".format(r["wall"]) + "s")
+        return pd.DataFrame(res)
+
+    @timed("snapshot")
+    def get_mkt_data_snapshot(self, export_dynamo=False, keep_alive=False):
         """
         Gets market data snapshot from TWS
+        :param export_dynamo: also save the snapshot to Dynamo DB
+        :param keep_alive: keep TWS connection open for the next snapshot
         :return:
         """
+        from tws import snapshot
+        if keep_alive and self.opt.get("snapshot.mode", fallback="snapshot") == "stream":
+            self.get_mkt_data_stream(export_dynamo)
+            return
+
         self.logger.log("Getting market data from snapshot")
-        snap = snapshot.Snapshot(config=self.opt, log_level=self.loglevel)
-        snap.connect(self.opt["host"],
-                     int(self.opt["port"]),
-                     int(self.opt["id"]) + 1)
-        snap.create_instruments()
-        snap.wait_to_finish()
-        self.df = snap.prepare_df()
+        if self.snap is None and int(self.opt.get("shards.count", fallback="1")) > 1:
+            from tws import shards
+            self.snap = shards.ShardedSnapshot(config=self.opt, log_level=self.loglevel)
+            self.snap.connect(self.opt["host"],
+                              int(self.opt["port"]),
+                              int(self.opt.get("shards.id", fallback=str(int(self.opt["id"]) + 10))))
+        elif self.snap is None:
+            self.snap = snapshot.Snapshot(config=self.opt, log_level=self.loglevel)
+            self.snap.connect(self.opt["host"],
+                              int(self.opt["port"]),
+                              int(self.opt["id"]) + 1)
+        else:
+            self.snap.clear()
+
+        self.snap.contract_ids = self.contract_ids
+        self.snap.create_instruments()
+        self.snap.wait_to_finish()
+        self.df = self.snap.prepare_df()
+        self.data_date = datetime.today()
         if export_dynamo:
-            snap.export_dynamo(self.config["data"]["mkt.table"])
-        snap.disconnect()
+            self.snap.export_dynamo(self.config["data"]["mkt.table"])
+
+        if not keep_alive:
+            self.snap.disconnect()
+            self.snap = None
 
-    def basket_order(self, live=False):
+    def get_mkt_data_stream(self, export_dynamo=False):
+        """
+        Gets market data from the live option chain, streaming is started on the first call
+        and the following calls take a copy of the chain without waiting for TWS
+        :param export_dynamo: also save the chain to Dynamo DB
+        :return:
+        """
+        from tws import stream
+        if self.snap is None:
+            self.logger.log("Starting market data stream")
+            self.snap = stream.ChainStream(config=self.opt, log_level=self.loglevel)
+            self.snap.contract_ids = self.contract_ids
+            self.snap.connect(self.opt["host"],
+                              int(self.opt["port"]),
+                              int(self.opt["id"]) + 1)
+            self.snap.start()
+            if not self.snap.wait_filled(float(self.opt.get("stream.wait", fallback="120"))):
+                self.logger.error("Option chain not filled yet, using partial market data")
+
+        self.logger.log("Getting market data from stream")
+        self.snap.contract_ids = self.contract_ids
+        self.df = self.snap.chain()
+        self.logger.verbose("Market data age median {:.1f}s, max {:.1f}s".format(self.df["Age"].median(),
+                                                                                 self.df["Age"].max()))
+        self.df = self.df.drop(columns=["Updated", "Age"])
+        self.data_date = datetime.today()
+        if export_dynamo:
+            self.snap.export_dynamo(self.config["data"]["mkt.table"])
+
+    @timed("basket")
+    def basket_order(self, live=False) -> pd.DataFrame:
         """
         Sends basket order to TWS to execute the rebalance
         :param live: when True, transmits orders, otherwise just saves
-        :return:
+        :return: data frame with status of each order
         """
+        from ibapi.order import Order
+        from tws import basket
+        from tws.contracts import ContractCache
+        from utils import instrument
+
         # TODO: If live, then consider automatic order adjustments
         if live:
             self.logger.log("Composing basket orders for automatic LIVE rebalance")
         else:
             self.logger.log("Composing basket orders for sending them to TWS without execution")
 
-        t = tws.TwsTool("Basket Order", log_level=self.loglevel)
-        t.connect(self.opt["host"], int(self.opt["port"]), int(self.opt["id"])+2)
-
         # Filter out correct rows
         df_tmp = self.df[self.df["Trade"] != 0]
 
         d_tmp = instrument.get_instrument(self.opt["symbol"], "instData")
-        c = d_tmp["cont"]
 
-        o_id = t.nextId
+        # Known contract IDs spare TWS from resolving the contracts of the orders
+        cache = ContractCache(self.opt.get("contracts.path", fallback="./tmp/contracts.db"))
+        cached = cache.load(d_tmp["cont"].symbol, d_tmp["cont"].tradingClass)
+        cache.close()
+
+        legs = []
         for i, r in df_tmp.iterrows():
-            self.logger.log(r["Financial Instrument"])
+            c = copy.copy(d_tmp["cont"])
             c.strike = "{:g}".format(r["Strike"])
             c.right = "CALL" if r["Side"] == "c" else "PUT"
-            c.lastTradeDateOrContractMonth = r["Contract Month"]
+            c.lastTradeDateOrContractMonth = str(r["Contract Month"])
+            d = cached.get(ContractCache.key(c.symbol, c.tradingClass, c.lastTradeDateOrContractMonth, c.strike,
+                                             c.right))
+            if d is not None:
+                c.conId = d["conid"]
 
             tws_order = Order()
             tws_order.transmit = live
@@ -515,13 +817,23 @@ class Optimiser(PortfolioStrategy):
             tws_order.action = "BUY" if int(r["Trade"]) > 0 else "SELL"
             tws_order.totalQuantity = np.abs(int(r["Trade"]))
             tws_order.lmtPrice = float(round(r["Mid"] * 2) / 2)
+            legs.append((r["Financial Instrument"], c, tws_order))
 
-            t.placeOrder(o_id, c, tws_order)
-            o_id = o_id + 1
-            import time
-            time.sleep(0.5)
+        t = basket.BasketSubmitter(log_level=self.loglevel,
+                                   rate=float(self.opt.get("basket.rate", fallback="45")),
+                                   timeout=float(self.opt.get("basket.timeout", fallback="5")),
+                                   retries=int(self.opt.get("basket.retries", fallback="2")))
+        t.connect(self.opt["host"], int(self.opt["port"]), int(self.opt["id"])+2)
+        try:
+            res = t.submit(legs)
+        finally:
+            t.disconnect()
 
-        t.disconnect()
+        for i, r in res.iterrows():
+            self.logger.log("{: <35}".format(r["label"]) + "\t" + r["action"] + "\t" + str(r["quantity"]) +
+                            "\t" + r["status"] + ("\t" + r["error"] if r["error"] != "" else ""))
+        self.timer.annotate("basket", orders=len(res), acknowledged=int((res["ack"].notnull()).sum()))
+        return res
 
     def close_fut(self, df: dict):
         """
@@ -544,32 +856,218 @@ class Optimiser(PortfolioStrategy):
         from bokeh.layouts import gridplot
 
         self.logger.log("Outputting bokeh plots")
+        after = greeks.curve_frame(self.curves, "NewPosition")
+        before = greeks.curve_frame(self.curves, "Position")
+
         p1 = figure(title="Delta", width=250, height=250)
-        p1.line(self.df_greeks.index, self.df_greeks["Delta"], line_color="red", legend="Optimal")
-        p1.line(self.df_greeks.index, self.df_greeks_before["Delta"], line_color="black", legend="Current")
+        p1.line(after.index, after["Delta"], line_color="red", legend="Optimal")
+        p1.line(after.index, before["Delta"], line_color="black", legend="Current")
         p2 = figure(title="Gamma", width=250, height=250)
-        p2.line(self.df_greeks.index, self.df_greeks["Gamma"], line_color="red", legend="Optimal")
-        p2.line(self.df_greeks.index, self.df_greeks_before["Gamma"], line_color="black", legend="Current")
+        p2.line(after.index, after["Gamma"], line_color="red", legend="Optimal")
+        p2.line(after.index, before["Gamma"], line_color="black", legend="Current")
         p3 = figure(title="Theta", width=250, height=250)
-        p3.line(self.df_greeks.index, self.df_greeks["Theta"], line_color="red", legend="Optimal")
-        p3.line(self.df_greeks.index, self.df_greeks_before["Theta"], line_color="black", legend="Current`")
+        p3.line(after.index, after["Theta"], line_color="red", legend="Optimal")
+        p3.line(after.index, before["Theta"], line_color="black", legend="Current")
         p4 = figure(title="Val", width=750, height=250)
-        p4.line(self.df_greeks.index, self.df_greeks["Val"], line_color="red", legend="Optimal")
-        p4.line(self.df_greeks.index, self.df_greeks["Val_p1"], line_color="blue", legend="T+1 day")
-        p4.line(self.df_greeks.index, self.df_greeks["Val_exp"], line_color="blue", line_dash="4 4", legend="Expiry")
-        p4.line(self.df_greeks.index, self.df_greeks["Val"], line_color="black", legend="Current")
+        p4.line(after.index, after["Val"], line_color="red", legend="Optimal")
+        for h in self.curves["horizons"]:
+            n = greeks.horizon_name(h)
+            if n == "Val":
+                continue
+            p4.line(after.index, after[n], line_color="blue", line_dash="4 4" if h == "exp" else "solid",
+                    legend="Expiry" if h == "exp" else "T+{:g} days".format(float(h)))
+        p4.line(after.index, before["Val"], line_color="black", legend="Current")
 
         show(gridplot([[p4], [p1, p2, p3]]))
 
 
+def get_data(o: Optimiser, args):
+    """
+    Gets market data from where the command line tells to
+    :param o: optimiser
+    :param args: command line arguments
+    :return:
+    """
+    if args.tws:
+        o.get_mkt_data_snapshot(export_dynamo=args.db)
+    elif args.i is None:
+        o.get_mkt_data_dynamo(dtg=args.dtg)
+    else:
+        o.get_mkt_data_csv(args.i)
+
+
+def run_snapshot(o: Optimiser, args, store: RunStore) -> dict:
+    """
+    Snapshot stage, gets market data and saves it as a new run
+    :param o: optimiser
+    :param args: command line arguments
+    :param store: run store
+    :return: run manifest
+    """
+    get_data(o, args)
+    run = {"dtg": o.data_date.strftime("%y%m%d%H%M%S"),
+           "status": "snapshot",
+           "artefacts": {"snapshot": store.put(o.df)}}
+    run = store.save_run(run)
+    o.logger.log("Snapshot saved as run " + run["id"])
+    return run
+
+
+def run_optimise(o: Optimiser, args, store: RunStore, run: dict) -> dict:
+    """
+    Optimisation stage, reads the snapshot of the run, solves and saves the results to the run
+    :param o: optimiser
+    :param args: command line arguments
+    :param store: run store
+    :param run: run manifest with snapshot
+    :return: dict of optimisation results, None if there is nothing to trade
+    """
+    o.df = store.get(run["artefacts"]["snapshot"])
+    o.data_date = datetime.strptime(run["dtg"], "%y%m%d%H%M%S")
+
+    # Same snapshot, options, formulation and margin and volatility models give the same results,
+    # looked up before the data is prepared so a hit does not pay for the volatility fit and margins
+    cache = SolutionCache(o.opt.get("cache.path", fallback="./tmp/cache/"),
+                          float(o.opt.get("cache.size", fallback="500")))
+    margin_version = o.margin_fit["version"] if o.margin_fit is not None else \
+        margins.model_version(o.opt["s3storage"])
+    key = SolutionCache.make_key(o.df, o.opt, o.get_formulation(), args.ignore_existing, margin_version,
+                                 nnet.IV_MODEL)
+    hit = None if args.no_cache else cache.get(key)
+
+    if hit is not None:
+        o.logger.log("Using cached results for the snapshot")
+        o.df = hit["result"]
+        o.curves = hit["curves"]
+        d = hit["solution"]
+        for k in ["prepared", "solution", "result", "curves"]:
+            run["artefacts"][k] = store.put(hit[k])
+        run["objective"] = next(iter(d["z"].values()))
+        run["cached"] = True
+    else:
+        if not args.cold:
+            o.load_mip_start()
+        o.prepare_data(args.ignore_existing)
+        run["artefacts"]["prepared"] = store.put(o.df)
+        d = solve(o, args, store, run)
+        if d is None:
+            return None
+        cache.put(key, {"prepared": store.get(run["artefacts"]["prepared"]),
+                        "solution": store.get(run["artefacts"]["solution"]),
+                        "result": o.df,
+                        "curves": o.curves})
+
+    run["artefacts"]["result"] = store.put(o.df)
+    run["artefacts"]["curves"] = store.put(o.curves)
+    run["trades"] = int(d["trades"]["q"].abs().sum())
+    run["status"] = "optimised"
+    store.save_run(run)
+    o.logger.log("Optimisation results saved to run " + run["id"])
+    return d
+
+
+def solve(o: Optimiser, args, store: RunStore, run: dict) -> dict:
+    """
+    Solves the model for the prepared data and adds the trades to the data
+    :param o: optimiser with the prepared data
+    :param args: command line arguments
+    :param store: run store
+    :param run: run manifest
+    :return: dict of optimisation results, None if there is nothing to trade
+    """
+    o.write_gdx()
+    run["artefacts"]["gdx"] = store.put_file(o.export_gdx())
+    o.run_gams()
+    d = o.import_gdx()
+    run["objective"] = next(iter(d["z"].values()))
+
+    try:
+        o.add_trades_to_df(d)
+    except OptException:
+        run["status"] = "no trades"
+        store.save_run(run)
+        return None
+
+    # No solver results, possible infeasible solution or no trades?
+    if len(d["trades"]) == 0:
+        run["status"] = "no trades"
+        store.save_run(run)
+        return None
+
+    o.save_mip_start(d)
+    d = o.close_fut(d)
+    run["artefacts"]["solution"] = store.put(d)
+    return d
+
+
+def load_results(o: Optimiser, store: RunStore, run: dict) -> dict:
+    """
+    Loads results of an optimised run back into the optimiser without recomputing anything
+    :param o: optimiser
+    :param store: run store
+    :param run: run manifest
+    :return: dict of optimisation results
+    """
+    if "result" not in run["artefacts"]:
+        o.logger.error("Run " + run["id"] + " has no optimisation results")
+        raise OptException
+
+    o.df = store.get(run["artefacts"]["result"])
+    o.data_date = datetime.strptime(run["dtg"], "%y%m%d%H%M%S")
+    o.curves = store.get(run["artefacts"]["curves"])
+    return store.get(run["artefacts"]["solution"])
+
+
+def run_export(o: Optimiser, args, d: dict):
+    """
+    Export stage, outputs the results of the run
+    :param o: optimiser with results
+    :param args: command line arguments
+    :param d: dict of optimisation results
+    :return:
+    """
+    sinks = {}
+    if args.plot:
+        sinks["plot"] = o.plot_greeks
+    if args.db:
+        sinks["dynamo"] = lambda: o.export_results_dynamo(d)
+    if args.csv:
+        sinks["csv"] = lambda: o.export_trades_csv(args.csv)
+    if args.xml:
+        sinks["xml"] = lambda: o.export_xml(args.xml)
+    if args.exec:
+        sinks["basket"] = lambda: o.basket_order(args.live)
+
+    res = o.export_results(sinks)
+    if not res["ok"].all():
+        o.logger.error("Some exports failed")
+
+
+def run_list(o: Optimiser, store: RunStore):
+    """
+    Lists the runs in the store
+    :param o: optimiser, for logging
+    :param store: run store
+    :return:
+    """
+    o.logger.log("Run\t\t\tData DTG\tStatus\t\tTrades\tObjective")
+    for r in store.list_runs():
+        o.logger.log(r["id"] + "\t" + r["dtg"] + "\t" + "{: <10}".format(r["status"]) + "\t" +
+                     str(r.get("trades", "")) + "\t" + str(r.get("objective", "")))
+
+
 if __name__ == "__main__":
     # Process command line options
     parser = argparse.ArgumentParser(description="Portfolio optimiser")
+    parser.add_argument("cmd", nargs="?", default="full",
+                        choices=["snapshot", "optimise", "export", "list", "view", "full"],
+                        help="Stage to run: snapshot, optimise, export, list, view or full (default)")
     parser.add_argument("-c", action="store", help="Configuration file")
     parser.add_argument("-i", action="store", help="Path to input data CSV file")
     parser.add_argument("-q", "--quiet", action="store_true", help="Quiet mode. Log only errors.", default=False)
     parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging", default=False)
     parser.add_argument("-e", "--exec", action="store_true", help="Execute automatic rebalancing", default=False)
+    parser.add_argument("--run", action="store", help="Run ID in the run store, latest run if not given")
     parser.add_argument("--tws", action="store_true", help="Import market data from TWS", default=False)
     parser.add_argument("--db", action="store_true", help="Export optimisation results to Dynamo DB", default=False)
     parser.add_argument("--xml", action="store", help="Export basket as TWS compatible XML")
@@ -579,6 +1077,12 @@ if __name__ == "__main__":
     parser.add_argument("--plot", action="store_true", help="Plot greeks", default=False)
     parser.add_argument("--ignore_existing", action="store_true",
                         help="Ignore existing positions in dataset", default=False)
+    parser.add_argument("--cold", action="store_true",
+                        help="Do not warm start the MIP from previous solution", default=False)
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Do not use cached results, solve again and refresh the cache", default=False)
+    parser.add_argument("--profile", action="store", nargs="?", const="./tmp/profile/",
+                        help="Write cProfile output for each stage to given directory")
 
     args = parser.parse_args()
 
@@ -595,52 +1099,40 @@ if __name__ == "__main__":
 
     # Now the main code
     o = Optimiser(conf_file, loglevel=log)
+    o.timer.profile_dir = args.profile
+    store = RunStore(o.opt.get("run.store", fallback="./runs/"))
     # TODO: Something that checks whether TWS is connected to the correct account (cf. config file)
     # TODO: Write a config check code, that verifies the contents of the configuration file before proceeding
-    # TODO: Write command line options for workflow: first 'opt' to do optimisation and write results to db
-    #       if the run is fine then 'trade' that does either the xml export, csv export or direct TWS trading
-    #       additionally 'snapshot' that just pulls the market snapshot and injects it to Dynamo
-    # TODO: General commands: data import / export- grabs a snapshot from wherever and stores it in the database
-    #                             also add plot option here
-    #                         run optimise - does the optimisation run and stores it in the database
-    #                         run list - list runs in the database
-    #                         run view - plots a run in the database
-    #                         run export - exports a run (xml, csv, possibly tws)
-    #                         run full - does the full workflow
-
-    # Figure out where to get input data
-    if args.tws:
-        o.get_mkt_data_snapshot(export_dynamo=args.db)
-    elif args.i is None:
-        o.get_mkt_data_dynamo(dtg=args.dtg)
-    else:
-        o.get_mkt_data_csv(args.i)
 
-    o.create_gdx(args.ignore_existing)
-    o.run_gams()
-    d = o.import_gdx()
+    if args.cmd == "list":
+        run_list(o, store)
+        parser.exit(0)
 
-    try:
-        status = o.add_trades_to_df(d)
-    except OptException:
-        status = 1
-        parser.exit(1)
-
-    # No solver results, possible infeasible solution or no trades?
-    if len(d["trades"]) == 0 or status == 1:
-        parser.exit(1)
-
-    o.opt_summary(d)
-    d = o.close_fut(d)
+    # Stages either start from a fresh snapshot or from an earlier run
+    if args.cmd in ["snapshot", "full"] or (args.cmd == "optimise" and args.run is None):
+        r = run_snapshot(o, args, store)
+    else:
+        try:
+            r = store.load_run(args.run)
+        except (OSError, ValueError):
+            o.logger.error("Cannot find run " + str(args.run))
+            parser.exit(1)
+
+    if args.cmd in ["optimise", "full"]:
+        d = run_optimise(o, args, store, r)
+        if d is None:
+            parser.exit(1)
+    elif args.cmd in ["export", "view"]:
+        try:
+            d = load_results(o, store, r)
+        except OptException:
+            parser.exit(1)
 
-    # Outputs
-    if args.plot:
+    if args.cmd in ["optimise", "full", "view"]:
+        o.opt_summary(d)
+    if args.cmd == "view":
         o.plot_greeks()
-    if args.db:
-        o.export_results_dynamo(d)
-    if args.csv:
-        o.export_trades_csv(args.csv)
-    if args.xml:
-        tools.export_portfolio_xml(o.df, args.xml)
-    if args.exec:
-        o.basket_order(args.live)
+    if args.cmd in ["export", "full"]:
+        run_export(o, args, d)
+
+    o.timer.save(o.opt.get("timing.file", fallback="./tmp/timing.json"))
@@ -0,0 +1,104 @@
+"""
+Unit testing for optimiser MIP start handling
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from unittest import mock
+from threading import Thread
+from optimiser import Optimiser, OptException
+from datetime import datetime
+import pandas as pd
+import tempfile
+import os
+
+
+CONFIG = """
+[optimiser]
+symbol=   CL
+mult=     1000
+
+[optimiser.CL]
+
+[optimiser.NG]
+symbol=   NG
+"""
+
+
+class OptimiserTests(unittest.TestCase):
+    def test_mip_start(self):
+        wd = tempfile.mkdtemp()
+        cf = os.path.join(wd, "config.cf")
+        with open(cf, "w") as f:
+            f.write(CONFIG)
+        fn = os.path.join(wd, "mip_start.json")
+
+        for section, trade in [("optimiser.CL", 2.0), ("optimiser.NG", 3.0)]:
+            o = Optimiser(cf, section=section)
+            o.data_date = datetime(2019, 1, 2, 10, 0, 0)
+            o.df = pd.DataFrame({"Financial Instrument": ["A", "B"], "Position": [1, 0]})
+            o.save_mip_start({"x": {("A", "long"): trade, ("B", "short"): 1.0}}, fn)
+
+        # Later on the same day each book gets its own solution
+        o = Optimiser(cf, section="optimiser.CL")
+        o.data_date = datetime(2019, 1, 2, 11, 0, 0)
+        o.load_mip_start(fn)
+        self.assertEqual({"A": 3.0, "B": -1.0}, o.mip_start)
+        o = Optimiser(cf, section="optimiser.NG")
+        o.data_date = datetime(2019, 1, 2, 11, 0, 0)
+        o.load_mip_start(fn)
+        self.assertEqual({"A": 4.0, "B": -1.0}, o.mip_start)
+
+        # Solutions from another day or newer than the data are not used
+        for dt in [datetime(2019, 1, 3, 10, 0, 0), datetime(2019, 1, 2, 9, 0, 0)]:
+            o.data_date = dt
+            o.load_mip_start(fn)
+            self.assertIsNone(o.mip_start)
+
+    def test_mip_start_concurrent(self):
+        wd = tempfile.mkdtemp()
+        cf = os.path.join(wd, "config.cf")
+        with open(cf, "w") as f:
+            f.write(CONFIG + "".join(["\n[optimiser.B" + str(i) + "]\n" for i in range(8)]))
+        fn = os.path.join(wd, "mip_start.json")
+
+        def save(section):
+            o = Optimiser(cf, section=section)
+            o.data_date = datetime(2019, 1, 2, 10, 0, 0)
+            o.df = pd.DataFrame({"Financial Instrument": ["A"], "Position": [0]})
+            for _ in range(5):
+                o.save_mip_start({"x": {("A", "long"): 1.0}}, fn)
+
+        # Books saving at the same time keep each other's solutions
+        threads = [Thread(target=save, args=("optimiser.B" + str(i), )) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            o = Optimiser(cf, section="optimiser.B" + str(i))
+            o.data_date = datetime(2019, 1, 2, 11, 0, 0)
+            o.load_mip_start(fn)
+            self.assertEqual({"A": 1.0}, o.mip_start)
+
+    def test_gdxin(self):
+        wd = tempfile.mkdtemp()
+        cf = os.path.join(wd, "config.cf")
+        with open(cf, "w") as f:
+            f.write(CONFIG)
+        o = Optimiser(cf)
+        o._ws = mock.Mock()
+
+        # Older formulations reading the fixed GDX file are run with their input name replaced
+        o.model_code = "Set i;\n$gdxin _gams_py_gdb0.gdx\n$load i\n$gdxin\n"
+        o.run_gams()
+        self.assertEqual("Set i;\n$gdxin %gdxincname%\n$load i\n$gdxin\n",
+                         o.ws.add_job_from_string.call_args[0][0])
+
+        o.model_code = "Set i /1/;\n"
+        self.assertRaises(OptException, o.run_gams)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,4 +20,4 @@ def get_version_string():
 
 __version__ = get_version_string()
 
-__all__ = ["greeks", "margins", "scaling"]
+__all__ = ["greeks", "margins", "scaling", "universe"]
@@ -4,7 +4,7 @@ Code for calculation of more and less esoteric greeks.
 Author: Peeter Meos
 Date: 3. December 2018
 """
-from scipy.stats import norm
+from scipy.special import ndtr
 import numpy as np
 import pandas as pd
 
@@ -24,8 +24,8 @@ def val(s, k, r, q, sigma, t, side: str):
     d1 = d_one(s, k, r, q, sigma, t)
     d2 = d_two(s, k, r, q, sigma, t)
     v = np.where(side == "p",
-                 np.exp(-r * t) * k * norm.cdf(-d2) - s * np.exp(-q * t) * norm.cdf(-d1),
-                 s * np.exp(-q * t) * norm.cdf(d1) - np.exp(-r * t) * k * norm.cdf(d2))
+                 np.exp(-r * t) * k * ndtr(-d2) - s * np.exp(-q * t) * ndtr(-d1),
+                 s * np.exp(-q * t) * ndtr(d1) - np.exp(-r * t) * k * ndtr(d2))
     return v
 
 
@@ -83,8 +83,8 @@ def delta(s, k, r, q, sigma, t, side: str):
     :param side: option side
     :return:
     """
-    r = np.where(side == "c", np.exp(-q * t) * norm.cdf(d_one(s, k, r, q, sigma, t)),
-                 -np.exp(-q * t) * norm.cdf(-d_one(s, k, r, q, sigma, t)))
+    r = np.where(side == "c", np.exp(-q * t) * ndtr(d_one(s, k, r, q, sigma, t)),
+                 -np.exp(-q * t) * ndtr(-d_one(s, k, r, q, sigma, t)))
     return r
 
 
@@ -119,9 +119,9 @@ def theta(s, k, r, q, sigma, t, side: str, unit="day"):
     c1 = -np.exp(-q * t) * (s * phi(d_one(s, k, r, q, sigma, t)) * sigma) / (2 * np.sqrt(t))
     c2 = r * k * np.exp(-r * t)
     c3 = q * s * np.exp(-q * t)
-    r = np.where(side == "c", c1 - c2 * norm.cdf(d_two(s, k, r, q, sigma, t)) +
-                 c3 * norm.cdf(d_one(s, k, r, q, sigma, t)),
-                 c1 + c2 * norm.cdf(-d_two(s, k, r, q, sigma, t)) - c3 * norm.cdf(-d_one(s, k, r, q, sigma, t)))
+    r = np.where(side == "c", c1 - c2 * ndtr(d_two(s, k, r, q, sigma, t)) +
+                 c3 * ndtr(d_one(s, k, r, q, sigma, t)),
+                 c1 + c2 * ndtr(-d_two(s, k, r, q, sigma, t)) - c3 * ndtr(-d_one(s, k, r, q, sigma, t)))
     if unit == "day":
         r = r / 365.0
     return r
@@ -197,8 +197,8 @@ def charm(side, d1, d2, r, q, sigma, t):
     :return:
     """
     v1 = np.exp(-q * t) * phi(d1) * (2 * (r - q) * t - d2 * sigma * np.sqrt(t)) / (2 * t * sigma * np.sqrt(t))
-    v = np.where(side == "c", q * np.exp(-q * t) * norm.cdf(d1) - v1,
-                 -q * np.exp(-q * t) * norm.cdf(-d1) - v1)
+    v = np.where(side == "c", q * np.exp(-q * t) * ndtr(d1) - v1,
+                 -q * np.exp(-q * t) * ndtr(-d1) - v1)
     return v
 
 
@@ -233,6 +233,136 @@ def norm_pdf_approx(x: float):
     return res1 * res2
 
 
+def add_risk(df: pd.DataFrame, pct: float, r: float = 0.01, q: float = 0) -> pd.DataFrame:
+    """
+    Adds higher order greeks and value and theta changes for underlying moving given percent up and down
+    :param df: data frame with Underlying Price, Strike, Vol, Days, Side, Gamma and Vega columns
+    :param pct: relative price move, ie. 0.03 for 3%
+    :param r: interest rate
+    :param q: dividend yield
+    :return: the same data frame with d1, d2, Speed, Vanna, Zomma, Price Up, Price Down, Theta Up and Theta Down
+    """
+    s = df["Underlying Price"]
+    k = df["Strike"]
+    sigma = df["Vol"]
+    t = df["Days"]
+
+    df["d1"] = d_one(s, k, r, q, sigma, t)
+    df["d2"] = d_two(s, k, r, q, sigma, t)
+    df["Speed"] = speed(df["Gamma"], s, df["d1"], sigma, t)
+    df["Vanna"] = vanna(df["Vega"], s, df["d1"], sigma, t)
+    df["Zomma"] = zomma(df["Gamma"], df["d2"], df["d1"], sigma)
+
+    # Calculate asset prices for given percent up and down. Right now lets set it at 3
+    #  3% is rather common to be useful for risk management. Actually that level should be
+    #  calculated backwards from VaR or something.
+    price_up = s * (1 + pct)
+    price_down = s * (1 - pct)
+    v = val(s, k, r, q, sigma, t, df["Side"])
+
+    df["Price Up"] = val(price_up, k, r, q, sigma, t, df["Side"]) - v
+    df["Price Down"] = val(price_down, k, r, q, sigma, t, df["Side"]) - v
+    df["Theta Up"] = theta(price_up, k, r, q, sigma, t, df["Side"])
+    df["Theta Down"] = theta(price_down, k, r, q, sigma, t, df["Side"])
+    return df
+
+
+GREEKS = {"Delta": lambda s, k, r, q, sigma, t, side: delta(s, k, r, q, sigma, t, side),
+          "Gamma": lambda s, k, r, q, sigma, t, side: gamma(s, k, r, q, sigma, t),
+          "Theta": lambda s, k, r, q, sigma, t, side: theta(s, k, r, q, sigma, t, side),
+          "Vega": lambda s, k, r, q, sigma, t, side: vega(s, k, r, q, sigma, t)}
+
+
+def parse_horizons(spec: str) -> list:
+    """
+    Parses horizon ladder from configuration
+    :param spec: comma separated list of days from now and "exp" for the nearest expiry, ie. "0, 1, 5, exp"
+    :return: list of horizons
+    """
+    return [h.strip() if h.strip() == "exp" else float(h) for h in spec.split(",") if h.strip() != ""]
+
+
+def horizon_name(h) -> str:
+    """
+    Name of the value curve for given horizon, Val for now, Val_exp for the nearest expiry, Val_p<days> otherwise
+    :param h: horizon, days or "exp"
+    :return:
+    """
+    if h == "exp":
+        return "Val_exp"
+    if float(h) == 0:
+        return "Val"
+    return "Val_p{:g}".format(float(h))
+
+
+def curves(df: pd.DataFrame, pos_cols: list, horizons: list = (0, 1, "exp"),
+           greeks: list = ("Delta", "Gamma", "Theta", "Vega"), moves=None,
+           r: float = 0.01, q: float = 0, mult: float = 1.0) -> dict:
+    """
+    P&L and greek curves of several position vectors over a ladder of time horizons in one pass.
+    Instruments, horizons and underlying moves are broadcast against each other,
+    position vectors are applied to the result with a single matrix product.
+    :param df: data frame with Underlying Price, Strike, Vol, Days, Side and Mid columns
+    :param pos_cols: position columns, ie. ["NewPosition", "Position"]
+    :param horizons: days from now, "exp" for the nearest expiry of held instruments.
+     Horizon 0 is always calculated first, the greeks and the Val curve are at now.
+    :param greeks: greeks to calculate, keys of GREEKS
+    :param moves: relative underlying moves, -10% to 10% by 0.1% by default
+    :param r: interest rate
+    :param q: dividend yield
+    :param mult: contract multiplier
+    :return: dict with pct, horizons, positions, names and values array of
+             shape (positions, names, horizons, moves), names are Val followed by greeks
+    """
+    if moves is None:
+        moves = np.arange(-100, 100) / 1000
+    moves = np.asarray(moves, dtype=float)
+    horizons = [0] + [h for h in horizons if h == "exp" or float(h) != 0]
+    names = ["Val"] + list(greeks)
+
+    # Only instruments held before or after matter
+    x = df[(df[pos_cols] != 0).any(axis=1)]
+    pos = x[pos_cols].values.T.astype(float) * mult
+
+    # Shapes: instruments x moves, horizons x instruments x 1
+    s = x["Underlying Price"].values.astype(float)[:, None] * (1 + moves)
+    k = x["Strike"].values.astype(float)[:, None]
+    sigma = x["Vol"].values.astype(float)[:, None]
+    side = x["Side"].values[:, None]
+    t = x["Days"].values.astype(float)
+    t_exp = t.min() if len(t) > 0 else 0
+    dt = np.array([t_exp if h == "exp" else float(h) / 365 for h in horizons])
+    t_h = np.maximum(t[None, :] - dt[:, None], 0.00001)[:, :, None]
+
+    v = np.empty((len(names), len(horizons), len(x), len(moves)))
+    v[0] = val(s, k, r, q, sigma, t_h, side) - x["Mid"].values.astype(float)[:, None]
+    for i, g in enumerate(greeks):
+        v[i + 1] = GREEKS[g](s, k, r, q, sigma, t_h, side)
+
+    return {"pct": moves,
+            "horizons": horizons,
+            "positions": list(pos_cols),
+            "names": names,
+            "values": np.einsum("pn,ghnm->pghm", pos, v)}
+
+
+def curve_frame(c: dict, pos_col: str) -> pd.DataFrame:
+    """
+    Curves of one position vector as a data frame, value curves named by horizon_name, greeks at horizon 0
+    :param c: curves as returned by curves()
+    :param pos_col: position column
+    :return: data frame indexed by relative underlying move
+    """
+    v = c["values"][c["positions"].index(pos_col)]
+    df_out = pd.DataFrame({"r": c["pct"]}, index=c["pct"])
+    for j, h in enumerate(c["horizons"]):
+        df_out[horizon_name(h)] = v[0, j]
+    for i, g in enumerate(c["names"][1:]):
+        df_out[g] = v[i + 1, 0]
+    df_out["pct"] = c["pct"]
+    return df_out
+
+
 def build_curves(df: pd.DataFrame, greeks: list, pos_col: str) -> pd.DataFrame:
     """
     Creates futures' curves based on given data
@@ -241,44 +371,6 @@ def build_curves(df: pd.DataFrame, greeks: list, pos_col: str) -> pd.DataFrame:
     :param pos_col: Position column name
     :return:
     """
-    df_tmp = df[df[pos_col] != 0].copy()
-
-    # TODO: Make these ranges adjustable
-    # TODO: write the code to work with numpy vectors and return a dict of vectors. Ie. get rid of pandas.
-    r = np.array(range(-100, 100, 1)) / 1000
-    df_out = pd.DataFrame(r)
-    df_out.columns = ["r"]
-    df_out.index = r
-    for i in greeks:
-        df_out[i] = 0
-
-    t_min = min(df_tmp["Days"])
-
-    for i, row in df_tmp.iterrows():
-        spot = np.float(row["Underlying Price"])
-        p = np.float(row[pos_col])
-        s = row["Vol"]
-        k = row["Strike"]
-        t = row["Days"]
-        px = row["Mid"]
-        t1 = t - 1/365
-        t1 = np.where(t1 == 0, 0.00001, t1)
-        t_e = t - t_min
-        t_e = np.where(t_e == 0, 0.00001, t_e)
-        if "Val" in greeks:
-            df_out["Val"] = df_out["Val"].add(p * val((1 + r) * spot, k,  0.01, 0, s, t, row["Side"]) - p*px)
-        if "Val_p1" in greeks:
-            df_out["Val_p1"] = df_out["Val"].add(p * val((1 + r) * spot, k,  0.01, 0, s, t1, row["Side"]) - p*px)
-        if "Val_exp" in greeks:
-            df_out["Val_exp"] = df_out["Val_exp"].add(p * val((1 + r) * spot, k,  0.01, 0, s, t_e, row["Side"]) - p*px)
-        if "Delta" in greeks:
-            df_out["Delta"] = df_out["Delta"].add(p * delta((1 + r) * spot, k,  0.01, 0, s, t, row["Side"]))
-        if "Gamma" in greeks:
-            df_out["Gamma"] += p * gamma((1 + r) * spot, k,  0.01, 0, s, t)
-        if "Theta" in greeks:
-            df_out["Theta"] += p * theta((1 + r) * spot, k,  0.01, 0, s, t, row["Side"])
-        if "Vega" in greeks:
-            df_out["Vega"] += p * vega((1 + r) * spot, k,  0.01, 0, s, t)
-
-    df_out["pct"] = r
-    return df_out
+    c = curves(df, [pos_col], horizons=[0, 1, "exp"], greeks=[g for g in greeks if g in GREEKS])
+    df_out = curve_frame(c, pos_col)
+    return df_out[["r"] + [g for g in greeks if g in df_out] + ["pct"]]
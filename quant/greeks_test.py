@@ -7,6 +7,7 @@ Date: 28. December 2018
 import unittest
 from quant import greeks
 import numpy as np
+import pandas as pd
 
 
 class GreekTests(unittest.TestCase):
@@ -88,6 +89,43 @@ class GreekTests(unittest.TestCase):
         self.assertEqual(0.5, np.round(greeks.norm_cdf_approx(0), 8))
         self.assertEqual(0.97503, np.round(greeks.norm_cdf_approx(1.961), 5))
 
+    def test_curves(self):
+        df = pd.DataFrame({"Underlying Price": [45.0, 45.0, 46.0],
+                           "Strike": [50.0, 40.0, 50.0],
+                           "Vol": [0.55, 0.5, 0.45],
+                           "Days": [0.25, 0.25, 0.5],
+                           "Side": ["c", "p", "c"],
+                           "Mid": [3.0, 1.0, 4.0],
+                           "Position": [1, 0, -2],
+                           "NewPosition": [2, 1, 0]})
+        c = greeks.curves(df, ["NewPosition", "Position"], horizons=[0, 1, "exp"], mult=10)
+
+        self.assertEqual((2, 5, 3, 200), c["values"].shape)
+        self.assertEqual(["Val", "Delta", "Gamma", "Theta", "Vega"], c["names"])
+
+        # Curves are linear in positions and each position vector matches its own evaluation
+        one = greeks.curves(df, ["Position"], horizons=[0, 1, "exp"], mult=10)
+        np.testing.assert_allclose(c["values"][1], one["values"][0])
+
+        # T+1 value differs from T+0, value at expiry of the first instrument is its intrinsic value
+        df_c = greeks.curve_frame(c, "Position")
+        self.assertTrue((df_c["Val"] != df_c["Val_p1"]).any())
+        s = 45.0 * (1 + c["pct"])
+        t = 0.25
+        expected = 10 * (np.maximum(s - 50.0, 0) - 3.0) - 20 * (greeks.val(46 / 45 * s, 50.0, 0.01, 0, 0.45, t, "c")
+                                                               - 4.0)
+        np.testing.assert_allclose(df_c["Val_exp"].values, expected, atol=1e-6)
+
+        # Now is always calculated first, greeks are at now whatever the ladder
+        c = greeks.curves(df, ["Position"], horizons=["exp", 1.0], mult=10)
+        self.assertEqual([0, "exp", 1.0], c["horizons"])
+        np.testing.assert_allclose(greeks.curve_frame(c, "Position")[["Val", "Delta", "Val_exp"]].values,
+                                   df_c[["Val", "Delta", "Val_exp"]].values)
+
+    def test_parse_horizons(self):
+        self.assertEqual([0, 1, 5, "exp"], greeks.parse_horizons("0, 1, 5, exp"))
+        self.assertEqual(["Val", "Val_p5", "Val_exp"], [greeks.horizon_name(h) for h in [0, 5, "exp"]])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -6,13 +6,9 @@ Date: 6. December 2018
 """
 import pandas as pd
 import numpy as np
-from sklearn.neural_network import MLPRegressor
-import boto3
 import json
 import decimal
-from boto3.dynamodb.conditions import Key
 from quant import scaling
-import matplotlib.pyplot as plt
 import pickle
 
 
@@ -32,6 +28,10 @@ def train_model(s3: str, tbl: str, inst: str = "CL"):
     :param inst: Instrument symbol
     :return:
     """
+    from sklearn.neural_network import MLPRegressor
+    from boto3.dynamodb.conditions import Key
+    import boto3
+
     # Get the data
     dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
                               endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
@@ -55,9 +55,9 @@ def train_model(s3: str, tbl: str, inst: str = "CL"):
 
     # Now train two neural nets.
     # We need some matrices
-    x_train = df[["Mny", "Days scaled", "delta"]].as_matrix()
-    y_train_l = df["LI Scaled"].as_matrix()
-    y_train_s = df["SI Scaled"].as_matrix()
+    x_train = df[["Mny", "Days scaled", "delta"]].values
+    y_train_l = df["LI Scaled"].values
+    y_train_s = df["SI Scaled"].values
 
     nnet_si = MLPRegressor(hidden_layer_sizes=(10, 10, 10),
                            learning_rate_init=0.01,
@@ -87,27 +87,57 @@ def train_model(s3: str, tbl: str, inst: str = "CL"):
     return y_train_l, y_pred_l, y_train_s, y_pred_s
 
 
-def add_margins(df: pd.DataFrame, s3: str):
+def load_model(s3: str) -> dict:
+    """
+    Downloads fitted margin model from S3
+    :param s3: S3 bucket for model storage
+    :return: dict with limits and the two nets, version of the model under "version"
+    """
+    import boto3
+
+    # TODO: Check if the object in S3 exists
+    b = boto3.resource('s3')
+    o = b.Object(s3, 'fit.data')
+    r = o.get()
+    fit = pickle.loads(r["Body"].read())
+    fit["version"] = r["ETag"]
+    return fit
+
+
+def model_version(s3: str) -> str:
+    """
+    Returns version tag of the margin model in S3 without downloading it
+    :param s3: S3 bucket for model storage
+    :return: ETag of the model object
+    """
+    import boto3
+    b = boto3.resource('s3')
+    return b.Object(s3, 'fit.data').e_tag
+
+
+def add_margins(df: pd.DataFrame, s3: str, fit: dict = None):
     """
     Adds margins to a price data frame
     :param df: Data frame to be processed
     :param s3: S3 bucket for model storage
+    :param fit: already loaded margin model, downloaded from S3 if not given
     :return:
     """
 
     # Load data
-    # TODO: Check if the object in S3 exists
-    b = boto3.resource('s3')
-    o = b.Object(s3, 'fit.data')
-    fit = pickle.loads(o.get()["Body"].read())
+    if fit is None:
+        fit = load_model(s3)
 
     # Prepare data frame
-    df['num_side'] = np.where(df['Financial Instrument'].str.contains("PUT"), -1, 1)
+    if "Put" in df:
+        df['num_side'] = np.where(df['Put'] == 1, -1, 1)
+    else:
+        df['num_side'] = np.where(df['Financial Instrument'].str.contains("PUT"), -1, 1)
     df["Mny"] = df["num_side"] * np.log(df["Underlying Price"] / df["Strike"])
     df["Days scaled"] = df["Days to Last Trading Day"] / 365
 
     # Compute margins
-    x_pred = df[["Mny", "Days scaled", "Delta"]].as_matrix()
+    x_pred = df[["Mny", "Days scaled", "Delta"]].values
     df["Marg l"] = scaling.rev_scale11(fit["long"].predict(x_pred),
                                        fit["limits"]["long_min"],
                                        fit["limits"]["long_max"])
@@ -120,5 +150,6 @@ if __name__ == "__main__":
     """
     In case of running this file we assume that we want to train a new model
     """
+    import matplotlib.pyplot as plt
     y_t_l, y_p_l, y_t_s, y_p_s = train_model("fit.data", "margin")
     plt.scatter(y_t_s, y_p_s)
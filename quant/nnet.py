@@ -5,33 +5,50 @@ Author: Peeter Meos
 Date: 18. December 2018
 """
 import pandas as pd
-from sklearn.neural_network import MLPRegressor
 
 
-def fit_iv(df: pd.DataFrame):
+# Parameters of the implied volatility net, seeded so the same snapshot gets the same volatilities
+IV_MODEL = {"hidden_layer_sizes": (80, 90, 80, 50),
+            "learning_rate_init": 0.01,
+            "learning_rate": "adaptive",
+            "activation": "relu",
+            "max_iter": 5000,
+            "random_state": 0}
+
+
+def make_iv_model():
+    """
+    Creates neural net for implied volatility fitting
+    :return: unfitted MLPRegressor
+    """
+    from sklearn.neural_network import MLPRegressor
+    return MLPRegressor(**IV_MODEL)
+
+
+def fit_iv(df: pd.DataFrame, model=None):
     """
     Interpolates implied volatilities and fills missing values from market snapshot
     We take strike and time as input values and predict IV
     :param df:
+    :param model: model to be (re)fitted, already fitted model continues from its previous weights
     :return:
     """
     df_tmp = df[["Underlying Price", "Strike", "Days", "Vol"]].copy()
     df_tmp["Mny"] = df_tmp["Strike"] / df_tmp["Underlying Price"]
 
     df_train = df_tmp[df_tmp["Vol"].notnull()]
-    x_train = df_train[["Mny", "Days"]].as_matrix()
-    y_train = df_train["Vol"].as_matrix()
+    x_train = df_train[["Mny", "Days"]].values
+    y_train = df_train["Vol"].values
 
-    model = MLPRegressor(hidden_layer_sizes=(80, 90, 80, 50),
-                         learning_rate_init=0.01,
-                         learning_rate="adaptive",
-                         activation="relu",
-                         max_iter=5000)
+    if model is None:
+        model = make_iv_model()
+    elif hasattr(model, "coefs_"):
+        model.warm_start = True
 
     model.fit(x_train, y_train)
 
     df_test = df_tmp[df_tmp["Vol"].isnull()]
-    x_test = df_test[["Mny", "Days"]].as_matrix()
+    x_test = df_test[["Mny", "Days"]].values
     y_pred = model.predict(x_test)
 
     df.loc[df["Vol"].isnull(), "Vol"] = list(y_pred)
@@ -0,0 +1,54 @@
+"""
+Reduction of the instrument universe before the optimisation model is built.
+Drops instruments that the model could not or would not trade anyway,
+existing positions are always kept.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import pandas as pd
+import numpy as np
+
+
+# Placeholder values used for missing quotes in optimiser input
+NO_QUOTE = 1000
+
+
+def reduce(df: pd.DataFrame, opt) -> (pd.DataFrame, dict):
+    """
+    Removes unusable and dominated instruments from the option chain
+    :param df: option chain data frame, missing quotes already replaced with placeholders
+    :param opt: optimiser configuration section (or dict), rules with missing options are skipped
+    :return: reduced data frame and dict with number of rows removed per rule
+    """
+    keep = df["Position"] != 0
+    drop = pd.Series(False, index=df.index)
+    report = {}
+
+    # Instruments with a valid ask and no bid can still be bought, they are priced at the ask
+    # and their spread placeholder is not held against them
+    bid = df["Bid"] > 0
+    mid = df["Mid"] if "Mid" in df else (df["Bid"] + df["Ask"]) / 2
+    mid = mid.where(bid, df["Ask"])
+
+    rules = [("no quote", (df["Ask"] >= NO_QUOTE) | (df["Ask"] <= 0) | (bid & (df["Spread"] >= NO_QUOTE)))]
+    if opt.get("max.spread") is not None:
+        rules.append(("spread", bid & (df["Spread"] > float(opt.get("max.spread")))))
+    if opt.get("min.price") is not None:
+        rules.append(("min price", mid < float(opt.get("min.price"))))
+    if opt.get("max.price") is not None:
+        rules.append(("max price", mid > float(opt.get("max.price"))))
+    if opt.get("min.days") is not None:
+        rules.append(("min days", df["Days to Last Trading Day"] < float(opt.get("min.days"))))
+
+    # Instruments without any greeks only add transaction costs to the portfolio
+    g = df[["Delta", "Gamma", "Theta", "Vega"]].abs().max(axis=1)
+    rules.append(("no greeks", g < 1e-8))
+
+    # Rows are attributed to the first rule that removes them
+    for name, mask in rules:
+        mask = mask.fillna(False) & ~keep & ~drop
+        report[name] = int(np.sum(mask))
+        drop = drop | mask
+
+    return df[~drop], report
@@ -0,0 +1,44 @@
+"""
+Unit testing for instrument universe reduction
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from quant import universe
+import pandas as pd
+
+
+class UniverseTests(unittest.TestCase):
+    def setUp(self):
+        self.opt = {"max.spread": "0.08", "min.price": "0.05", "max.price": "8.0", "min.days": "10"}
+        self.df = pd.DataFrame({"Financial Instrument": ["ok", "noquote", "wide", "cheap", "short", "held", "askonly"],
+                                "Bid": [1.0, 0.0, 1.0, 0.01, 1.0, 0.0, 0.0],
+                                "Ask": [1.05, 1000, 1.5, 0.02, 1.05, 1000, 0.5],
+                                "Spread": [0.05, 1000, 0.5, 0.01, 0.05, 1000, 1000],
+                                "Mid": [1.025, 500, 1.25, 0.015, 1.025, 500, 0.25],
+                                "Days to Last Trading Day": [30, 30, 30, 30, 5, 5, 30],
+                                "Position": [0, 0, 0, 0, 0, -2, 0],
+                                "Delta": [0.3] * 7,
+                                "Gamma": [0.1] * 7,
+                                "Theta": [-0.01] * 7,
+                                "Vega": [0.05] * 7})
+
+    def test_reduce(self):
+        df, report = universe.reduce(self.df, self.opt)
+
+        self.assertEqual(["ok", "held", "askonly"], list(df["Financial Instrument"]))
+        self.assertEqual(1, report["no quote"])
+        self.assertEqual(1, report["spread"])
+        self.assertEqual(1, report["min price"])
+        self.assertEqual(1, report["min days"])
+
+    def test_missing_options(self):
+        df, report = universe.reduce(self.df, {})
+
+        self.assertEqual(6, len(df))
+        self.assertNotIn("spread", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
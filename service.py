@@ -0,0 +1,252 @@
+"""
+Long running optimiser service.
+Keeps GAMS workspace, margin and IV models, contract ID table and TWS connection
+in memory and reruns the optimisation and export cycle on a trigger:
+timer, new market snapshot in Dynamo DB or a command over local socket.
+
+Socket commands (one per line): run, reload, status, stop
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from optimiser import Optimiser, OptException
+from quant import margins, nnet
+from tws import tools
+from utils.logger import Logger, LogLevel
+from threading import Thread, Event
+import socketserver
+import argparse
+import queue
+import time
+
+
+class OptimiserService:
+    """
+    Optimiser daemon that keeps models and data hot between the runs
+    """
+    def __init__(self, cf: str, args, loglevel: LogLevel = LogLevel.normal):
+        """
+        Constructor creates the optimiser, models are loaded in warm_up
+        :param cf: config file path
+        :param args: parsed command line arguments
+        :param loglevel: logging level
+        """
+        self.logger = Logger(loglevel, "Optimiser Service")
+        self.args = args
+        self.o = Optimiser(cf, loglevel=loglevel)
+
+        self.triggers = queue.Queue()
+        self.stopped = Event()
+        self.last_dtg = None
+        self.status = "starting"
+
+    def warm_up(self):
+        """
+        Loads everything that can be reused between the runs
+        :return:
+        """
+        self.logger.log("Loading margin model")
+        self.o.margin_fit = margins.load_model(self.o.opt["s3storage"])
+
+        self.logger.log("Loading contract ID table")
+        self.o.contract_ids = tools.get_contract_ids("instruments")
+
+        # Net is refitted each run, but continues from the weights of the previous run
+        self.o.iv_model = nnet.make_iv_model()
+
+        # When watching the store, only snapshots newer than the current one trigger a run
+        if self.args.watch is not None:
+            self.last_dtg = self.o.latest_dtg()
+
+        self.status = "idle"
+
+    def refresh(self):
+        """
+        Refreshes cached artefacts that have changed since the last run
+        :return:
+        """
+        version = margins.model_version(self.o.opt["s3storage"])
+        if version != self.o.margin_fit.get("version"):
+            self.logger.log("Margin model has changed, reloading")
+            self.o.margin_fit = margins.load_model(self.o.opt["s3storage"])
+
+    def refresh_contract_ids(self):
+        """
+        Rereads contract ID table if the data contains instruments we do not know yet
+        :return:
+        """
+        if "conid" in self.o.df:
+            return
+        known = set(self.o.contract_ids["Financial Instrument"])
+        if not set(self.o.df["Financial Instrument"].astype(str)).issubset(known):
+            self.logger.log("Unknown instruments in data, reloading contract ID table")
+            self.o.contract_ids = tools.get_contract_ids("instruments")
+
+    def cycle(self, reason: str):
+        """
+        Single optimisation and export run
+        :param reason: what triggered the run
+        :return:
+        """
+        self.logger.log("Rebalance triggered by " + reason)
+        self.status = "running"
+        t = time.time()
+
+        o = self.o
+        o.timer.reset()
+        self.refresh()
+        o.new_database()
+
+        if self.args.tws:
+            o.get_mkt_data_snapshot(export_dynamo=self.args.db, keep_alive=True)
+        elif self.args.i is not None:
+            o.get_mkt_data_csv(self.args.i)
+        else:
+            o.get_mkt_data_dynamo(dtg=self.last_dtg)
+        self.refresh_contract_ids()
+
+        o.load_mip_start()
+        o.create_gdx(self.args.ignore_existing)
+        o.run_gams(self.args.m)
+        d = o.import_gdx()
+
+        o.add_trades_to_df(d)
+        o.opt_summary(d)
+        o.save_mip_start(d)
+
+        sinks = {}
+        if self.args.db:
+            sinks["dynamo"] = lambda: o.export_results_dynamo(d)
+        if self.args.csv:
+            sinks["csv"] = lambda: o.export_trades_csv(self.args.csv)
+        if self.args.xml:
+            sinks["xml"] = lambda: o.export_xml(self.args.xml)
+        o.export_results(sinks)
+
+        o.timer.save(o.opt.get("timing.file", fallback="./tmp/timing.json"))
+        self.status = "idle, last run " + "{:.1f}".format(time.time() - t) + "s"
+        self.logger.log("Basket ready in " + "{:.1f}".format(time.time() - t) + " seconds")
+
+    def timer(self, interval: float):
+        """
+        Triggers a run at fixed intervals
+        :param interval: seconds between the runs
+        :return:
+        """
+        while not self.stopped.wait(interval):
+            self.triggers.put("timer")
+
+    def watch_store(self, interval: float):
+        """
+        Polls Dynamo DB for new market data snapshots and triggers a run when one arrives
+        :param interval: seconds between the polls
+        :return:
+        """
+        while not self.stopped.wait(interval):
+            try:
+                dtg = self.o.latest_dtg()
+            except Exception as e:
+                self.logger.error("Cannot poll market data table: " + str(e))
+                continue
+            if self.last_dtg is None or int(dtg) > int(self.last_dtg):
+                self.last_dtg = dtg
+                self.triggers.put("snapshot " + str(dtg))
+
+    def serve(self, port: int):
+        """
+        Accepts commands over local TCP socket
+        :param port: port number on localhost
+        :return:
+        """
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                cmd = self.rfile.readline().decode().strip().lower()
+                if cmd in ["run", "reload", "stop"]:
+                    service.triggers.put(cmd)
+                    self.wfile.write((cmd + " queued\n").encode())
+                elif cmd == "status":
+                    self.wfile.write((service.status + "\n").encode())
+                else:
+                    self.wfile.write(("unknown command " + cmd + "\n").encode())
+
+        server = socketserver.TCPServer(("127.0.0.1", port), Handler)
+        self.logger.log("Listening for commands on port " + str(port))
+        with server:
+            while not self.stopped.is_set():
+                server.handle_request()
+
+    def run(self):
+        """
+        Main loop, processes the triggers one by one
+        :return:
+        """
+        while not self.stopped.is_set():
+            cmd = self.triggers.get()
+
+            # Several queued triggers result in a single run
+            while not self.triggers.empty() and cmd not in ["stop", "reload"]:
+                cmd = self.triggers.get()
+
+            if cmd == "stop":
+                self.logger.log("Stopping the service")
+                self.stopped.set()
+                break
+            if cmd == "reload":
+                self.logger.log("Reloading formulation and contract IDs")
+                self.o.model_code = None
+                self.o.contract_ids = tools.get_contract_ids("instruments")
+                continue
+
+            try:
+                self.cycle(cmd)
+            except OptException:
+                self.status = "idle, last run had no trades"
+            except Exception as e:
+                self.status = "idle, last run failed"
+                self.logger.error("Run failed: " + str(e))
+
+        if self.o.snap is not None:
+            self.o.snap.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portfolio optimiser service")
+    parser.add_argument("-c", action="store", help="Configuration file", default="config.cf")
+    parser.add_argument("-i", action="store", help="Path to input data CSV file")
+    parser.add_argument("-m", action="store", help="GAMS model file, latest formulation from Dynamo if not given")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Quiet mode. Log only errors.", default=False)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging", default=False)
+    parser.add_argument("--tws", action="store_true", help="Import market data from TWS", default=False)
+    parser.add_argument("--db", action="store_true", help="Export optimisation results to Dynamo DB", default=False)
+    parser.add_argument("--xml", action="store", help="Export basket as TWS compatible XML")
+    parser.add_argument("--csv", action="store", help="Export basket as TWS compatible CSV")
+    parser.add_argument("--timer", action="store", type=float, help="Run every given number of seconds")
+    parser.add_argument("--watch", action="store", type=float,
+                        help="Poll Dynamo DB for new snapshots every given number of seconds")
+    parser.add_argument("--port", action="store", type=int, help="Listen for commands on localhost port")
+    parser.add_argument("--ignore_existing", action="store_true",
+                        help="Ignore existing positions in dataset", default=False)
+
+    args = parser.parse_args()
+
+    log = LogLevel.normal
+    if args.quiet:
+        log = LogLevel.error
+    if args.verbose:
+        log = LogLevel.verbose
+
+    s = OptimiserService(args.c, args, loglevel=log)
+    s.warm_up()
+
+    if args.timer is not None:
+        Thread(target=s.timer, args=(args.timer,), daemon=True).start()
+    if args.watch is not None:
+        Thread(target=s.watch_store, args=(args.watch,), daemon=True).start()
+    if args.port is not None:
+        Thread(target=s.serve, args=(args.port,), daemon=True).start()
+
+    # First run straight away so the basket is ready
+    s.triggers.put("start")
+    s.run()
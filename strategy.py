@@ -6,11 +6,11 @@ Date: 11. December 2018
 """
 import os
 import pandas as pd
-import boto3
-from boto3.dynamodb.conditions import Key
 import datetime
+import threading
 import configparser
-from utils import logger, data
+from utils import logger, data, timing
+from utils.timing import timed
 import json
 
 
@@ -29,6 +29,27 @@ class PortfolioStrategy:
         self.data_date = datetime.datetime.today()
         self.config = configparser.ConfigParser()
         self.inst = ""
+        self.timer = timing.StageTimer(self.logger)
+        # Resource used by all threads instead of AWS if set, ie. a stand-in
+        self._dynamo = None
+        self._local = threading.local()
+
+    @property
+    def dynamo(self):
+        """
+        Dynamo DB resource of the calling thread. boto3 resources are not thread safe,
+        so each thread, ie. a parallel result export, creates its own session and resource when first needed.
+        :return: boto3 Dynamo DB resource
+        """
+        if self._dynamo is not None:
+            return self._dynamo
+        res = getattr(self._local, "dynamo", None)
+        if res is None:
+            import boto3
+            res = boto3.session.Session().resource('dynamodb', region_name='us-east-1',
+                                                   endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
+            self._local.dynamo = res
+        return res
 
     def save_mkt_data_dynamo(self):
         """
@@ -45,43 +66,68 @@ class PortfolioStrategy:
         dct["data"] = json.dumps(dct["data"])
 
         # DB Connectivity
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
-                                  endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
-        table = dynamodb.Table(self.config["data"]["mkt.table"])
-        response = table.put_item(Item=data)
+        table = self.dynamo.Table(self.config["data"]["mkt.table"])
+        response = table.put_item(Item=dct)
         return response
 
+    @timed("data")
     def get_mkt_data_dynamo(self, dtg=None):
         """
-        Downloads market data snapshot from DynamoDB table
+        Downloads market data snapshot of the instrument from DynamoDB table
         :param dtg: Timestamp, if equals none, return latest snapshot
         :return: pandas data frame
         """
+        from boto3.dynamodb.conditions import Key
         self.logger.log("Reading market data from Dynamo DB")
 
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
-                                  endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
-        table = dynamodb.Table(self.config["data"]["mkt.table"])
+        table = self.dynamo.Table(self.config["data"]["mkt.table"])
 
         # If dtg is not given, get the latest snapshot, otherwise find the right dtg
         if dtg is None:
-            response = table.scan(AttributesToGet=["dtg"])
-            r = response["Items"]
-
-            while "LastEvaluatedKey" in response:
-                response = table.scan(AttributesToGet=["dtg"],
-                                      ExclusiveStartKey=response["LastEvaluatedKey"])
-                r = r + response["Items"]
-
-            d = pd.DataFrame.from_dict(r)
-            dtg = max(d["dtg"])
+            dtg = self.latest_dtg()
             self.logger.log("Latest timestamp in market data table is " + str(dtg))
 
         response = table.query(KeyConditionExpression=Key('dtg').eq(int(dtg)))
-        response = response["Items"][0]
+        items = [item for item in response["Items"] if self.inst == "" or item.get("inst") == self.inst]
+        if len(items) == 0:
+            self.logger.error("No " + self.inst + " market data snapshot at " + str(dtg))
+            raise KeyError(dtg)
+        response = items[0]
         self.df = pd.DataFrame(json.loads(response["data"]), columns=response["columns"], index=response["index"])
         self.data_date = datetime.datetime.strptime(str(dtg), "%y%m%d%H%M%S")
 
+    def latest_dtg(self):
+        """
+        Finds the timestamp of the latest market data snapshot of the instrument in DynamoDB
+        :return: dtg of the latest snapshot
+        """
+        return max(self.list_dtg())
+
+    def list_dtg(self, dtg_from=None, dtg_to=None) -> list:
+        """
+        Lists timestamps of the market data snapshots of the instrument in DynamoDB, all instruments if inst is empty
+        :param dtg_from: earliest timestamp (yymmddHHMMSS), no lower limit if None
+        :param dtg_to: latest timestamp (yymmddHHMMSS), no upper limit if None
+        :return: sorted list of timestamps
+        """
+        table = self.dynamo.Table(self.config["data"]["mkt.table"])
+
+        response = table.scan(AttributesToGet=["dtg", "inst"])
+        r = response["Items"]
+
+        while "LastEvaluatedKey" in response:
+            response = table.scan(AttributesToGet=["dtg", "inst"],
+                                  ExclusiveStartKey=response["LastEvaluatedKey"])
+            r = r + response["Items"]
+
+        d = sorted([int(item["dtg"]) for item in r if self.inst == "" or item.get("inst") == self.inst])
+        if dtg_from is not None:
+            d = [item for item in d if item >= int(dtg_from)]
+        if dtg_to is not None:
+            d = [item for item in d if item <= int(dtg_to)]
+        return d
+
+    @timed("data")
     def get_mkt_data_csv(self, fn: str):
         """
         Gets market data snapshot from CSV file
@@ -0,0 +1,57 @@
+"""
+Unit testing for portfolio strategy data access
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from strategy import PortfolioStrategy
+from bench import stubs
+from threading import Thread
+import pandas as pd
+import json
+
+
+class StrategyTests(unittest.TestCase):
+    def test_dynamo_per_thread(self):
+        s = PortfolioStrategy()
+        res = []
+        t = Thread(target=lambda: res.append(s.dynamo))
+        t.start()
+        t.join()
+        self.assertIs(s.dynamo, s.dynamo)
+        self.assertIsNot(s.dynamo, res[0])
+
+    def test_save_mkt_data(self):
+        s = PortfolioStrategy()
+        s._dynamo = stubs.StubDynamo()
+        s.config.read_string("[data]\nmkt.table = mktData\n")
+        s.inst = "CL"
+        s.df = pd.DataFrame({"Financial Instrument": ["CL FOP (LO) Feb'19 40 CALL @NYMEX"], "Bid": [1.5]})
+        s.save_mkt_data_dynamo()
+
+        item = s.dynamo.Table("mktData").items[s.data_date.strftime("%y%m%d%H%M%S")]
+        self.assertEqual("CL", item["inst"])
+        self.assertEqual([["CL FOP (LO) Feb'19 40 CALL @NYMEX", 1.5]], json.loads(item["data"]))
+
+    def test_dynamo_inst(self):
+        s = PortfolioStrategy()
+        s._dynamo = stubs.StubDynamo()
+        s.config.read_string("[data]\nmkt.table = mktData\n")
+        s.df = pd.DataFrame({"Financial Instrument": ["CL FOP (LO) Feb'19 40 CALL @NYMEX"], "Bid": [1.5]})
+        for i, inst in enumerate(["CL", "NG", "CL"]):
+            s.inst = inst
+            s.data_date = pd.Timestamp(2019, 1, 2, 10, i)
+            s.save_mkt_data_dynamo()
+
+        # Snapshots of other instruments are not listed nor returned
+        s.inst = "NG"
+        self.assertEqual([190102100100], s.list_dtg())
+        self.assertEqual(190102100100, s.latest_dtg())
+        self.assertRaises(KeyError, s.get_mkt_data_dynamo, dtg=190102100000)
+        s.inst = ""
+        self.assertEqual(3, len(s.list_dtg()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+Parameter sweep for the portfolio optimiser.
+Prepares the instrument data once and then solves the model for a grid
+(or random sample of a grid) of optimiser settings in parallel. Every worker
+runs in its own GAMS workspace. Results are collected into a frontier table.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from optimiser import Optimiser
+from gms import code
+from utils.logger import Logger, LogLevel
+import pandas as pd
+import itertools
+import argparse
+import random
+import os
+import sys
+
+
+# Options that can be swept, values are given as comma separated lists in [sweep] section
+SWEEP_OPTIONS = ["max.delta", "max.gamma", "min.theta", "alpha", "max.margin"]
+
+
+def make_grid(spec: dict, samples: int = None, seed: int = None) -> list:
+    """
+    Creates list of option combinations to be solved
+    :param spec: dict of option name and list of values
+    :param samples: if given, take random sample of that size from the full grid
+    :param seed: random seed for sampling
+    :return: list of dicts
+    """
+    keys = list(spec.keys())
+    grid = [dict(zip(keys, item)) for item in itertools.product(*[spec[k] for k in keys])]
+
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def read_spec(config, section: str = "sweep") -> dict:
+    """
+    Reads sweep specification from configuration
+    :param config: config parser object
+    :param section: configuration section with value lists
+    :return: dict of option name and list of values
+    """
+    spec = {}
+    for k in SWEEP_OPTIONS:
+        if k in config[section]:
+            spec[k] = [item.strip() for item in config[section][k].split(",")]
+    return spec
+
+
+def solve_point(cf: str, df: pd.DataFrame, model: str, point: dict, n: int,
+                loglevel: LogLevel = LogLevel.error) -> dict:
+    """
+    Solves the model for one set of options. This runs in a worker process.
+    :param cf: config file path
+    :param df: prepared instrument data frame
+    :param model: path to GAMS model file
+    :param point: dict of option overrides
+    :param n: sequence number of the point, also determines working directory
+    :param loglevel: logging level for the worker
+    :return: dict with summary of the results
+    """
+    res = dict(point)
+    res["n"] = n
+
+    wd = os.path.abspath(os.path.join("./tmp/sweep", str(n)))
+    os.makedirs(wd, exist_ok=True)
+
+    try:
+        o = Optimiser(cf, loglevel=loglevel, working_dir=wd)
+        o.df = df.copy()
+        for k, v in point.items():
+            o.opt[k] = str(v)
+
+        o.write_gdx()
+        o.run_gams(model)
+        d = o.import_gdx()
+    except Exception as e:
+        res["status"] = "error: " + str(e)
+        return res
+
+    res["status"] = "ok"
+    res["objective"] = next(iter(d["z"].values()))
+
+    g = d["total_greeks"].set_index("s_greeks")["new"]
+    for i in ["delta", "gamma", "theta", "vega"]:
+        res[i] = g.get(i, 0)
+
+    res["margin"] = d["total_margin"]["val"].max() if len(d["total_margin"]) > 0 else 0
+    res["legs"] = len(d["trades"])
+    res["trades"] = d["trades"]["val"].abs().sum() if len(d["trades"]) > 0 else 0
+    res["time"] = d["solve_stats"].get("time", float("nan"))
+    return res
+
+
+def mark_frontier(df: pd.DataFrame, maximise: str = "theta", minimise: str = "margin") -> pd.DataFrame:
+    """
+    Flags the points that are not dominated in terms of the two given columns
+    :param df: frontier table
+    :param maximise: column to be maximised
+    :param minimise: column to be minimised
+    :return: data frame with added boolean column "efficient"
+    """
+    df["efficient"] = False
+    ok = df[df["status"] == "ok"].sort_values([minimise, maximise], ascending=[True, False])
+
+    best = -float("inf")
+    for i, r in ok.iterrows():
+        if r[maximise] > best:
+            df.loc[i, "efficient"] = True
+            best = r[maximise]
+    return df
+
+
+def run_sweep(o: Optimiser, cf: str, grid: list, model: str, workers: int = None) -> pd.DataFrame:
+    """
+    Solves all the points of the grid in a process pool
+    :param o: optimiser with prepared data
+    :param cf: config file path
+    :param grid: list of option dicts
+    :param model: path to GAMS model file
+    :param workers: number of worker processes, defaults to CPU count
+    :return: frontier data frame
+    """
+    o.logger.log("Solving " + str(len(grid)) + " configurations")
+    res = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_point, cf, o.df, model, p, n) for n, p in enumerate(grid)]
+        for f in as_completed(futures):
+            r = f.result()
+            o.logger.verbose("Point " + str(r["n"]) + " finished with status " + r["status"])
+            res.append(r)
+
+    df = pd.DataFrame(res).sort_values("n").set_index("n")
+    return mark_frontier(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimiser parameter sweep")
+    parser.add_argument("-c", action="store", help="Configuration file", default="config.cf")
+    parser.add_argument("-i", action="store", help="Path to input data CSV file")
+    parser.add_argument("-m", action="store", help="GAMS model file, latest formulation from Dynamo if not given")
+    parser.add_argument("-o", "--out", action="store", help="Output CSV for frontier table",
+                        default="./data/frontier.csv")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Quiet mode. Log only errors.", default=False)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging", default=False)
+    parser.add_argument("--dtg", action="store", help="DTG for Dynamo DB market snapshot retrieval.")
+    parser.add_argument("--samples", action="store", type=int, help="Random sample size from the grid")
+    parser.add_argument("--seed", action="store", type=int, help="Random seed for sampling")
+    parser.add_argument("--workers", action="store", type=int, help="Number of worker processes")
+    parser.add_argument("--ignore_existing", action="store_true",
+                        help="Ignore existing positions in dataset", default=False)
+
+    args = parser.parse_args()
+
+    log = LogLevel.normal
+    if args.quiet:
+        log = LogLevel.error
+    if args.verbose:
+        log = LogLevel.verbose
+    logger = Logger(log, "Sweep")
+
+    opt = Optimiser(args.c, loglevel=log)
+    if "sweep" not in opt.config:
+        logger.error("No [sweep] section in configuration")
+        sys.exit(1)
+
+    points = make_grid(read_spec(opt.config), args.samples, args.seed)
+
+    # Output directory is created before the sweep, not found missing after it
+    if os.path.dirname(args.out) != "":
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+
+    # Data is prepared only once for all the points
+    if args.i is None:
+        opt.get_mkt_data_dynamo(dtg=args.dtg)
+    else:
+        opt.get_mkt_data_csv(args.i)
+    opt.prepare_data(args.ignore_existing)
+
+    # Same formulation for all workers
+    model_fn = args.m
+    if model_fn is None:
+        model_fn = os.path.abspath("./tmp/sweep/model.gms")
+        os.makedirs(os.path.dirname(model_fn), exist_ok=True)
+        with open(model_fn, "w") as f:
+            f.write(code.get_code("gamsCode")["code"])
+
+    frontier = run_sweep(opt, args.c, points, os.path.abspath(model_fn), args.workers)
+    frontier.to_csv(args.out)
+    logger.log("Frontier table with " + str(frontier["efficient"].sum()) + " efficient points written to " +
+               args.out)
@@ -0,0 +1,303 @@
+"""
+asyncio facade for TWS.
+Callbacks arrive on the ibapi reader thread and resolve asyncio futures keyed by request ID
+on the event loop, so requests can be awaited one by one or thousands at a time with
+gather() without polling. Requests share the message rate and market data line limits.
+Requests rejected for pacing (errors 100, 101 and 420) are sent again after the pause
+shared with the other requests, until their timeout.
+
+    async def main():
+        tws = AsyncTws()
+        await tws.start("localhost", 4001, 15)
+        res = await tws.gather([tws.snapshot(c) for c in contracts], limit=50)
+        await tws.stop()
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from ibapi.contract import Contract, ContractDetails
+from ibapi.order import Order
+from ibapi.order_state import OrderState
+from ibapi.common import OrderId, TickerId
+from ibapi.wrapper import TickType, TickAttrib
+from tws.tws import TwsTool, TwsException, PACING_ERRORS
+from utils.logger import LogLevel
+import asyncio
+import copy
+import time
+
+
+# Errors that do not fail the request
+WARNINGS = [399, 2104, 2106, 2107, 2108, 2109, 2158, 10090, 10167]
+
+# Snapshot price ticks by tick type
+PRICES = {1: "bid", 2: "ask", 4: "last", 9: "close"}
+
+
+class PacingException(TwsException):
+    """
+    Request rejected for pacing, it is sent again after the pause
+    """
+    pass
+
+
+class AsyncTws(TwsTool):
+    """
+    Awaitable contract details, market data snapshots and what-if margins
+    """
+    def __init__(self, name="Async TWS", log_level=LogLevel.normal, rate: float = 45, burst: int = 10,
+                 lines: int = 90, timeout: float = 15):
+        """
+        Constructor
+        :param name: logger name
+        :param log_level: logging level
+        :param rate: maximum average number of messages per second
+        :param burst: maximum number of messages sent at once
+        :param lines: maximum number of market data snapshots in flight
+        :param timeout: default seconds to wait for a request
+        """
+        super().__init__(name=name, log_level=log_level, rate=rate, burst=burst, lines=lines)
+        self.timeout = timeout
+        self.loop = None
+        self.line_limit = None
+
+        # Futures and partial results of open requests, results are collected by the reader thread
+        self.futures = {}
+        self.partial = {}
+
+    async def start(self, host: str, port: int, client_id: int):
+        """
+        Connects to TWS, call from the event loop the requests are made from
+        :param host: TWS host
+        :param port: TWS port
+        :param client_id: client ID
+        :return:
+        """
+        self.loop = asyncio.get_running_loop()
+        self.line_limit = asyncio.Semaphore(self.max_lines)
+        await self.loop.run_in_executor(None, self.connect, host, port, client_id)
+
+    async def stop(self):
+        """
+        Disconnects from TWS
+        :return:
+        """
+        await self.loop.run_in_executor(None, self.disconnect)
+
+    def _resolve(self, req_id: int, value=None, error: Exception = None):
+        """
+        Completes the future of a request from the reader thread
+        :param req_id: request ID
+        :param value: result, the collected partial result if None
+        :param error: exception to fail the request with
+        :return:
+        """
+        fut = self.futures.pop(req_id, None)
+        res = self.partial.pop(req_id, None)
+        if fut is None:
+            return
+        self.loop.call_soon_threadsafe(self._set, fut, res if value is None else value, error)
+
+    @staticmethod
+    def _set(fut: asyncio.Future, value, error: Exception):
+        """
+        Sets the result on the event loop, unless the request has timed out already
+        :param fut: future
+        :param value: result
+        :param error: exception or None
+        :return:
+        """
+        if fut.done():
+            return
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(value)
+
+    async def _pace(self):
+        """
+        Waits for the message rate and pacing pauses without blocking the event loop
+        :return:
+        """
+        while True:
+            wait = self.pause["until"] - time.monotonic()
+            if wait <= 0 and self.bucket.try_acquire():
+                return
+            await asyncio.sleep(max(wait, 1 / self.bucket.rate))
+
+    async def _request(self, partial, send, cancel=None, timeout: float = None):
+        """
+        Sends a request and waits for its result, sends it again after pacing errors
+        :param partial: initial partial result
+        :param send: function sending the request, called with the request ID
+        :param cancel: function cancelling the request on timeout, called with the request ID
+        :param timeout: seconds for the request including the pacing pauses, default timeout if None
+        :return: result
+        """
+        req_id = self.next_id()
+        deadline = self.loop.time() + (self.timeout if timeout is None else timeout)
+        try:
+            while True:
+                await self._pace()
+                if self.loop.time() >= deadline:
+                    raise asyncio.TimeoutError()
+                fut = self.loop.create_future()
+                self.partial[req_id] = copy.copy(partial)
+                self.futures[req_id] = fut
+                send(req_id)
+                try:
+                    return await asyncio.wait_for(fut, deadline - self.loop.time())
+                except PacingException:
+                    self.logger.verbose("Request " + str(req_id) + " rejected for pacing, sending again")
+        finally:
+            # Timed out or cancelled requests are forgotten, late callbacks are ignored
+            if self.futures.pop(req_id, None) is not None:
+                self.partial.pop(req_id, None)
+                if cancel is not None:
+                    cancel(req_id)
+
+    async def contract_details(self, cont: Contract, timeout: float = None) -> list:
+        """
+        Contract details of a contract
+        :param cont: contract, can match several contracts
+        :param timeout: seconds, default timeout if None
+        :return: list of ContractDetails
+        """
+        return await self._request([], lambda i: self.reqContractDetails(i, cont), timeout=timeout)
+
+    async def snapshot(self, cont: Contract, generic_ticks: str = "", timeout: float = None) -> dict:
+        """
+        Market data snapshot of a contract, waits for a free market data line
+        :param cont: contract
+        :param generic_ticks: generic tick list
+        :param timeout: seconds, default timeout if None
+        :return: dict of bid, ask, last and close, for options also iv, delta, gamma, vega, theta and und_price
+        """
+        async with self.line_limit:
+            return await self._request({}, lambda i: self.reqMktData(i, cont, generic_ticks, True, False, []),
+                                       self.cancelMktData, timeout)
+
+    async def what_if_margin(self, cont: Contract, order: Order, timeout: float = None) -> dict:
+        """
+        Margin and commission of an order without placing it
+        :param cont: contract
+        :param order: order, copied and sent as what-if
+        :param timeout: seconds, default timeout if None
+        :return: dict of init and maint margin change and commission
+        """
+        def send(req_id: int):
+            o = copy.copy(order)
+            o.orderId = req_id
+            o.whatIf = True
+            self.placeOrder(req_id, cont, o)
+
+        return await self._request(None, send, timeout=timeout)
+
+    async def gather(self, requests: list, limit: int = 50) -> list:
+        """
+        Runs requests concurrently, at most limit at a time
+        :param requests: awaitables, ie. [tws.snapshot(c) for c in contracts]
+        :param limit: maximum number of requests in flight
+        :return: list of results in the order of the requests, exceptions for failed and timed out requests
+        """
+        sem = asyncio.Semaphore(limit)
+
+        async def run(r):
+            async with sem:
+                return await r
+
+        return await asyncio.gather(*[run(r) for r in requests], return_exceptions=True)
+
+    def contractDetails(self, req_id: int, contract_details: ContractDetails):
+        """
+        Collects contract details of a request
+        :param req_id:
+        :param contract_details:
+        :return:
+        """
+        x = self.partial.get(req_id)
+        if x is not None:
+            x.append(contract_details)
+
+    def contractDetailsEnd(self, req_id: int):
+        """
+        End of contract details
+        :param req_id:
+        :return:
+        """
+        self._resolve(req_id)
+
+    def tickPrice(self, req_id: TickerId, tick_type: TickType, price: float,
+                  attrib: TickAttrib):
+        """
+        Collects snapshot prices
+        :param req_id:
+        :param tick_type:
+        :param price:
+        :param attrib:
+        :return:
+        """
+        x = self.partial.get(req_id)
+        if x is not None and tick_type in PRICES:
+            x[PRICES[tick_type]] = price
+
+    def tickOptionComputation(self, req_id: int, tick_type: TickType,
+                              implied_vol: float, delta: float, opt_price: float, pv_dividend: float,
+                              gamma: float, vega: float, theta: float, und_price: float):
+        """
+        Collects snapshot model greeks
+        :param req_id:
+        :param tick_type:
+        :param implied_vol:
+        :param delta:
+        :param opt_price:
+        :param pv_dividend:
+        :param gamma:
+        :param vega:
+        :param theta:
+        :param und_price:
+        :return:
+        """
+        x = self.partial.get(req_id)
+        if x is not None and tick_type == 13:
+            x.update({"iv": implied_vol, "delta": delta, "gamma": gamma, "vega": vega, "theta": theta,
+                      "und_price": und_price})
+
+    def tickSnapshotEnd(self, req_id: int):
+        """
+        End of a market data snapshot
+        :param req_id:
+        :return:
+        """
+        self._resolve(req_id)
+
+    def openOrder(self, order_id: OrderId, contract: Contract, order: Order,
+                  order_state: OrderState):
+        """
+        What-if order result
+        :param order_id:
+        :param contract:
+        :param order:
+        :param order_state:
+        :return:
+        """
+        if order.whatIf and order_id in self.futures:
+            self._resolve(order_id, {"init": float(order_state.initMarginChange),
+                                     "maint": float(order_state.maintMarginChange),
+                                     "commission": order_state.commission})
+
+    def error(self, req_id: TickerId, error_code: int, error_string: str):
+        """
+        Error override, fails the request, pacing errors have the request sent again
+        :param req_id:
+        :param error_code:
+        :param error_string:
+        :return:
+        """
+        super().error(req_id, error_code, error_string)
+        if error_code in WARNINGS or req_id not in self.futures:
+            return
+        if error_code in PACING_ERRORS:
+            self._resolve(req_id, error=PacingException(str(error_code) + ":" + error_string))
+        else:
+            self._resolve(req_id, error=TwsException(str(error_code) + ":" + error_string))
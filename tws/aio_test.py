@@ -0,0 +1,148 @@
+"""
+Unit testing for the asyncio TWS facade
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from unittest import mock
+from utils.logger import LogLevel
+from threading import Thread, Timer
+import asyncio
+
+try:
+    from tws.aio import AsyncTws
+    from tws.tws import TwsException
+    from ibapi.contract import Contract, ContractDetails
+except ImportError:
+    AsyncTws = None
+
+
+def answer(f, *args, delay: float = 0):
+    """
+    Calls a callback from another thread, like the ibapi reader thread does
+    :param f: callback
+    :param args: arguments
+    :param delay: seconds
+    :return:
+    """
+    Timer(delay, f, args).start()
+
+
+def quote(t, delay: float = 0):
+    """
+    Fake market data request answering with a snapshot
+    :param t: AsyncTws
+    :param delay: seconds before the answer
+    :return: function used as reqMktData
+    """
+    def req(req_id, *args):
+        def run():
+            t.tickPrice(req_id, 1, 1.5, None)
+            t.tickPrice(req_id, 2, 1.6, None)
+            t.tickOptionComputation(req_id, 13, 0.4, 0.5, 1.55, 0, 0.1, 0.2, -0.01, 60.0)
+            t.tickSnapshotEnd(req_id)
+        answer(run, delay=delay)
+    return req
+
+
+@unittest.skipIf(AsyncTws is None, "ibapi not installed")
+class AsyncTwsTests(unittest.TestCase):
+    def run_async(self, t, f):
+        """
+        Runs a coroutine with a started facade, connection is not made
+        :param t: AsyncTws
+        :param f: coroutine function
+        :return: result
+        """
+        async def main():
+            with mock.patch.object(AsyncTws, "connect"):
+                await t.start("localhost", 1, 99)
+            return await f()
+        return asyncio.run(main())
+
+    def tws(self, **kwargs):
+        """
+        Facade with the requests to TWS replaced by mocks, market data requests are answered with a snapshot
+        :param kwargs: constructor arguments
+        :return: AsyncTws
+        """
+        t = AsyncTws(log_level=LogLevel.error, **kwargs)
+        t.nextId = 1
+        t.reqMktData = mock.Mock(side_effect=quote(t))
+        t.cancelMktData = mock.Mock()
+        t.reqContractDetails = mock.Mock()
+        return t
+
+    def test_resolve(self):
+        t = self.tws()
+
+        def details(req_id, cont):
+            for i in [1, 2]:
+                d = ContractDetails()
+                d.contract.conId = i
+                answer(t.contractDetails, req_id, d)
+            answer(t.contractDetailsEnd, req_id, delay=0.05)
+        t.reqContractDetails.side_effect = details
+
+        d = self.run_async(t, lambda: t.contract_details(Contract()))
+        self.assertEqual([1, 2], sorted([x.contract.conId for x in d]))
+        x = self.run_async(t, lambda: t.snapshot(Contract()))
+        self.assertEqual({"bid": 1.5, "ask": 1.6, "iv": 0.4, "delta": 0.5, "gamma": 0.1, "vega": 0.2,
+                          "theta": -0.01, "und_price": 60.0}, x)
+        self.assertEqual({}, t.futures)
+        t.cancelMktData.assert_not_called()
+
+    def test_error(self):
+        t = self.tws()
+        t.reqMktData.side_effect = lambda req_id, *args: answer(t.error, req_id, 200, "No security definition")
+        self.assertRaises(TwsException, self.run_async, t, lambda: t.snapshot(Contract()))
+        self.assertEqual({}, t.futures)
+
+    def test_timeout(self):
+        t = self.tws()
+        t.reqMktData.side_effect = None
+        self.assertRaises(asyncio.TimeoutError, self.run_async, t, lambda: t.snapshot(Contract(), timeout=0.1))
+        t.cancelMktData.assert_called_once_with(1)
+
+        # Late answer of the cancelled request is ignored
+        th = Thread(target=lambda: [t.tickPrice(1, 1, 1.5, None), t.tickSnapshotEnd(1)])
+        th.start()
+        th.join()
+        self.assertEqual({}, t.futures)
+        self.assertEqual({}, t.partial)
+
+    def test_gather(self):
+        t = self.tws()
+        most = []
+
+        def req(req_id, *args):
+            most.append(len(t.futures))
+            if req_id == 4:
+                answer(t.error, req_id, 200, "No security definition", delay=0.02)
+            else:
+                quote(t, delay=0.02)(req_id)
+        t.reqMktData.side_effect = req
+
+        res = self.run_async(t, lambda: t.gather([t.snapshot(Contract()) for _ in range(10)], limit=3))
+        self.assertEqual(10, len(res))
+        self.assertLessEqual(max(most), 3)
+        self.assertIsInstance(res[3], TwsException)
+        self.assertEqual(9, len([x for x in res if isinstance(x, dict) and x["bid"] == 1.5]))
+
+    def test_pacing(self):
+        t = self.tws()
+        answers = [lambda req_id: answer(t.error, req_id, 420, "Pacing violation"), quote(t)]
+        t.reqMktData.side_effect = lambda req_id, *args: answers.pop(0)(req_id)
+
+        # Rejected snapshot is sent again under the same ID once the shared pause is over
+        with mock.patch("tws.tws.MAX_BACKOFF", 0.1):
+            x = self.run_async(t, lambda: t.snapshot(Contract(), timeout=2))
+        self.assertEqual(1.5, x["bid"])
+        self.assertEqual([1, 1], [c[0][0] for c in t.reqMktData.call_args_list])
+        self.assertEqual(0.1, t.pause["backoff"])
+        t.cancelMktData.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
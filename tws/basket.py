@@ -0,0 +1,181 @@
+"""
+Basket order submission.
+Orders are placed back to back through a rate limiter and acknowledgements
+(openOrder, orderStatus) are tracked per order ID. Orders not acknowledged
+within the timeout are placed again with the same order ID, which TWS treats
+as an update of the same order, so retries cannot double the position.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from ibapi.contract import Contract
+from ibapi.order import Order
+from ibapi.order_state import OrderState
+from ibapi.common import OrderId, TickerId
+from tws.tws import TwsTool
+from utils.logger import LogLevel
+from threading import Condition
+import pandas as pd
+import time
+
+
+# Final states, nothing more is expected for these orders
+DONE = ["Submitted", "PreSubmitted", "Filled", "Cancelled", "ApiCancelled", "Inactive", "Rejected"]
+
+# Errors that do not mean the order was rejected
+WARNINGS = [399, 2104, 2106, 2107, 2108, 2109, 2158]
+
+
+class BasketSubmitter(TwsTool):
+    """
+    Places basket orders and waits for their acknowledgements
+    """
+    def __init__(self, log_level=LogLevel.normal, rate: float = 45, burst: int = 10,
+                 timeout: float = 5, retries: int = 2):
+        """
+        Constructor
+        :param log_level: logging level
+        :param rate: maximum average number of orders per second
+        :param burst: maximum number of orders sent at once
+        :param timeout: seconds to wait for acknowledgements before retrying
+        :param retries: number of times unacknowledged orders are placed again
+        """
+        super().__init__(name="Basket Order", log_level=log_level, rate=rate, burst=burst)
+        self.timeout = timeout
+        self.retries = retries
+
+        self.legs = {}
+        self.cond = Condition()
+
+    def _update(self, order_id: int, **kwargs):
+        """
+        Updates the state of a leg and wakes up the waiting submitter
+        :param order_id: order ID
+        :param kwargs: values to be updated
+        :return:
+        """
+        with self.cond:
+            leg = self.legs.get(order_id)
+            if leg is None:
+                return
+            if leg["ack"] is None:
+                leg["ack"] = time.perf_counter() - leg["sent"]
+            leg.update(kwargs)
+            self.cond.notify_all()
+
+    def orderStatus(self, order_id: OrderId, status: str, filled: float,
+                    remaining: float, avg_fill_price: float, perm_id: int,
+                    parent_id: int, last_fill_price: float, client_id: int,
+                    why_held: str, mkt_cap_price: float):
+        """
+        Order status callback, saves the status of the leg
+        :param order_id:
+        :param status:
+        :param filled:
+        :param remaining:
+        :param avg_fill_price:
+        :param perm_id:
+        :param parent_id:
+        :param last_fill_price:
+        :param client_id:
+        :param why_held:
+        :param mkt_cap_price:
+        :return:
+        """
+        super().orderStatus(order_id, status, filled, remaining, avg_fill_price, perm_id, parent_id,
+                            last_fill_price, client_id, why_held, mkt_cap_price)
+        self._update(order_id, status=status, filled=filled)
+
+    def openOrder(self, order_id: OrderId, contract: Contract, order: Order,
+                  order_state: OrderState):
+        """
+        Open order callback, saves the status of the leg
+        :param order_id:
+        :param contract:
+        :param order:
+        :param order_state:
+        :return:
+        """
+        super().openOrder(order_id, contract, order, order_state)
+        self._update(order_id, status=order_state.status)
+
+    def error(self, req_id: TickerId, error_code: int, error_string: str):
+        """
+        Error callback, errors with order ID mark the leg rejected
+        :param req_id:
+        :param error_code:
+        :param error_string:
+        :return:
+        """
+        super().error(req_id, error_code, error_string)
+        if error_code not in WARNINGS:
+            self._update(req_id, status="Rejected", error=str(error_code) + ":" + error_string)
+
+    def _place(self, order_id: int):
+        """
+        Places the order of a leg, waiting for the rate limiter
+        :param order_id: order ID
+        :return:
+        """
+        self.pace()
+        with self.cond:
+            leg = self.legs[order_id]
+            leg["sent"] = time.perf_counter()
+            leg["attempts"] = leg["attempts"] + 1
+        self.placeOrder(order_id, leg["contract"], leg["order"])
+
+    def _pending(self) -> list:
+        """
+        Lists the legs without a final state
+        :return: list of order IDs
+        """
+        return [k for k, v in self.legs.items() if v["status"] not in DONE]
+
+    def submit(self, legs: list) -> pd.DataFrame:
+        """
+        Submits the orders and waits for their acknowledgements
+        :param legs: list of (label, contract, order) tuples
+        :return: data frame with a row per leg: order ID, label, action, quantity, limit price,
+                 status, attempts, acknowledgement time in seconds and error message
+        """
+        t = time.perf_counter()
+        with self.cond:
+            self.legs = {}
+            for i, (label, c, o) in enumerate(legs):
+                self.legs[self.nextId + i] = {"label": label, "contract": c, "order": o, "status": "Sent",
+                                              "filled": 0, "attempts": 0, "sent": None, "ack": None, "error": ""}
+            self.nextId = self.nextId + len(legs)
+
+        for k in list(self.legs.keys()):
+            self._place(k)
+
+        for attempt in range(0, self.retries + 1):
+            deadline = time.perf_counter() + self.timeout
+            with self.cond:
+                while len(self._pending()) > 0 and time.perf_counter() < deadline:
+                    self.cond.wait(deadline - time.perf_counter())
+                pending = self._pending()
+            if len(pending) == 0 or attempt == self.retries:
+                break
+
+            self.logger.log("Retrying " + str(len(pending)) + " unacknowledged orders")
+            for k in pending:
+                self._place(k)
+
+        with self.cond:
+            res = pd.DataFrame([{"order_id": k,
+                                 "label": v["label"],
+                                 "action": v["order"].action,
+                                 "quantity": v["order"].totalQuantity,
+                                 "lmt_price": v["order"].lmtPrice,
+                                 "status": v["status"] if v["status"] != "Sent" else "Timeout",
+                                 "attempts": v["attempts"],
+                                 "ack": v["ack"],
+                                 "error": v["error"]} for k, v in self.legs.items()],
+                               columns=["order_id", "label", "action", "quantity", "lmt_price", "status",
+                                        "attempts", "ack", "error"])
+
+        n_ok = (~res["status"].isin(["Timeout", "Rejected"])).sum()
+        self.logger.log("Basket of " + str(len(res)) + " orders submitted in " +
+                        "{:.2f}".format(time.perf_counter() - t) + "s, " + str(n_ok) + " acknowledged")
+        return res
@@ -0,0 +1,127 @@
+"""
+Option chain discovery.
+Listed expiries and strikes of an underlying are read from TWS with reqSecDefOptParams,
+once per underlying future, and cached for the day. Scrapers build their request lists
+from the listed strikes instead of a strike grid, so no requests are wasted on
+strikes and months that do not exist.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from datetime import datetime
+from utils.logger import Logger, LogLevel
+import json
+import os
+
+
+class ChainCache:
+    """
+    Day cache of discovered option chains, one JSON file per trading class and day
+    """
+    def __init__(self, path: str = "./tmp/chains/"):
+        """
+        Constructor
+        :param path: cache directory
+        """
+        self.path = path
+
+    def file(self, symbol: str, trading_class: str, day: str = None) -> str:
+        """
+        Cache file of a chain
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :param day: yyyymmdd, today if None
+        :return: file name
+        """
+        if day is None:
+            day = datetime.today().strftime("%Y%m%d")
+        return os.path.join(self.path, symbol + "_" + trading_class + "_" + day + ".json")
+
+    def get(self, symbol: str, trading_class: str, months: list = None, day: str = None) -> dict:
+        """
+        Reads a chain discovered on the day
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :param months: contract months that have to be discovered already, any if None
+        :param day: yyyymmdd, today if None
+        :return: dict of contract month and dict with expirations and strikes, None if not cached
+        """
+        fn = self.file(symbol, trading_class, day)
+        if not os.path.exists(fn):
+            return None
+        with open(fn, "r") as f:
+            x = json.load(f)
+        # Months that were discovered but are not listed are not in the chain, but do not need discovery again
+        if months is not None and not set(months).issubset(x["months"]):
+            return None
+        return x["chain"]
+
+    def put(self, symbol: str, trading_class: str, chain: dict, months: list, day: str = None):
+        """
+        Saves a discovered chain, adds to the chain already saved on the day
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :param chain: dict of contract month and dict with expirations and strikes
+        :param months: contract months that were discovered
+        :param day: yyyymmdd, today if None
+        :return:
+        """
+        os.makedirs(self.path, exist_ok=True)
+        fn = self.file(symbol, trading_class, day)
+        x = {"months": [], "chain": {}}
+        if os.path.exists(fn):
+            with open(fn, "r") as f:
+                x = json.load(f)
+        x["months"] = sorted(set(x["months"]) | set(months))
+        x["chain"].update(chain)
+        with open(fn, "w") as f:
+            json.dump(x, f)
+
+
+def select(chain: dict, months: list, p_from: float, p_to: float) -> dict:
+    """
+    Listed strikes of the requested months within the price range
+    :param chain: discovered chain, dict of contract month and dict with strikes
+    :param months: contract months, yyyymm
+    :param p_from: lowest strike
+    :param p_to: highest strike
+    :return: dict of contract month and list of strikes, months that are not listed are left out
+    """
+    return {m: [k for k in chain[m]["strikes"] if p_from <= k <= p_to] for m in months if m in chain}
+
+
+def get_chain(cont, months: list, host: str, port: int, client_id: int, path: str = "./tmp/chains/",
+              log_level=LogLevel.normal) -> dict:
+    """
+    Listed option chain of the day, discovered from TWS on a separate connection if not cached yet
+    :param cont: option contract with symbol, exchange, currency and trading class
+    :param months: contract months to discover, yyyymm
+    :param host: TWS host
+    :param port: TWS port
+    :param client_id: client ID for the discovery connection
+    :param path: cache directory
+    :param log_level: logging level
+    :return: dict of contract month and dict with expirations and strikes, None if discovery failed
+    """
+    log = Logger(log_level, "Chain discovery")
+    cache = ChainCache(path)
+    chain = cache.get(cont.symbol, cont.tradingClass, months)
+    if chain is not None:
+        return chain
+
+    from tws.discovery import ChainDiscovery
+    d = ChainDiscovery(log_level=log_level)
+    try:
+        d.connect(host, port, client_id)
+        chain = d.discover(cont, months)
+    except Exception as e:
+        log.error("Chain discovery failed: " + str(e))
+        return None
+    finally:
+        d.disconnect()
+
+    if len(chain) == 0:
+        log.error("No listed options found for " + cont.symbol + " " + cont.tradingClass)
+        return None
+    cache.put(cont.symbol, cont.tradingClass, chain, months)
+    return cache.get(cont.symbol, cont.tradingClass)
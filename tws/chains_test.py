@@ -0,0 +1,35 @@
+"""
+Unit testing for option chain discovery cache
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws import chains
+import tempfile
+
+
+class ChainTests(unittest.TestCase):
+    def test_cache(self):
+        c = chains.ChainCache(tempfile.mkdtemp())
+        self.assertIsNone(c.get("CL", "LO", day="20190102"))
+
+        c.put("CL", "LO", {"201902": {"expirations": ["20190114"], "strikes": [50.0, 50.5, 51.0]}},
+              ["201902", "201903"], day="20190102")
+        c.put("CL", "LO", {"201904": {"expirations": ["20190315"], "strikes": [52.0]}}, ["201904"], day="20190102")
+
+        # Months discovered but not listed do not need discovery again
+        chain = c.get("CL", "LO", ["201902", "201903", "201904"], day="20190102")
+        self.assertEqual(["201902", "201904"], sorted(chain.keys()))
+        self.assertIsNone(c.get("CL", "LO", ["201905"], day="20190102"))
+        self.assertIsNone(c.get("CL", "LO", day="20190103"))
+
+    def test_select(self):
+        chain = {"201902": {"strikes": [49.0, 50.0, 50.5, 51.0, 60.0]},
+                 "201903": {"strikes": [50.0, 55.0]}}
+        self.assertEqual({"201902": [50.0, 50.5, 51.0], "201903": [50.0]},
+                         chains.select(chain, ["201902", "201903", "201904"], 50.0, 51.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
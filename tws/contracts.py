@@ -0,0 +1,143 @@
+"""
+Local contract details cache.
+Contract IDs and last trading days of listed contracts never change, so they are
+kept in a SQLite database keyed by symbol, trading class, contract month, strike and right
+and only requested from TWS for contracts not seen before. Expired contracts are evicted.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from datetime import datetime
+from threading import Lock
+import sqlite3
+import os
+
+
+class ContractCache:
+    """
+    SQLite contract details cache. Lookups are done by the requesting thread,
+    new details are saved by the ibapi reader thread and written in batches by flush().
+    """
+    def __init__(self, path: str = "./tmp/contracts.db", evict: bool = True):
+        """
+        Constructor, opens or creates the database
+        :param path: database file, ":memory:" for an in-memory cache
+        :param evict: remove contracts past their last trading day
+        """
+        if path != ":memory:" and os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = Lock()
+        self.pending = []
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS contracts ("
+                        "symbol TEXT, class TEXT, expiry TEXT, strike REAL, side TEXT, "
+                        "conid INTEGER, last_trade TEXT, real_expiry TEXT, updated TEXT, "
+                        "PRIMARY KEY (symbol, class, expiry, strike, side))")
+        self.db.commit()
+        if evict:
+            self.evict()
+
+    @staticmethod
+    def key(symbol: str, trading_class: str, expiry: str, strike, side: str) -> tuple:
+        """
+        Normalised cache key
+        :param symbol: underlying symbol
+        :param trading_class: trading class
+        :param expiry: contract month as requested, yyyymm
+        :param strike: strike, number or string
+        :param side: C, P, CALL or PUT, any case
+        :return: key tuple
+        """
+        return str(symbol), str(trading_class), str(expiry), round(float(strike), 6), str(side)[0].upper()
+
+    def get(self, symbol: str, trading_class: str, expiry: str, strike, side: str) -> dict:
+        """
+        Details of a contract
+        :param symbol: underlying symbol
+        :param trading_class: trading class
+        :param expiry: contract month
+        :param strike: strike
+        :param side: right
+        :return: dict with conid, last_trade and real_expiry, None if not cached
+        """
+        k = self.key(symbol, trading_class, expiry, strike, side)
+        with self.lock:
+            r = self.db.execute("SELECT conid, last_trade, real_expiry FROM contracts WHERE symbol = ? AND "
+                                "class = ? AND expiry = ? AND strike = ? AND side = ?", k).fetchone()
+        if r is None:
+            return None
+        return {"conid": r[0], "last_trade": r[1], "real_expiry": r[2]}
+
+    def load(self, symbol: str, trading_class: str) -> dict:
+        """
+        All cached contracts of a trading class, for looking up a whole chain at once
+        :param symbol: underlying symbol
+        :param trading_class: trading class
+        :return: dict of key tuple and details dict
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT symbol, class, expiry, strike, side, conid, last_trade, real_expiry "
+                                   "FROM contracts WHERE symbol = ? AND class = ?",
+                                   (str(symbol), str(trading_class))).fetchall()
+        return {tuple(r[0:5]): {"conid": r[5], "last_trade": r[6], "real_expiry": r[7]} for r in rows}
+
+    def put(self, symbol: str, trading_class: str, expiry: str, strike, side: str, conid: int,
+            last_trade: str, real_expiry: str = None):
+        """
+        Saves details of a contract, written to the database by flush()
+        :param symbol: underlying symbol
+        :param trading_class: trading class
+        :param expiry: contract month as requested
+        :param strike: strike
+        :param side: right
+        :param conid: contract ID
+        :param last_trade: last trading day, yyyymmdd
+        :param real_expiry: real expiration date, yyyymmdd
+        :return:
+        """
+        k = self.key(symbol, trading_class, expiry, strike, side)
+        with self.lock:
+            self.pending.append(k + (int(conid), str(last_trade), real_expiry, datetime.today().isoformat()))
+
+    def flush(self) -> int:
+        """
+        Writes saved details to the database in one transaction
+        :return: number of contracts written
+        """
+        with self.lock:
+            rows = self.pending
+            self.pending = []
+            if len(rows) > 0:
+                self.db.executemany("INSERT OR REPLACE INTO contracts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.commit()
+        return len(rows)
+
+    def evict(self, today: str = None) -> int:
+        """
+        Removes contracts past their last trading day
+        :param today: date as yyyymmdd, today if None
+        :return: number of contracts removed
+        """
+        if today is None:
+            today = datetime.today().strftime("%Y%m%d")
+        with self.lock:
+            n = self.db.execute("DELETE FROM contracts WHERE substr(last_trade, 1, 8) < ?", (today, )).rowcount
+            self.db.commit()
+        return n
+
+    def __len__(self) -> int:
+        """
+        Number of cached contracts
+        :return:
+        """
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM contracts").fetchone()[0]
+
+    def close(self):
+        """
+        Writes pending details and closes the database
+        :return:
+        """
+        self.flush()
+        self.db.close()
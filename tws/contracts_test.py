@@ -0,0 +1,36 @@
+"""
+Unit testing for contract details cache
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws.contracts import ContractCache
+
+
+class ContractCacheTests(unittest.TestCase):
+    def test_cache(self):
+        c = ContractCache(":memory:")
+        c.put("CL", "LO", "201902", 52.5, "c", 350000001, "20190114", "20190114")
+        c.put("CL", "LO", "201902", "52.5", "PUT", 350000002, "20190114")
+        self.assertIsNone(c.get("CL", "LO", "201902", 52.5, "C"))
+        self.assertEqual(2, c.flush())
+
+        self.assertEqual(350000001, c.get("CL", "LO", "201902", "52.5", "CALL")["conid"])
+        self.assertEqual("20190114", c.get("CL", "LO", "201902", 52.5, "p")["last_trade"])
+        chain = c.load("CL", "LO")
+        self.assertEqual(350000002, chain[ContractCache.key("CL", "LO", "201902", 52.5, "P")]["conid"])
+        self.assertEqual({}, c.load("NG", "LNE"))
+
+    def test_evict(self):
+        c = ContractCache(":memory:")
+        c.put("CL", "LO", "201902", 50, "C", 1, "20190114")
+        c.put("CL", "LO", "201903", 50, "C", 2, "20190214")
+        c.flush()
+        self.assertEqual(1, c.evict("20190201"))
+        self.assertEqual(1, len(c))
+        self.assertIsNone(c.get("CL", "LO", "201902", 50, "C"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Option chain discovery from TWS.
+Underlying futures are found with one contract details request, then
+reqSecDefOptParams returns the listed expiries and strikes of the options on each future.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from ibapi.contract import Contract, ContractDetails
+from tws.tws import TwsTool
+from utils.logger import LogLevel
+from threading import Event
+import copy
+
+
+class ChainDiscovery(TwsTool):
+    """
+    Reads listed expiries and strikes of an option trading class
+    """
+    def __init__(self, log_level=LogLevel.normal, timeout: float = 10):
+        """
+        Constructor
+        :param log_level: logging level
+        :param timeout: seconds to wait for each step
+        """
+        super().__init__(name="Chain Discovery", log_level=log_level)
+        self.timeout = timeout
+        self.trading_class = None
+        self.futures = {}
+        self.months = {}
+        self.chain = {}
+        self.open = set()
+        self.done = Event()
+
+    def contractDetails(self, req_id: int, contract_details: ContractDetails):
+        """
+        Saves contract ID of an underlying future by its contract month
+        :param req_id:
+        :param contract_details:
+        :return:
+        """
+        self.futures[contract_details.contractMonth] = contract_details.contract.conId
+
+    def contractDetailsEnd(self, req_id: int):
+        """
+        All underlying futures received
+        :param req_id:
+        :return:
+        """
+        self.done.set()
+
+    def securityDefinitionOptionParameter(self, req_id: int, exchange: str, underlying_con_id: int,
+                                          trading_class: str, multiplier: str, expirations, strikes):
+        """
+        Saves listed expiries and strikes of the options on a future, other trading classes are ignored
+        :param req_id:
+        :param exchange:
+        :param underlying_con_id:
+        :param trading_class:
+        :param multiplier:
+        :param expirations: set of yyyymmdd
+        :param strikes: set of strikes
+        :return:
+        """
+        if trading_class != self.trading_class or req_id not in self.months:
+            return
+        m = self.months[req_id]
+        x = self.chain.setdefault(m, {"expirations": [], "strikes": []})
+        x["expirations"] = sorted(set(x["expirations"]) | set(expirations))
+        x["strikes"] = sorted(set(x["strikes"]) | set([float(k) for k in strikes]))
+
+    def securityDefinitionOptionParameterEnd(self, req_id: int):
+        """
+        End of option parameters of a future
+        :param req_id:
+        :return:
+        """
+        self.open.discard(req_id)
+        if len(self.open) == 0:
+            self.done.set()
+
+    def error(self, req_id: int, error_code: int, error_string: str):
+        """
+        Error override, a failed request counts as finished
+        :param req_id:
+        :param error_code:
+        :param error_string:
+        :return:
+        """
+        super().error(req_id, error_code, error_string)
+        if req_id in self.open:
+            self.securityDefinitionOptionParameterEnd(req_id)
+
+    def discover(self, cont: Contract, months: list) -> dict:
+        """
+        Discovers listed options of the trading class for given contract months of the underlying
+        :param cont: option contract with symbol, exchange, currency and trading class
+        :param months: contract months, yyyymm
+        :return: dict of contract month and dict with sorted expirations and strikes
+        """
+        self.trading_class = cont.tradingClass
+        self.chain = {}
+
+        # All futures of the symbol with one request
+        fut = copy.copy(cont)
+        fut.secType = "FUT"
+        fut.tradingClass = ""
+        fut.strike = 0
+        fut.right = ""
+        fut.lastTradeDateOrContractMonth = ""
+        self.done.clear()
+        self.pace()
+        self.reqContractDetails(self.nextId, fut)
+        if not self.done.wait(self.timeout):
+            self.logger.error("Timeout waiting for underlying futures")
+
+        # Option parameters of the futures of the requested months
+        req = {}
+        for i, m in enumerate([m for m in months if m in self.futures]):
+            req[self.nextId + 1 + i] = m
+        self.months = req
+        self.open = set(req.keys())
+        self.done.clear()
+        for req_id, m in req.items():
+            self.pace()
+            self.reqSecDefOptParams(req_id, cont.symbol, cont.exchange, "FUT", self.futures[m])
+        if len(req) > 0 and not self.done.wait(self.timeout):
+            self.logger.error("Timeout waiting for option parameters of " + str(len(self.open)) + " futures")
+
+        self.logger.log("Discovered " + str(sum([len(v["strikes"]) for v in self.chain.values()])) +
+                        " strikes in " + str(len(self.chain)) + " months of " + cont.symbol + " " +
+                        cont.tradingClass)
+        return self.chain
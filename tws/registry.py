@@ -0,0 +1,135 @@
+"""
+Request registry.
+Maps TWS request IDs to slots of the caller's data (ie. rows of the option chain),
+so callbacks find their row with one dict lookup instead of scanning the chain.
+Also counts callbacks per request and measures how long TWS takes to answer.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import numpy as np
+import time
+
+
+class RequestRegistry:
+    """
+    Request ID to slot lookup with callback statistics.
+    Requests are added by the requesting thread, callbacks are recorded by the ibapi reader thread.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.slots = {}
+        self.sent = {}
+        self.count = {}
+        self.first = {}
+        self.last = {}
+        self.unknown = 0
+
+    def clear(self):
+        """
+        Forgets all requests and statistics
+        :return:
+        """
+        self.slots = {}
+        self.sent = {}
+        self.count = {}
+        self.first = {}
+        self.last = {}
+        self.unknown = 0
+
+    def add(self, req_id: int, slot=None):
+        """
+        Registers a request, call before the request is sent
+        :param req_id: request ID
+        :param slot: slot of the request, ie. row number, request ID itself if None
+        :return:
+        """
+        self.slots[req_id] = req_id if slot is None else slot
+        self.sent[req_id] = time.perf_counter()
+        self.count[req_id] = 0
+
+    def index(self, rows: list, key: str = "id"):
+        """
+        Registers already sent requests of a list of rows, slot is the row number
+        :param rows: list of dicts
+        :param key: request ID field of the rows
+        :return:
+        """
+        for i, r in enumerate(rows):
+            self.add(r[key], i)
+
+    def remove(self, req_id: int):
+        """
+        Forgets a request, later callbacks for it count as unknown
+        :param req_id: request ID
+        :return:
+        """
+        for d in [self.slots, self.sent, self.count, self.first, self.last]:
+            d.pop(req_id, None)
+
+    def get(self, req_id: int):
+        """
+        Slot of a request without recording a callback
+        :param req_id: request ID
+        :return: slot, None for unknown requests
+        """
+        return self.slots.get(req_id)
+
+    def hit(self, req_id: int):
+        """
+        Records a callback for the request and returns its slot
+        :param req_id: request ID
+        :return: slot, None for unknown requests
+        """
+        slot = self.slots.get(req_id)
+        if slot is None:
+            self.unknown = self.unknown + 1
+            return None
+
+        t = time.perf_counter() - self.sent[req_id]
+        n = self.count[req_id] + 1
+        self.count[req_id] = n
+        if n == 1:
+            self.first[req_id] = t
+        self.last[req_id] = t
+        return slot
+
+    def __len__(self) -> int:
+        """
+        Number of registered requests
+        :return:
+        """
+        return len(self.slots)
+
+    def __contains__(self, req_id: int) -> bool:
+        """
+        Is the request registered
+        :param req_id: request ID
+        :return:
+        """
+        return req_id in self.slots
+
+    def silent(self) -> list:
+        """
+        Requests without any callbacks so far
+        :return: list of request IDs
+        """
+        return [k for k, v in list(self.count.items()) if v == 0]
+
+    def stats(self) -> dict:
+        """
+        Callback statistics, latencies are seconds from the request to its first and last callback
+        :return: dict of requests, answered, callbacks, unknown and latency percentiles
+        """
+        first = np.array(list(self.first.values()))
+        last = np.array(list(self.last.values()))
+        res = {"requests": len(self.slots),
+               "answered": len(first),
+               "callbacks": int(sum(self.count.values())),
+               "unknown": self.unknown}
+        for name, x in [("first", first), ("last", last)]:
+            for p in [50, 95, 100]:
+                res[name + ".p" + str(p)] = float(np.percentile(x, p)) if len(x) > 0 else float("nan")
+        return res
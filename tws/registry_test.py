@@ -0,0 +1,49 @@
+"""
+Unit testing for request registry
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws.registry import RequestRegistry
+
+
+class RegistryTests(unittest.TestCase):
+    def test_lookup(self):
+        r = RequestRegistry()
+        r.index([{"id": 100}, {"id": 105}, {"id": 101}])
+
+        self.assertEqual(1, r.hit(105))
+        self.assertEqual(1, r.hit(105))
+        self.assertEqual(2, r.hit(101))
+        self.assertIsNone(r.hit(7))
+        self.assertEqual([100], r.silent())
+
+        st = r.stats()
+        self.assertEqual(3, st["requests"])
+        self.assertEqual(2, st["answered"])
+        self.assertEqual(3, st["callbacks"])
+        self.assertEqual(1, st["unknown"])
+        self.assertGreaterEqual(st["last.p100"], st["first.p50"])
+
+    def test_clear(self):
+        r = RequestRegistry()
+        r.add(1)
+        self.assertEqual(1, r.hit(1))
+        r.clear()
+        self.assertEqual(0, len(r))
+        self.assertNotIn(1, r)
+
+    def test_remove(self):
+        r = RequestRegistry()
+        r.add(1, 0)
+        r.hit(1)
+        r.remove(1)
+        r.add(2, 0)
+        self.assertIsNone(r.hit(1))
+        self.assertEqual(0, r.hit(2))
+        self.assertEqual(1, r.stats()["requests"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Liquidity aware strike selection.
+Wings of the option chain rarely have a bid and are dropped by the optimiser anyway.
+Before a chain is requested, instruments are selected by a moneyness band around the last
+underlying price of each month, by the last known delta and by how many snapshots in a row
+they went without quotes. Held strikes are always requested. Instruments skipped by
+their history are checked again after a few days, so the history does not go stale.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from datetime import datetime
+import pandas as pd
+import numpy as np
+import json
+import os
+
+
+def key(month: str, strike, side: str) -> str:
+    """
+    History key of an instrument
+    :param month: contract month, yyyymm
+    :param strike: strike
+    :param side: C, P, CALL or PUT, any case
+    :return: key string
+    """
+    return str(month) + "|" + "{:g}".format(float(strike)) + "|" + str(side)[0].upper()
+
+
+def parse_bands(spec: str) -> list:
+    """
+    Moneyness bands from a config value
+    :param spec: comma separated bands by month, ie. "0.25, 0.35, 0.45", empty for no band
+    :return: list of floats
+    """
+    if spec is None:
+        return []
+    return [float(x) for x in str(spec).split(",") if x.strip() != ""]
+
+
+class QuoteHistory:
+    """
+    Last underlying prices and quote history of the instruments of a trading class, one JSON file per class
+    """
+    def __init__(self, path: str = "./tmp/quotes/"):
+        """
+        Constructor
+        :param path: history directory
+        """
+        self.path = path
+
+    def file(self, symbol: str, trading_class: str) -> str:
+        """
+        History file of a trading class
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :return: file name
+        """
+        return os.path.join(self.path, symbol + "_" + trading_class + ".json")
+
+    def load(self, symbol: str, trading_class: str) -> dict:
+        """
+        Reads the history
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :return: dict with underlying prices by month and instrument dicts with misses, delta and checked day
+        """
+        fn = self.file(symbol, trading_class)
+        if not os.path.exists(fn):
+            return {"underlying": {}, "instruments": {}}
+        with open(fn, "r") as f:
+            return json.load(f)
+
+    def update(self, symbol: str, trading_class: str, df: pd.DataFrame, day: str = None) -> dict:
+        """
+        Adds the quotes of a snapshot to the history. An instrument quoted with bid and ask resets
+        its misses, an instrument without quotes adds one.
+        :param symbol: underlying symbol
+        :param trading_class: option trading class
+        :param df: snapshot with Expiry, Strike, Side, Bid, Ask, Delta and Underlying Price columns
+        :param day: yyyymmdd, today if None
+        :return: updated history
+        """
+        if day is None:
+            day = datetime.today().strftime("%Y%m%d")
+        h = self.load(symbol, trading_class)
+
+        quoted = ((df["Bid"] > 0) & (df["Ask"] > 0)).values
+        delta = df["Delta"].abs().values
+        for i, (m, k, s) in enumerate(zip(df["Expiry"], df["Strike"], df["Side"])):
+            x = h["instruments"].setdefault(key(m, k, s), {"misses": 0, "delta": None, "checked": day})
+            x["misses"] = 0 if quoted[i] else x["misses"] + 1
+            if not np.isnan(delta[i]):
+                x["delta"] = float(delta[i])
+            x["checked"] = day
+
+        und = df.groupby("Expiry")["Underlying Price"].median().dropna()
+        h["underlying"].update({str(m): float(p) for m, p in und.items()})
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.file(symbol, trading_class), "w") as f:
+            json.dump(h, f)
+        return h
+
+
+def select(grid: dict, sides: list, history: dict, held: list = (), bands: list = (), min_delta: float = 0,
+           max_misses: int = 0, recheck: int = 5, day: str = None) -> (dict, pd.DataFrame):
+    """
+    Selects the instruments worth requesting
+    :param grid: dict of contract month and list of strikes
+    :param sides: sides as used by the caller, ie. ["c", "p"]
+    :param history: quote history from QuoteHistory.load
+    :param held: strikes of held positions, requested in every month and side
+    :param bands: maximum distance of the strike from the last underlying price as a fraction of it,
+     one per month in grid order, the last one is used for the following months, empty for no band
+    :param min_delta: minimum last known absolute delta, 0 to request any delta
+    :param max_misses: snapshots in a row without quotes before an instrument is skipped, 0 to never skip
+    :param recheck: days after which an instrument skipped by its history is requested again
+    :param day: yyyymmdd, today if None
+    :return: dict of contract month and list of (strike, side) to request,
+     data frame of skipped instruments with Expiry, Strike, Side and reason columns
+    """
+    today = datetime.strptime(day, "%Y%m%d") if day is not None else datetime.today()
+    held = set([round(float(k), 6) for k in held])
+    plan = {}
+    skipped = []
+    for n, (m, strikes) in enumerate(grid.items()):
+        plan[m] = []
+        und = history["underlying"].get(m)
+        band = bands[min(n, len(bands) - 1)] if len(bands) > 0 else None
+        for k in strikes:
+            for s in sides:
+                reason = None
+                x = history["instruments"].get(key(m, k, s))
+                fresh = x is not None and (today - datetime.strptime(x["checked"], "%Y%m%d")).days < recheck
+                if round(float(k), 6) in held:
+                    pass
+                elif band is not None and und is not None and abs(float(k) / und - 1) > band:
+                    reason = "moneyness"
+                elif fresh and min_delta > 0 and x["delta"] is not None and x["delta"] < min_delta:
+                    reason = "delta"
+                elif fresh and max_misses > 0 and x["misses"] >= max_misses:
+                    reason = "no quote"
+
+                if reason is None:
+                    plan[m].append((k, s))
+                else:
+                    skipped.append({"Expiry": m, "Strike": k, "Side": s.upper(), "reason": reason})
+
+    return plan, pd.DataFrame(skipped, columns=["Expiry", "Strike", "Side", "reason"])
+
+
+def summary(skipped: pd.DataFrame) -> str:
+    """
+    Log line of skipped instruments by reason
+    :param skipped: skipped instruments from select
+    :return: text
+    """
+    if len(skipped) == 0:
+        return "no instruments skipped"
+    return ", ".join([str(v) + " " + k for k, v in skipped["reason"].value_counts().items()]) + " skipped"
@@ -0,0 +1,46 @@
+"""
+Unit testing for liquidity aware strike selection
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws import selection
+import pandas as pd
+import numpy as np
+import tempfile
+
+
+class SelectionTests(unittest.TestCase):
+    def test_history(self):
+        h = selection.QuoteHistory(tempfile.mkdtemp())
+        df = pd.DataFrame({"Expiry": ["201902"] * 2, "Strike": [50.0, 70.0], "Side": ["C", "C"],
+                           "Bid": [1.0, np.nan], "Ask": [1.1, np.nan], "Delta": [0.5, np.nan],
+                           "Underlying Price": [51.0, 51.0]})
+        h.update("CL", "LO", df, day="20190102")
+        x = h.update("CL", "LO", df, day="20190103")
+        self.assertEqual(51.0, x["underlying"]["201902"])
+        self.assertEqual(0, x["instruments"]["201902|50|C"]["misses"])
+        self.assertEqual(2, x["instruments"]["201902|70|C"]["misses"])
+        self.assertIsNone(x["instruments"]["201902|70|C"]["delta"])
+        self.assertEqual(x, h.load("CL", "LO"))
+
+    def test_select(self):
+        history = {"underlying": {"201902": 50.0},
+                   "instruments": {"201902|52|C": {"misses": 0, "delta": 0.005, "checked": "20190102"},
+                                   "201902|52|P": {"misses": 4, "delta": 0.6, "checked": "20190102"},
+                                   "201902|51|P": {"misses": 3, "delta": 0.3, "checked": "20190102"},
+                                   "201902|49|P": {"misses": 3, "delta": 0.3, "checked": "20181201"}}}
+        grid = {"201902": [40.0, 49.0, 51.0, 52.0], "201903": [40.0]}
+        plan, skipped = selection.select(grid, ["c", "p"], history, held=[51.0], bands=[0.1], min_delta=0.01,
+                                         max_misses=3, day="20190103")
+
+        # Held strikes are kept, stale history is checked again, months without prices have no band
+        self.assertEqual([(49.0, "c"), (49.0, "p"), (51.0, "c"), (51.0, "p")], plan["201902"])
+        self.assertEqual([(40.0, "c"), (40.0, "p")], plan["201903"])
+        self.assertEqual({"moneyness": 2, "delta": 1, "no quote": 1}, skipped["reason"].value_counts().to_dict())
+        self.assertEqual("2 moneyness, 1 delta, 1 no quote skipped", selection.summary(skipped))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Sharded option chain snapshot.
+One TWS connection processes all callbacks of a snapshot on its single reader thread.
+The coordinator opens several connections with their own client IDs, splits the instruments
+among them by expiry or round-robin and merges their tick stores into one data frame.
+Market data lines, the message rate and the pause after pacing errors are account wide,
+so they are shared by the connections.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from utils import logger
+from utils.logger import Logger
+from utils.rate import TokenBucket
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+
+def split(plan: dict, n: int, by: str = "expiry") -> list:
+    """
+    Splits the instruments to request among shards
+    :param plan: dict of contract month and list of (strike, side)
+    :param n: number of shards
+    :param by: "expiry" keeps months whole, largest months go to the least loaded shard first,
+     "round-robin" deals the instruments out one by one
+    :return: list of n plans
+    """
+    parts = [{} for _ in range(n)]
+    if by == "expiry":
+        load = [0] * n
+        for m in sorted(plan.keys(), key=lambda x: -len(plan[x])):
+            k = load.index(min(load))
+            parts[k][m] = plan[m]
+            load[k] = load[k] + len(plan[m])
+    elif by == "round-robin":
+        c = 0
+        for m, items in plan.items():
+            for x in items:
+                parts[c % n].setdefault(m, []).append(x)
+                c = c + 1
+    else:
+        raise ValueError("Unknown shard split " + str(by))
+    return parts
+
+
+class ShardedSnapshot:
+    """
+    Option chain snapshot over several TWS connections, used like a Snapshot
+    """
+    def __init__(self, config=None, log_level=logger.LogLevel.normal):
+        """
+        Constructor
+        :param config: optimiser config, shards.count and shards.split set the sharding,
+         tws.lines and shards.rate are shared by all shards
+        :param log_level: logging level
+        """
+        from tws.snapshot import Snapshot
+        self.logger = Logger(log_level, "Sharded Snapshot")
+        self.n = int(config.get("shards.count", "2"))
+        self.by = config.get("shards.split", "expiry")
+        self.lead = Snapshot(config=config, log_level=log_level)
+        self.shards = [self.lead] + [Snapshot(config=config, log_level=log_level, contracts=self.lead.contracts)
+                                     for _ in range(self.n - 1)]
+        self.contract_ids = None
+
+        # Account wide budgets: one message rate and pacing pause for all connections,
+        # market data lines split among them
+        bucket = TokenBucket(float(config.get("shards.rate", config.get("tws.rate", "45"))), 10)
+        lines = max(1, int(config.get("tws.lines", "90")) // self.n)
+        for s in self.shards:
+            s.bucket = bucket
+            s.pacing = self.lead.pacing
+            s.pause = self.lead.pause
+            s.lines = lines
+            s.max_lines = lines
+        self.pool = ThreadPoolExecutor(max_workers=self.n)
+        self.running = []
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        Last merged snapshot
+        :return:
+        """
+        return self.lead.df
+
+    def connect(self, host: str, port: int, client_id: int):
+        """
+        Connects the shards with consecutive client IDs, chain discovery uses the ID after them
+        :param host: TWS host
+        :param port: TWS port
+        :param client_id: client ID of the first shard
+        :return:
+        """
+        for k, s in enumerate(self.shards):
+            s.connect(host, port, client_id + k)
+        self.lead.discovery_id = client_id + self.n
+
+    def disconnect(self):
+        """
+        Disconnects all shards
+        :return:
+        """
+        for s in self.shards:
+            s.disconnect()
+        self.pool.shutdown()
+
+    def clear(self):
+        """
+        Clears chain and account data of all shards
+        :return:
+        """
+        for s in self.shards:
+            s.clear()
+
+    def create_instruments(self):
+        """
+        Finds the instruments with the first shard and starts the requests of every shard in parallel
+        :return:
+        """
+        parts = split(self.lead.plan_instruments(), self.n, self.by)
+        self.logger.log("Requesting " + ", ".join([str(sum([len(v) for v in p.values()])) for p in parts]) +
+                        " instruments over " + str(self.n) + " connections")
+        self.running = [self.pool.submit(s.request_instruments, p) for s, p in zip(self.shards, parts)]
+
+    def wait_to_finish(self):
+        """
+        Waits until every shard has finished
+        :return:
+        """
+        for f in self.running:
+            f.result()
+        self.running = [self.pool.submit(s.wait_to_finish) for s in self.shards]
+        for f in self.running:
+            f.result()
+        self.running = []
+        self.lead.failed = pd.concat([s.failed for s in self.shards], ignore_index=True)
+
+    def prepare_df(self) -> pd.DataFrame:
+        """
+        Merges the tick stores of the shards and prepares the data frame with the positions of the account
+        :return: market data frame
+        """
+        for s in self.shards:
+            s.requests.clear()
+        df = pd.concat([s.ticks.frame() for s in self.shards], ignore_index=True)
+        self.lead.history.update(self.lead.cont.symbol, self.lead.cont.tradingClass, df)
+        self.lead.contract_ids = self.contract_ids
+        return self.lead.prepare_df(df)
+
+    def export_dynamo(self, tbl="mktData"):
+        """
+        Exports the merged snapshot to Dynamo DB
+        :param tbl: Dynamo DB table
+        :return:
+        """
+        self.lead.export_dynamo(tbl)
@@ -0,0 +1,57 @@
+"""
+Unit testing for sharded snapshot request split
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws import shards
+from utils.logger import LogLevel
+import tempfile
+import time
+import os
+
+try:
+    from tws.snapshot import Snapshot
+except ImportError:
+    Snapshot = None
+
+
+class ShardTests(unittest.TestCase):
+    def test_split(self):
+        plan = {"201902": [(50.0, "c"), (50.0, "p"), (51.0, "c")],
+                "201903": [(50.0, "c")],
+                "201904": [(50.0, "c"), (50.0, "p")]}
+
+        # Whole months, the largest first to the least loaded shard
+        parts = shards.split(plan, 2, "expiry")
+        self.assertEqual([["201902"], ["201904", "201903"]], [list(p.keys()) for p in parts])
+
+        parts = shards.split(plan, 2, "round-robin")
+        self.assertEqual([3, 3], [sum([len(v) for v in p.values()]) for p in parts])
+        self.assertEqual([(50.0, "c"), (51.0, "c")], parts[0]["201902"])
+        self.assertEqual(sorted(sum(plan.values(), [])), sorted(sum([sum(p.values(), []) for p in parts], [])))
+
+        self.assertRaises(ValueError, shards.split, plan, 2, "strike")
+
+    @unittest.skipIf(Snapshot is None, "ibapi or boto3 not installed")
+    def test_shared(self):
+        wd = tempfile.mkdtemp()
+        config = {"symbol": "CL", "class": "LO", "sectype": "FOP", "currency": "USD", "exchange": "NYMEX",
+                  "price.from": "30", "price.to": "90", "price.step": "0.5",
+                  "rel.start.month": "1", "rel.step.month": "1", "months": "1",
+                  "contracts.path": os.path.join(wd, "contracts.db"), "select.path": wd,
+                  "shards.count": "3", "tws.lines": "90"}
+        s = shards.ShardedSnapshot(config, LogLevel.error)
+        a, b, c = s.shards
+
+        # Pacing error on one connection pauses all of them
+        b.error(5, 420, "Pacing violation")
+        self.assertGreater(c.pause["until"], time.monotonic())
+        self.assertIs(a.pacing, c.pacing)
+        self.assertIs(a.contracts, c.contracts)
+        self.assertEqual([30, 30, 30], [x.lines for x in s.shards])
+
+
+if __name__ == "__main__":
+    unittest.main()
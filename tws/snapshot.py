@@ -8,16 +8,21 @@ Date: 11. December 2018
 """
 from ibapi.contract import Contract, ContractDetails
 from ibapi.wrapper import TickType, TickAttrib
-from tws.tws import TwsTool
+from tws.tws import TwsTool, PACING_ERRORS
+from tws.ticks import TickStore
+from tws.contracts import ContractCache
+from tws import selection
+from threading import Event, Lock
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from tws import tools
 from utils import logger
 import pandas as pd
 import numpy as np
 import time
 import boto3
 import argparse
+import configparser
+import copy
 import json
 
 """
@@ -30,7 +35,7 @@ Ask                             11.69
 Spread                          0.08
 Position
 Avg Price
-Implied Vol. %                  50.8%
+Implied Vol. %                  50.8
 Delta                           0.964931
 Gamma                           0.010373
 Vega                            0.012236
@@ -38,24 +43,53 @@ Theta                           -0.008877
 Days to Last Trading Day        30.0
 """
 
+# Request state flags of an instrument: market data snapshot ended, contract details ended, failed with an error
+SNAPSHOT_END = 1
+DETAILS_END = 2
+FAILED = 4
+
+# Errors for market data requests that do not stop the data from arriving
+WARNINGS = [10090, 10167]
+
 
 class Snapshot(TwsTool):
     """
     Class implements option chain snapshot data request and retrieval logic from TWS
     """
-    def __init__(self, config=None, log_level=logger.LogLevel.normal):
+    def __init__(self, config=None, log_level=logger.LogLevel.normal, contracts: ContractCache = None):
         """
         Standard constructor for the class
+        :param config: optimiser config
+        :param log_level: logging level
+        :param contracts: contract details cache shared with other scrapers, opened from contracts.path if None
         """
-        super().__init__(name="Snapshot Scraper", log_level=log_level)
+        # Plain dicts of options, as in the benchmark, are read like the optimiser section
+        if isinstance(config, dict):
+            parser = configparser.ConfigParser(interpolation=None)
+            parser.read_dict({"snapshot": config})
+            config = parser["snapshot"]
 
-        self.config = config
+        super().__init__(name="Snapshot Scraper", log_level=log_level,
+                         rate=float(config.get("tws.rate", "45")), lines=int(config.get("tws.lines", "90")))
 
-        self.chain = []
+        self.config = config
+        self.timeout = float(config.get("snapshot.timeout", "15"))
+        self.retries = int(config.get("snapshot.retries", "2"))
+        self.contracts = ContractCache(config.get("contracts.path", "./tmp/contracts.db")) \
+            if contracts is None else contracts
+        self.history = selection.QuoteHistory(config.get("select.path", "./tmp/quotes/"))
+        self.skipped = pd.DataFrame()
+
+        # Completion tracking, updated by the callbacks
+        self.track = Lock()
+        self.complete = Event()
+        self.new_chain(0)
         self.months = []
         self.account = {}
         self.strikes = []
         self.df = pd.DataFrame()
+        self.contract_ids = None
+        self.discovery_id = None
 
         self.p_from = float(config["price.from"])
         self.p_to = float(config["price.to"])
@@ -85,12 +119,103 @@ class Snapshot(TwsTool):
             self.cont.secType = config["sectype"]
             self.cont.tradingClass = config["class"]
 
+    def clear(self):
+        """
+        Clears chain and account data so a connected scraper can take another snapshot.
+        Not named reset, EClient.reset clears the connection state and is called by the client itself.
+        :return:
+        """
+        self.new_chain(0)
+        self.requests.clear()
+        self.account = {}
+        self.df = pd.DataFrame()
+        self.p_from = float(self.config["price.from"])
+        self.p_to = float(self.config["price.to"])
+
+    def new_chain(self, n: int):
+        """
+        Allocates tick store and request tracking for a chain
+        :param n: number of instruments
+        :return:
+        """
+        self.ticks = TickStore(n)
+        self.state = np.zeros(n, dtype=np.int8)
+        self.deadline = np.full(n, np.inf)
+        self.attempts = np.zeros(n, dtype=np.int16)
+        self.errors = {}
+        self.failed = pd.DataFrame()
+        self.pending = n
+        self.complete.clear()
+        if n == 0:
+            self.complete.set()
+
+    def contract(self, slot: int) -> Contract:
+        """
+        Contract of an instrument in the chain
+        :param slot: instrument slot
+        :return: contract
+        """
+        c = copy.copy(self.cont)
+        c.right = self.ticks.labels["Side"][slot]
+        c.strike = float(self.ticks.column("Strike")[slot])
+        c.lastTradeDateOrContractMonth = self.ticks.labels["Expiry"][slot]
+        return c
+
+    def _finish(self, req_id: int, flag: int, error: str = None):
+        """
+        Records the end of a request for an instrument, sets the completion event when all instruments are done
+        :param req_id: request ID
+        :param flag: SNAPSHOT_END, DETAILS_END or FAILED
+        :param error: error message for failed requests
+        :return:
+        """
+        slot = self.requests.get(req_id)
+        if slot is None:
+            return
+        with self.track:
+            before = self.state[slot]
+            self.state[slot] = before | flag
+            if error is not None:
+                self.errors[slot] = error
+            if not self._done(before) and self._done(self.state[slot]):
+                self.pending = self.pending - 1
+                if self.pending == 0:
+                    self.complete.set()
+
+    @staticmethod
+    def _done(state) -> bool:
+        """
+        Is the instrument done, both requests ended or failed
+        :param state: state flags, scalar or array
+        :return:
+        """
+        return ((state & FAILED) != 0) | ((state & (SNAPSHOT_END | DETAILS_END)) == (SNAPSHOT_END | DETAILS_END))
+
+    def req_snapshot(self, req_id: int, cont: Contract, generic_ticks: str = ""):
+        """
+        Snapshot request override, starts the deadline of the instrument once the request is sent
+        :param req_id:
+        :param cont:
+        :param generic_ticks:
+        :return:
+        """
+        super().req_snapshot(req_id, cont, generic_ticks)
+        slot = self.requests.get(req_id)
+        if slot is not None:
+            self.deadline[slot] = time.monotonic() + self.timeout
+
     def create_instruments(self):
         """
         Creates instruments
         :return:
         """
+        self.request_instruments(self.plan_instruments())
 
+    def plan_instruments(self) -> dict:
+        """
+        Reads account positions and finds the instruments to request
+        :return: dict of contract month and list of (strike, side)
+        """
         self.logger.log("Creating instruments and requesting data")
 
         # This updates portfolio positions, also saves strikes
@@ -108,38 +233,123 @@ class Snapshot(TwsTool):
         self.strikes = np.array(range(0, int(round((self.p_to - self.p_from) /
                                                    self.p_step)))) * self.p_step + self.p_from
 
+        grid = self.request_grid(self.cont, self.months, self.strikes,
+                                 self.config.getboolean("chain.discovery", fallback=True),
+                                 self.config.get("chain.path", "./tmp/chains/"), self.discovery_id)
+
+        # Instruments worth requesting by moneyness, delta and quote history, held strikes are always requested
         sides = ["c", "p"]
+        plan, self.skipped = selection.select(
+            grid, sides, self.history.load(self.cont.symbol, self.cont.tradingClass),
+            held=[v["strike"] for v in self.account.values()],
+            bands=selection.parse_bands(self.config.get("select.band", "")),
+            min_delta=float(self.config.get("select.min.delta", "0")),
+            max_misses=int(self.config.get("select.misses", "0")),
+            recheck=int(self.config.get("select.recheck", "5")))
+        self.logger.log(selection.summary(self.skipped) + " of " +
+                        str(sum([len(v) for v in grid.values()]) * len(sides)) + " instruments")
+        return plan
+
+    def request_instruments(self, plan: dict):
+        """
+        Requests market data and contract details of the instruments
+        :param plan: dict of contract month and list of (strike, side)
+        :return:
+        """
+        self.new_chain(sum([len(v) for v in plan.values()]))
+        cached = self.contracts.load(self.cont.symbol, self.cont.tradingClass)
         o = int(self.nextId) + 1
-        for m in self.months:
+        for m, items in plan.items():
             self.logger.log("Requesting month " + m)
-            for i in self.strikes:
-                for j in sides:
-                    str_s = "CALL" if str(j) == "c" else "PUT"
-                    str_f = self.cont.symbol + " " + self.cont.secType + " ("
-                    str_f += self.cont.tradingClass + ") "
-                    str_f += datetime.strptime(m, "%Y%m").strftime("%b'%y")
-                    str_f += " " + "{:g}".format(i) + " "
-                    str_f += str_s + " @" + self.cont.exchange
-                    self.chain.append({"id": o,
-                                       "Financial Instrument": str_f,
-                                       "Strike": i,
-                                       "Side": j.upper(),
-                                       "Expiry": m,
-                                       "Underlying Price": float('nan'),
-                                       "Bid": float('nan'),
-                                       "Ask": float('nan'),
-                                       "Delta": float('nan'),
-                                       "Gamma": float('nan')})
-                    self.cont.right = j.upper()
-                    self.cont.strike = i
-                    self.cont.lastTradeDateOrContractMonth = m
-
-                    time.sleep(1/40)
-                    self.reqMktData(o, self.cont, genericTickList="",
-                                    snapshot=True, regulatorySnapshot=False,
-                                    mktDataOptions=[])
+            for i, j in items:
+                str_s = "CALL" if str(j) == "c" else "PUT"
+                str_f = self.cont.symbol + " " + self.cont.secType + " ("
+                str_f += self.cont.tradingClass + ") "
+                str_f += datetime.strptime(m, "%Y%m").strftime("%b'%y")
+                str_f += " " + "{:g}".format(i) + " "
+                str_f += str_s + " @" + self.cont.exchange
+                self.requests.add(o, self.ticks.add(o, Strike=i, Side=j.upper(), Expiry=m,
+                                                    **{"Financial Instrument": str_f}))
+                self.cont.right = j.upper()
+                self.cont.strike = i
+                self.cont.lastTradeDateOrContractMonth = m
+
+                self.attempts[self.requests.get(o)] = 1
+                self.subscribe(o, self.cont)
+
+                # Contract details are only requested for contracts not seen before
+                d = cached.get(ContractCache.key(self.cont.symbol, self.cont.tradingClass, m, i, j))
+                if d is None:
+                    self.pace()
                     self.reqContractDetails(o, self.cont)
-                    o = o + 1
+                else:
+                    self.set_details(self.requests.get(o), d["conid"], d["last_trade"])
+                    self._finish(o, DETAILS_END)
+                o = o + 1
+        with self.pacing:
+            self.nextId = max(int(self.nextId), o)
+
+    def subscribe(self, req_id: int, cont: Contract):
+        """
+        Requests market data of an instrument, a snapshot
+        :param req_id: request ID
+        :param cont: contract
+        :return:
+        """
+        self.req_snapshot(req_id, cont)
+
+    def tickSnapshotEnd(self, req_id: int):
+        """
+        End of market data snapshot of an instrument
+        :param req_id:
+        :return:
+        """
+        super().tickSnapshotEnd(req_id)
+        self._finish(req_id, SNAPSHOT_END)
+
+    def contractDetailsEnd(self, req_id: int):
+        """
+        End of contract details of an instrument
+        :param req_id:
+        :return:
+        """
+        self._finish(req_id, DETAILS_END)
+
+    def error(self, req_id: int, error_code: int, error_string: str):
+        """
+        Error override, errors for an instrument other than pacing and warnings mark it failed
+        :param req_id:
+        :param error_code:
+        :param error_string:
+        :return:
+        """
+        super().error(req_id, error_code, error_string)
+        if error_code not in PACING_ERRORS and error_code not in WARNINGS:
+            self._finish(req_id, FAILED, str(error_code) + ":" + error_string)
+
+    def rerequest(self, slot: int):
+        """
+        Requests again the parts of an instrument that have not ended under a new request ID,
+        so late callbacks of the cancelled request, ie. error 300 for the cancel, do not reach the instrument
+        :param slot: instrument slot
+        :return:
+        """
+        old_id = int(self.ticks.ids[slot])
+        req_id = self.next_id()
+        self.requests.remove(old_id)
+        self.requests.add(req_id, slot)
+        self.ticks.ids[slot] = req_id
+        c = self.contract(slot)
+        self.attempts[slot] = self.attempts[slot] + 1
+        if self.state[slot] & SNAPSHOT_END == 0:
+            self.release(old_id)
+            self.pace()
+            self.cancelMktData(old_id)
+            self.req_snapshot(req_id, c)
+        if self.state[slot] & DETAILS_END == 0:
+            self.pace()
+            self.reqContractDetails(req_id, c)
+        self.deadline[slot] = time.monotonic() + self.timeout
 
     def tickPrice(self, req_id: int, tick_type: TickType, price: float,
                   attrib: TickAttrib):
@@ -151,12 +361,13 @@ class Snapshot(TwsTool):
         :param attrib:
         :return:
         """
-        for i in self.chain:
-            if i["id"] == req_id:
-                if tick_type == 1:
-                    i["Bid"] = price
-                elif tick_type == 2:
-                    i["Ask"] = price
+        slot = self.requests.hit(req_id)
+        if slot is None:
+            return
+        if tick_type == 1:
+            self.ticks.set(slot, "Bid", price)
+        elif tick_type == 2:
+            self.ticks.set(slot, "Ask", price)
 
     def contractDetails(self, req_id: int, contract_details: ContractDetails):
         """
@@ -165,10 +376,25 @@ class Snapshot(TwsTool):
         :param contract_details:
         :return:
         """
-        for i in self.chain:
-            if req_id == i["id"]:
-                i["conid"] = contract_details.contract.conId
-                i["Days to Last Trading Day"] = contract_details.contract.lastTradeDateOrContractMonth
+        slot = self.requests.hit(req_id)
+        if slot is None:
+            return
+        c = contract_details.contract
+        self.set_details(slot, c.conId, c.lastTradeDateOrContractMonth)
+        self.contracts.put(self.cont.symbol, self.cont.tradingClass, self.ticks.labels["Expiry"][slot],
+                           self.ticks.column("Strike")[slot], self.ticks.labels["Side"][slot],
+                           c.conId, c.lastTradeDateOrContractMonth, contract_details.realExpirationDate)
+
+    def set_details(self, slot: int, conid: int, last_trade: str):
+        """
+        Saves contract ID and last trading day of an instrument
+        :param slot: instrument slot
+        :param conid: contract ID
+        :param last_trade: last trading day, yyyymmdd
+        :return:
+        """
+        self.ticks.set(slot, "conid", conid)
+        self.ticks.set_label(slot, "Days to Last Trading Day", last_trade[0:8])
 
     def tickOptionComputation(self, req_id: int, tick_type: TickType,
                               implied_vol: float, delta: float, opt_price: float, pv_dividend: float,
@@ -187,22 +413,21 @@ class Snapshot(TwsTool):
         :param und_price:
         :return:
         """
-        found = False
-        for i in self.chain:
-            if i["id"] == req_id:
-                found = True
-                if und_price is not None:
-                    i["Underlying Price"] = und_price
-                else:
-                    print(i["Financial Instrument"])
-                if tick_type == 13:
-                    i["Delta"] = delta
-                    i["Gamma"] = gamma
-                    i["Theta"] = theta
-                    i["Vega"] = vega
-                    i["Implied Vol. %"] = "NA" if implied_vol is None else str(implied_vol * 100) + "%"
-        if not found:
+        slot = self.requests.hit(req_id)
+        if slot is None:
             self.logger.error("Unknown req id in option computation tick!")
+            return
+        if und_price is not None:
+            self.ticks.set(slot, "Underlying Price", und_price)
+        else:
+            self.logger.verbose("No underlying price in option computation for " +
+                                str(self.ticks.labels["Financial Instrument"][slot]))
+        if tick_type == 13:
+            self.ticks.set(slot, "Delta", delta)
+            self.ticks.set(slot, "Gamma", gamma)
+            self.ticks.set(slot, "Theta", theta)
+            self.ticks.set(slot, "Vega", vega)
+            self.ticks.set(slot, "Implied Vol. %", None if implied_vol is None else implied_vol * 100)
 
     def updatePortfolio(self, contract: Contract, position: float,
                         market_price: float, market_value: float,
@@ -234,37 +459,91 @@ class Snapshot(TwsTool):
         self.logger.verbose("All account data for " + account_name + " received.")
         self.acct_updates_ongoing = False
 
+    def missing(self) -> np.ndarray:
+        """
+        Instruments without bid and ask or without greeks
+        :return: boolean mask of instrument slots
+        """
+        t = self.ticks
+        return ~(t.got("Bid") | t.got("Ask")) | ~t.got("Delta")
+
     def wait_to_finish(self):
         """
-        Waits until all margin data has been received
+        Waits until every instrument has ended its snapshot and contract details or has failed.
+        Instruments late by snapshot.timeout seconds are requested again up to snapshot.retries times.
         :return:
         """
         self.logger.log("Waiting for all market data to arrive")
-        found = False
-        c1 = 0
-        while not found:
-            c_prev = c1
-            c1 = 0
-            found = True
-
-            for i in self.chain:
-                if (np.isnan(i["Ask"]) and np.isnan(i["Bid"])) or i["Delta"] == float("nan"):
-                    found = False
-                    c1 = c1 + 1
-            self.logger.log(str(c1) + " instruments of " + str(len(self.chain)) + " missing")
-            time.sleep(0.5)
-            # Break loop when two loops in a row are with same missing rows
-            if c_prev == c1:
+        while not self.complete.is_set():
+            self.resend()
+            now = time.monotonic()
+            with self.track:
+                open_slots = np.flatnonzero(~self._done(self.state))
+            if len(open_slots) == 0:
                 break
 
+            # Sleep until the first deadline or until everything is done, wake up sooner for pacing resends
+            wait = max(0.01, float(self.deadline[open_slots].min()) - now)
+            if len(self.retry) > 0:
+                wait = min(wait, max(0.01, self.pause["until"] - now))
+            if self.complete.wait(wait):
+                break
+
+            # Snapshots waiting to be sent again after pacing errors are not late
+            now = time.monotonic()
+            queued = set([int(r[0]) for r in list(self.retry)])
+            expired = [i for i in open_slots if self.deadline[i] <= now and not self._done(self.state[i]) and
+                       int(self.ticks.ids[i]) not in queued]
+            if len(expired) == 0:
+                continue
+            retry = [i for i in expired if self.attempts[i] <= self.retries]
+            self.logger.log(str(len(expired)) + " instruments timed out, " + str(len(retry)) + " requested again")
+            for i in retry:
+                self.rerequest(i)
+            for i in expired:
+                if self.attempts[i] > self.retries:
+                    self._finish(int(self.ticks.ids[i]), FAILED, "Timeout")
+
+        st = self.requests.stats()
+        self.logger.verbose(str(self.contracts.flush()) + " new contracts saved to the contract cache")
+        self.report_failed()
+        self.logger.log(str(int(self.missing().sum())) + " instruments of " + str(len(self.ticks)) +
+                        " without quotes or greeks")
         self.logger.log("All available data has been received, proceeding")
+        self.logger.verbose(str(st["callbacks"]) + " callbacks for " + str(st["answered"]) + " of " +
+                            str(st["requests"]) + " requests, " + str(st["unknown"]) + " unknown, "
+                            "first callback median {:.3f}s, p95 {:.3f}s".format(st["first.p50"], st["first.p95"]))
 
-    def prepare_df(self):
+    def report_failed(self) -> pd.DataFrame:
+        """
+        Lists and logs instruments that failed or never returned all their data
+        :return: data frame with id, Financial Instrument, attempts, snapshot, details and error columns
+        """
+        slots = np.flatnonzero((self.state & FAILED) != 0)
+        res = pd.DataFrame({"id": self.ticks.ids[slots],
+                            "Financial Instrument": self.ticks.labels["Financial Instrument"][slots],
+                            "attempts": self.attempts[slots],
+                            "snapshot": (self.state[slots] & SNAPSHOT_END) != 0,
+                            "details": (self.state[slots] & DETAILS_END) != 0,
+                            "error": [self.errors.get(i, "") for i in slots]})
+        if len(res) > 0:
+            self.logger.log(str(len(res)) + " instruments failed")
+            for i, r in res.iterrows():
+                self.logger.verbose(r["Financial Instrument"] + ": " + r["error"])
+        self.failed = res
+        return res
+
+    def prepare_df(self, df: pd.DataFrame = None):
         """
         Prepares market snapshot data frame for export
+        :param df: copy of the tick store frame, the store itself is wrapped and closed if None
         :return:
         """
-        df = pd.DataFrame(self.chain)
+        if df is None:
+            # Late callbacks would change the shared arrays under the data frame, ignore them from now on
+            self.requests.clear()
+            df = self.ticks.frame()
+            self.history.update(self.cont.symbol, self.cont.tradingClass, df)
         df["Mid"] = (df["Ask"] + df["Bid"]) / 2
         df["Spread"] = np.abs(df["Ask"] - df["Bid"])
         df["Days to Last Trading Day"] = pd.to_datetime(df["Days to Last Trading Day"],
@@ -274,12 +553,17 @@ class Snapshot(TwsTool):
         df["Position"] = 0
         df["Avg Price"] = 0
 
-        self.logger.log("Getting contract IDs from Dynamo DB")
-        df = tools.lookup_contract_id(df, "instruments")
+        # Contract IDs come from TWS or the contract cache, an already read ID table can fill the gaps
+        missing = df["conid"].isna()
+        if missing.any() and self.contract_ids is not None:
+            ids = self.contract_ids.drop_duplicates("Financial Instrument").set_index("Financial Instrument")["conid"]
+            df.loc[missing, "conid"] = df.loc[missing, "Financial Instrument"].map(ids)
+        if df["conid"].isna().any():
+            self.logger.error("Missing contract IDs for " + str(int(df["conid"].isna().sum())) + " instruments")
 
         self.logger.log("Updating account position data")
         # Now loop through the account dict and update the position data
-        for k, v in self.account.items():
+        for k, v in list(self.account.items()):
             df.loc[df["conid"] == k, "Position"] = v["position"]
             df.loc[df["conid"] == k, "Avg Price"] = v["avg price"] / float(self.config["mult"])
 
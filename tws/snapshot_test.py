@@ -0,0 +1,196 @@
+"""
+Unit testing for snapshot request tracking
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from unittest import mock
+from utils.logger import LogLevel
+from utils import parse
+from bench import chain, stubs
+from threading import Thread
+import tempfile
+import time
+import os
+
+try:
+    from tws.snapshot import Snapshot, SNAPSHOT_END, DETAILS_END, FAILED
+except ImportError:
+    Snapshot = None
+
+
+def config(**kwargs) -> dict:
+    """
+    Snapshot configuration with local caches
+    :param kwargs: options to override, dots written as underscores
+    :return: config dict
+    """
+    wd = tempfile.mkdtemp()
+    res = {"symbol": "CL", "class": "LO", "sectype": "FOP", "currency": "USD", "exchange": "NYMEX",
+           "price.from": "30", "price.to": "90", "price.step": "0.5",
+           "rel.start.month": "1", "rel.step.month": "1", "months": "1",
+           "contracts.path": os.path.join(wd, "contracts.db"), "select.path": wd}
+    res.update({k.replace("_", "."): v for k, v in kwargs.items()})
+    return res
+
+
+def snapshot(**kwargs):
+    """
+    Snapshot scraper with the requests to TWS replaced by mocks
+    :param kwargs: config options
+    :return:
+    """
+    s = Snapshot(config=config(**kwargs), log_level=LogLevel.error)
+    s.reqMktData = mock.Mock()
+    s.cancelMktData = mock.Mock()
+    s.reqContractDetails = mock.Mock()
+    s.nextId = 1
+    return s
+
+
+def feed(n: int):
+    """
+    Tick feed of a one month chain and the plan requesting it, the instruments get request IDs 2 to n + 1
+    :param n: number of instruments
+    :return: tick feed and plan
+    """
+    df = chain.make_chain(rows=n, months=1, missing_quotes=0, missing_vol=0, missing_greeks=0, held=0)
+    p = parse.parse_instruments(df["Financial Instrument"])
+    plan = {str(p["Contract Month"].iloc[0]): list(zip(p["Strike"], p["Side"]))}
+    return stubs.TickFeed(df, first_id=2), plan
+
+
+def until(cond, timeout: float = 5) -> bool:
+    """
+    Waits for a condition set by another thread
+    :param cond: function returning bool
+    :param timeout: seconds
+    :return: condition
+    """
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+@unittest.skipIf(Snapshot is None, "ibapi or boto3 not installed")
+class SnapshotTests(unittest.TestCase):
+    def test_rerequest(self):
+        s = snapshot()
+        s.request_instruments({"201902": [(50.0, "c")]})
+        self.assertEqual([2], s.ticks.ids.tolist())
+
+        # Late instrument is requested again under a new ID, the error for the cancel of the old one is ignored
+        s.rerequest(0)
+        self.assertEqual(3, int(s.ticks.ids[0]))
+        s.cancelMktData.assert_called_once_with(2)
+        self.assertEqual(3, s.reqMktData.call_args[0][0])
+        s.error(2, 300, "Can't find EId with tickerId:2")
+        self.assertEqual(0, s.state[0] & FAILED)
+
+        s.tickSnapshotEnd(3)
+        s.contractDetailsEnd(3)
+        self.assertEqual(SNAPSHOT_END | DETAILS_END, s.state[0])
+        self.assertTrue(s.complete.is_set())
+
+    def test_lines(self):
+        s = snapshot(tws_lines="2")
+        f, plan = feed(4)
+        t = Thread(target=s.request_instruments, args=(plan, ))
+        t.start()
+
+        # Two lines in flight, the third snapshot is sent when a line is freed by its snapshot end
+        self.assertTrue(until(lambda: s.reqMktData.call_count == 2))
+        time.sleep(0.1)
+        self.assertEqual(2, s.reqMktData.call_count)
+        self.assertEqual([2, 3], sorted(s.in_flight.keys()))
+        s.tickSnapshotEnd(2)
+        self.assertTrue(until(lambda: s.reqMktData.call_count == 3))
+        self.assertEqual([3, 4], sorted(s.in_flight.keys()))
+        s.tickSnapshotEnd(3)
+        t.join(5)
+        self.assertEqual(4, s.reqMktData.call_count)
+        f.replay(s)
+        self.assertEqual(f.df["Bid"].tolist(), s.ticks.column("Bid").tolist())
+
+    def test_pacing(self):
+        s = snapshot(tws_lines="3")
+        f, plan = feed(5)
+        t = Thread(target=s.request_instruments, args=(plan, ))
+        t.start()
+        self.assertTrue(until(lambda: s.reqMktData.call_count == 3))
+
+        # Too many lines shrinks the window below the lines in flight and queues the rejected snapshot
+        s.error(4, 101, "Max number of tickers has been reached")
+        self.assertEqual(2, s.lines)
+        self.assertEqual([2, 3], sorted(s.in_flight.keys()))
+        self.assertEqual([4], [r[0] for r in s.retry])
+        self.assertGreater(s.pause["until"], time.monotonic())
+
+        # Rejected snapshot is sent again after the pause by the following request or by the wait
+        s.pause["until"] = 0
+        s.tickSnapshotEnd(2)
+        t.join(5)
+        self.assertEqual([3, 5], sorted(s.in_flight.keys()))
+        self.assertEqual([4], [r[0] for r in s.retry])
+        s.tickSnapshotEnd(3)
+        self.assertFalse(s.wait_in_flight(0.2))
+        self.assertEqual(4, s.reqMktData.call_args[0][0])
+        self.assertEqual([4, 5], sorted(s.in_flight.keys()))
+        self.assertEqual([], s.retry)
+
+        # Message rate error, the line is freed and the snapshot sent again once the pause is over
+        s.error(5, 100, "Max rate of messages per second has been exceeded")
+        self.assertEqual([4], list(s.in_flight.keys()))
+        self.assertEqual([5], [r[0] for r in s.retry])
+        s.pause["until"] = 0
+        self.assertFalse(s.wait_in_flight(0.2))
+        self.assertEqual(5, s.reqMktData.call_args[0][0])
+        s.tickSnapshotEnd(4)
+        s.tickSnapshotEnd(5)
+        self.assertTrue(s.wait_in_flight(1))
+        self.assertEqual(6, s.reqMktData.call_count)
+
+    def test_complete(self):
+        s = snapshot()
+        f, plan = feed(6)
+        s.request_instruments(plan)
+        self.assertFalse(s.complete.is_set())
+
+        f.replay(s)
+        for i in f.ids[:-1]:
+            s.tickSnapshotEnd(int(i))
+            s.contractDetailsEnd(int(i))
+        self.assertEqual(1, s.pending)
+        self.assertFalse(s.complete.is_set())
+        s.contractDetailsEnd(int(f.ids[-1]))
+        s.tickSnapshotEnd(int(f.ids[-1]))
+        self.assertTrue(s.complete.is_set())
+
+        s.wait_to_finish()
+        self.assertEqual(0, int(s.missing().sum()))
+        self.assertEqual(0, len(s.failed))
+        self.assertEqual(f.df["Delta"].tolist(), s.ticks.column("Delta").tolist())
+
+    def test_timeout(self):
+        s = snapshot(snapshot_timeout="0.05", snapshot_retries="1")
+        f, plan = feed(2)
+        s.request_instruments(plan)
+        s.tickSnapshotEnd(2)
+        s.contractDetailsEnd(2)
+
+        # Second instrument never answers, it is requested once more under a new ID and then fails
+        s.wait_to_finish()
+        self.assertTrue(s.complete.is_set())
+        s.cancelMktData.assert_called_once_with(3)
+        self.assertEqual([2, 3, 4], [c[0][0] for c in s.reqMktData.call_args_list])
+        self.assertEqual([2, 3, 4], [c[0][0] for c in s.reqContractDetails.call_args_list])
+        self.assertEqual([4], s.failed["id"].tolist())
+        self.assertEqual([2], s.failed["attempts"].tolist())
+        self.assertEqual(["Timeout"], s.failed["error"].tolist())
+        self.assertEqual(SNAPSHOT_END | DETAILS_END, s.state[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+"""
+Streaming option chain.
+Market data of the chain is subscribed once with streaming requests instead of snapshots
+and kept continuously updated in the tick store. When the chain is wider than the
+market data line budget, the subscriptions rotate through the chain in batches.
+A consistent copy of the chain can be taken at any time without waiting for TWS.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from ibapi.contract import Contract, ContractDetails
+from ibapi.wrapper import TickType, TickAttrib
+from tws.snapshot import Snapshot, SNAPSHOT_END
+from utils import logger
+from threading import Thread, Event, Lock
+import pandas as pd
+import numpy as np
+import time
+
+
+class ChainStream(Snapshot):
+    """
+    Keeps a live option chain in memory with streaming market data
+    """
+    def __init__(self, config=None, log_level=logger.LogLevel.normal):
+        """
+        Constructor
+        :param config: optimiser config, stream.lines and stream.dwell set the line budget and rotation
+        :param log_level: logging level
+        """
+        super().__init__(config=config, log_level=log_level)
+        self.budget = int(config.get("stream.lines", "80"))
+        self.dwell = float(config.get("stream.dwell", "5"))
+
+        # Data lock keeps the callbacks from changing the store while a copy of the chain is taken
+        self.data = Lock()
+        self.active = set()
+        self.filled = Event()
+        self.stopped = Event()
+        self.rotation = None
+
+    def subscribe(self, req_id: int, cont: Contract):
+        """
+        Instruments are subscribed by the rotation thread, only the contract details are requested here
+        :param req_id: request ID
+        :param cont: contract
+        :return:
+        """
+        self._finish(req_id, SNAPSHOT_END)
+
+    def start(self):
+        """
+        Creates the instruments and starts streaming their market data
+        :return:
+        """
+        self.stopped.clear()
+        self.filled.clear()
+        self.create_instruments()
+        self.rotation = Thread(target=self.rotate, daemon=True)
+        self.rotation.start()
+
+    def rotate(self):
+        """
+        Subscribes the chain within the line budget. A chain within the budget is subscribed once,
+        a wider chain is subscribed in batches of the budget for stream.dwell seconds each.
+        :return:
+        """
+        n = len(self.ticks)
+        if n <= self.budget:
+            self.logger.log("Streaming " + str(n) + " instruments")
+            self.stream(range(n))
+            self.stopped.wait(self.dwell)
+            self.filled.set()
+            return
+
+        self.logger.log("Streaming " + str(n) + " instruments in batches of " + str(self.budget) +
+                        " lines, " + str(self.dwell) + "s each")
+        start = 0
+        while not self.stopped.is_set():
+            # Budget can shrink after market data line errors
+            batch = [(start + i) % n for i in range(self.budget)]
+            self.stream(batch)
+            if self.stopped.wait(self.dwell):
+                break
+            self.unsubscribe()
+            if start + self.budget >= n:
+                self.filled.set()
+            start = (start + self.budget) % n
+
+    def stream(self, slots):
+        """
+        Subscribes streaming market data of instruments
+        :param slots: instrument slots
+        :return:
+        """
+        for slot in slots:
+            if self.stopped.is_set():
+                return
+            req_id = int(self.ticks.ids[slot])
+            self.pace()
+            self.reqMktData(req_id, self.contract(slot), "", False, False, [])
+            self.active.add(req_id)
+
+    def unsubscribe(self):
+        """
+        Cancels all streaming subscriptions
+        :return:
+        """
+        for req_id in list(self.active):
+            self.pace()
+            self.cancelMktData(req_id)
+        self.active = set()
+
+    def wait_filled(self, timeout: float = None) -> bool:
+        """
+        Waits until every instrument has been streamed at least once
+        :param timeout: seconds, no limit if None
+        :return: True if the chain is filled
+        """
+        return self.filled.wait(timeout)
+
+    def stop(self):
+        """
+        Stops the rotation, cancels the subscriptions and saves the quote history
+        :return:
+        """
+        self.stopped.set()
+        if self.rotation is not None:
+            self.rotation.join()
+            self.rotation = None
+        self.unsubscribe()
+        self.contracts.flush()
+        # Instruments the rotation has not reached yet are not counted as unquoted
+        seen = np.isfinite(self.ticks.updated[:len(self.ticks)])
+        if seen.any():
+            self.history.update(self.cont.symbol, self.cont.tradingClass, self.ticks.frame()[seen])
+
+    def disconnect(self):
+        """
+        Stops streaming and shuts down the TWS connection
+        :return:
+        """
+        self.stop()
+        super().disconnect()
+
+    def error(self, req_id: int, error_code: int, error_string: str):
+        """
+        Error override, too many market data lines shrinks the line budget for the following batches
+        :param req_id:
+        :param error_code:
+        :param error_string:
+        :return:
+        """
+        super().error(req_id, error_code, error_string)
+        if error_code == 101:
+            self.budget = max(1, min(self.budget, len(self.active)) - 1)
+        if error_code in [101, 200, 354]:
+            self.active.discard(req_id)
+
+    def tickPrice(self, req_id: int, tick_type: TickType, price: float,
+                  attrib: TickAttrib):
+        """
+        Market tick data override, updates the chain under the data lock
+        :param req_id:
+        :param tick_type:
+        :param price:
+        :param attrib:
+        :return:
+        """
+        with self.data:
+            super().tickPrice(req_id, tick_type, price, attrib)
+
+    def tickOptionComputation(self, req_id: int, tick_type: TickType,
+                              implied_vol: float, delta: float, opt_price: float, pv_dividend: float,
+                              gamma: float, vega: float, theta: float, und_price: float):
+        """
+        Option computation override, updates the chain under the data lock
+        :param req_id:
+        :param tick_type:
+        :param implied_vol:
+        :param delta:
+        :param opt_price:
+        :param pv_dividend:
+        :param gamma:
+        :param vega:
+        :param theta:
+        :param und_price:
+        :return:
+        """
+        with self.data:
+            super().tickOptionComputation(req_id, tick_type, implied_vol, delta, opt_price, pv_dividend,
+                                          gamma, vega, theta, und_price)
+
+    def contractDetails(self, req_id: int, contract_details: ContractDetails):
+        """
+        Contract details override, updates the chain under the data lock
+        :param req_id:
+        :param contract_details:
+        :return:
+        """
+        with self.data:
+            super().contractDetails(req_id, contract_details)
+
+    def chain(self) -> pd.DataFrame:
+        """
+        Point in time copy of the chain
+        :return: market data frame as from prepare_df, with Updated time and Age in seconds of every row
+        """
+        with self.data:
+            df = self.ticks.frame().copy()
+            updated = self.ticks.updated[:len(self.ticks)].copy()
+        df = self.prepare_df(df)
+        df["Updated"] = pd.to_datetime(updated, unit="s")
+        df["Age"] = time.time() - updated
+        n = int(np.isnan(updated).sum())
+        if n > 0:
+            self.logger.verbose(str(n) + " instruments without any market data yet")
+        return df
@@ -0,0 +1,137 @@
+"""
+Columnar tick store.
+Market data of a snapshot is kept in preallocated numpy arrays, one row per field
+and one column per instrument slot, with a received flag for every value.
+The data frame of the snapshot wraps the arrays without copying them.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import pandas as pd
+import numpy as np
+import time
+
+
+# Numeric fields, implied volatility is in percent
+FIELDS = ["Strike", "Underlying Price", "Bid", "Ask", "Delta", "Gamma", "Theta", "Vega", "Implied Vol. %", "conid"]
+
+# Text fields, last trading day is yyyymmdd as received from TWS
+LABELS = ["Financial Instrument", "Side", "Expiry", "Days to Last Trading Day"]
+
+
+class TickStore:
+    """
+    Preallocated columnar storage of instrument data, addressed by slot.
+    Slots are added by the requesting thread before the request is sent,
+    values are set by the ibapi reader thread.
+    """
+    def __init__(self, capacity: int, fields: list = None, labels: list = None):
+        """
+        Constructor
+        :param capacity: maximum number of instruments
+        :param fields: numeric fields, FIELDS by default
+        :param labels: text fields, LABELS by default
+        """
+        self.fields = list(FIELDS if fields is None else fields)
+        self.pos = {f: i for i, f in enumerate(self.fields)}
+        self.values = np.full((len(self.fields), capacity), np.nan)
+        self.received = np.zeros((len(self.fields), capacity), dtype=bool)
+        self.labels = {k: np.full(capacity, None, dtype=object) for k in (LABELS if labels is None else labels)}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.updated = np.full(capacity, np.nan)
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        """
+        Maximum number of instruments
+        :return:
+        """
+        return self.values.shape[1]
+
+    def __len__(self) -> int:
+        """
+        Number of instruments added
+        :return:
+        """
+        return self.size
+
+    def add(self, req_id: int, **kwargs) -> int:
+        """
+        Adds an instrument, static values given here are not marked as received
+        :param req_id: request ID of the instrument
+        :param kwargs: field or label values, ie. Strike or Financial Instrument
+        :return: slot of the instrument
+        """
+        slot = self.size
+        if slot >= self.capacity:
+            raise IndexError("Tick store is full, capacity " + str(self.capacity))
+
+        self.ids[slot] = req_id
+        for k, v in kwargs.items():
+            if k in self.labels:
+                self.labels[k][slot] = v
+            else:
+                self.values[self.pos[k], slot] = v
+        self.size = slot + 1
+        return slot
+
+    def set(self, slot: int, field: str, value):
+        """
+        Saves a received value and the time it was received
+        :param slot: instrument slot
+        :param field: numeric field
+        :param value: value, None is saved as NaN
+        :return:
+        """
+        i = self.pos[field]
+        self.values[i, slot] = np.nan if value is None else value
+        self.received[i, slot] = True
+        self.updated[slot] = time.time()
+
+    def set_label(self, slot: int, label: str, value):
+        """
+        Saves a received text value
+        :param slot: instrument slot
+        :param label: text field
+        :param value: value
+        :return:
+        """
+        self.labels[label][slot] = value
+
+    def column(self, field: str) -> np.ndarray:
+        """
+        Values of a field for the added instruments
+        :param field: numeric field
+        :return: view of the data
+        """
+        return self.values[self.pos[field], :self.size]
+
+    def got(self, field: str) -> np.ndarray:
+        """
+        Received flags of a field for the added instruments
+        :param field: numeric field
+        :return: boolean view
+        """
+        return self.received[self.pos[field], :self.size]
+
+    def nbytes(self) -> int:
+        """
+        Memory used by the arrays, text values themselves are not counted
+        :return: bytes
+        """
+        return int(self.values.nbytes + self.received.nbytes + self.ids.nbytes + self.updated.nbytes +
+                   sum([v.nbytes for v in self.labels.values()]))
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Data frame of the added instruments. Numeric columns are views of the store,
+        so values received later show up in the frame as well.
+        :return: data frame with id, label and field columns
+        """
+        n = self.size
+        df = pd.DataFrame(self.values[:, :n].T, columns=self.fields, copy=False)
+        df.insert(0, "id", self.ids[:n])
+        for i, (k, v) in enumerate(self.labels.items()):
+            df.insert(i + 1, k, v[:n])
+        return df
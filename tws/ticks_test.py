@@ -0,0 +1,45 @@
+"""
+Unit testing for columnar tick store
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from tws.ticks import TickStore
+import numpy as np
+
+
+class TickStoreTests(unittest.TestCase):
+    def test_store(self):
+        t = TickStore(3)
+        for i in range(0, 3):
+            t.add(100 + i, Strike=50.0 + i, Side="C", **{"Financial Instrument": "CL " + str(i)})
+        self.assertRaises(IndexError, t.add, 200)
+
+        t.set(0, "Bid", 1.5)
+        t.set(2, "Implied Vol. %", None)
+        self.assertEqual([True, False, False], t.got("Bid").tolist())
+        self.assertEqual([False, False, True], t.got("Implied Vol. %").tolist())
+        self.assertFalse(t.got("Strike").any())
+
+        df = t.frame()
+        self.assertEqual([100, 101, 102], df["id"].tolist())
+        self.assertEqual([50.0, 51.0, 52.0], df["Strike"].tolist())
+        self.assertEqual("CL 1", df["Financial Instrument"][1])
+        self.assertTrue(np.isnan(df["Implied Vol. %"][2]))
+
+        # Numeric columns are views of the store
+        self.assertTrue(np.shares_memory(df["Bid"].values, t.values))
+        t.set(1, "Ask", 2.0)
+        self.assertEqual(2.0, df["Ask"][1])
+
+        # Rows are stamped when their values are received
+        t = TickStore(2)
+        t.add(100)
+        t.add(101)
+        t.set(1, "Bid", 1.0)
+        self.assertEqual([False, True], np.isfinite(t.updated).tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,25 +5,17 @@ Author: Peeter Meos
 Date: 12. December 2018
 """
 from xml.etree.ElementTree import Element, SubElement, ElementTree
-import boto3
 import pandas as pd
 from utils.logger import LogLevel, Logger
 
 
-def lookup_contract_id(df, tbl: str):
+def get_contract_ids(tbl: str) -> pd.DataFrame:
     """
-    Performs contract ID lookup from TWS
-    :param df: series, list of instruments
+    Reads the full contract ID table from Dynamo DB
     :param tbl: table containing instrument names
-    :return:
+    :return: data frame with conid and Financial Instrument columns
     """
-    log = Logger(LogLevel.normal, "ConID retrieval")
-    if "conid" in df:
-        log.log("Contract IDs already present, new query not necessary")
-        return df
-    else:
-        log.log("Getting contract IDs from Dynamo DB table" + tbl)
-
+    import boto3
     db = boto3.resource('dynamodb', region_name='us-east-1',
                         endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
     table = db.Table(tbl)
@@ -38,8 +30,29 @@ def lookup_contract_id(df, tbl: str):
     # res is list of dicts, contains instString and conid
     res = pd.DataFrame(res)
     res.columns = ["conid", "Financial Instrument"]
-
     res["Financial Instrument"] = res["Financial Instrument"].astype(str)
+    return res
+
+
+def lookup_contract_id(df, tbl: str, ids: pd.DataFrame = None):
+    """
+    Performs contract ID lookup from TWS
+    :param df: series, list of instruments
+    :param tbl: table containing instrument names
+    :param ids: already retrieved contract ID table, read from Dynamo DB if not given
+    :return:
+    """
+    log = Logger(LogLevel.normal, "ConID retrieval")
+    if "conid" in df:
+        log.log("Contract IDs already present, new query not necessary")
+        return df
+
+    if ids is None:
+        log.log("Getting contract IDs from Dynamo DB table" + tbl)
+        res = get_contract_ids(tbl)
+    else:
+        res = ids
+
     df["Financial Instrument"] = df["Financial Instrument"].astype(str)
 
     df = pd.merge(df, res, left_on="Financial Instrument", right_on="Financial Instrument")
@@ -64,13 +77,15 @@ def lookup_contract_id(df, tbl: str):
 """
 
 
-def export_portfolio_xml(data: pd.DataFrame, fn: str, trades=False, loglevel: LogLevel = LogLevel.normal):
+def export_portfolio_xml(data: pd.DataFrame, fn: str, trades=False, loglevel: LogLevel = LogLevel.normal,
+                         ids: pd.DataFrame = None):
     """
     Exports basket of trades in Risk Navigator XML format
     :param data: Basket data as data frame
     :param fn: Filename for XML output
     :param trades: Export trades instead of full portfolio
     :param loglevel: Loglevel for the export
+    :param ids: already retrieved contract ID table
     :return:
     """
 
@@ -83,7 +98,7 @@ def export_portfolio_xml(data: pd.DataFrame, fn: str, trades=False, loglevel: Lo
         log.log("Exporting new portfolio position")
         tmp = data[data["NewPosition"] != 0].copy()
 
-    tmp = lookup_contract_id(tmp, "instruments")
+    tmp = lookup_contract_id(tmp, "instruments", ids)
 
     x = Element("CustAcct")
     x.set("version", "1.0")
@@ -8,11 +8,21 @@ Date: 14. December 2018
 from ibapi.wrapper import *
 from ibapi.client import *
 from ibapi.contract import Contract
+from tws.registry import RequestRegistry
 from utils.logger import Logger, LogLevel
-from threading import Thread
+from utils.rate import TokenBucket
+from threading import Thread, Condition, Event
+import copy
 import time
 
 
+# Errors for exceeding the message rate (100), the number of market data lines (101) and pacing violations (420)
+PACING_ERRORS = [100, 101, 420]
+
+# Longest pause after pacing errors, seconds
+MAX_BACKOFF = 60
+
+
 class TwsException(Exception):
     """
     Dummy own exception implementation
@@ -53,11 +63,15 @@ class TwsTool(TwsWrapper, TwsClient):
     """
     TWS API framework and basic functionality
     """
-    def __init__(self, name="TwsTool", log_level=LogLevel.normal):
+    def __init__(self, name="TwsTool", log_level=LogLevel.normal, rate: float = 45, burst: int = 10,
+                 lines: int = 90):
         """
         Standard constructor
         :param name:
         :param log_level
+        :param rate: maximum average number of messages per second sent to TWS
+        :param burst: maximum number of messages sent at once
+        :param lines: maximum number of market data snapshots in flight
         """
         TwsClient.__init__(self, wrapper=self)
         TwsWrapper.__init__(self)
@@ -66,8 +80,23 @@ class TwsTool(TwsWrapper, TwsClient):
         self.nextId = -1
         self.thread = Thread(target=self.run)
 
-        self.req_val_id = -1
-        self.req_val = 0
+        # Requests of get_contract_id and get_price_snapshot waiting for their value
+        self.waiting = {}
+
+        # Request ID lookup for tools tracking many requests at once
+        self.requests = RequestRegistry()
+
+        # Pacing: message rate, window of snapshot requests in flight and pause after pacing errors
+        self.bucket = TokenBucket(rate, burst)
+        self.lines = int(lines)
+        self.max_lines = int(lines)
+        self.finished = 0
+        self.in_flight = {}
+        self.retry = []
+        self.pacing = Condition()
+
+        # Pause after pacing errors, a dict so connections of the same account can share it
+        self.pause = {"until": 0, "backoff": 0}
 
     def nextValidId(self, order_id: int):
         """
@@ -115,7 +144,7 @@ class TwsTool(TwsWrapper, TwsClient):
 
     def error(self, req_id: TickerId, error_code: int, error_string: str):
         """
-        Error printing override
+        Error printing override, pacing errors pause sending and the rejected snapshot is sent again
         :param req_id:
         :param error_code:
         :param error_string:
@@ -125,15 +154,121 @@ class TwsTool(TwsWrapper, TwsClient):
             # These two error codes are normal market data connection messages
             # They are not really errors at all
             self.logger.verbose(str(error_code) + ":" + error_string)
+        elif error_code in PACING_ERRORS:
+            with self.pacing:
+                self.pause["backoff"] = min(max(2 * self.pause["backoff"], 1), MAX_BACKOFF)
+                self.pause["until"] = time.monotonic() + self.pause["backoff"]
+                # Too many lines open, the window has to be smaller than what TWS allows us
+                if error_code == 101:
+                    self.lines = max(1, len(self.in_flight) - 1)
+            self.logger.log(str(error_code) + ":" + error_string + ", pausing for " + str(self.pause["backoff"]) +
+                            "s, " + str(self.lines) + " lines")
+            self.release(req_id, retry=True)
         else:
             self.logger.error(str(error_code) + ":" + error_string)
+            self.release(req_id)
+            w = self.waiting.get(req_id)
+            if w is not None:
+                w["done"].set()
+
+    def pace(self, n: int = 1):
+        """
+        Waits until n messages can be sent without exceeding the message rate, also waits out pacing pauses
+        :param n: number of messages
+        :return:
+        """
+        while True:
+            with self.pacing:
+                wait = self.pause["until"] - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.bucket.acquire(n)
+
+    def req_snapshot(self, req_id: int, cont: Contract, generic_ticks: str = ""):
+        """
+        Requests a market data snapshot, waits for a free line in the window of requests in flight.
+        Snapshots rejected for pacing are sent again by the following calls or by wait_in_flight.
+        :param req_id: request ID
+        :param cont: contract, copied so the caller can reuse it
+        :param generic_ticks: generic tick list
+        :return:
+        """
+        self.resend()
+        with self.pacing:
+            while len(self.in_flight) >= self.lines:
+                self.pacing.wait()
+            self.in_flight[req_id] = (copy.copy(cont), generic_ticks)
+        self.pace()
+        self.reqMktData(req_id, cont, generic_ticks, True, False, [])
+
+    def resend(self):
+        """
+        Sends again snapshots rejected for pacing
+        :return:
+        """
+        with self.pacing:
+            items = self.retry
+            self.retry = []
+        for req_id, cont, generic_ticks in items:
+            self.req_snapshot(req_id, cont, generic_ticks)
+
+    def release(self, req_id: int, retry: bool = False):
+        """
+        Frees the line of a finished snapshot
+        :param req_id: request ID
+        :param retry: snapshot was rejected and has to be sent again
+        :return:
+        """
+        with self.pacing:
+            x = self.in_flight.pop(req_id, None)
+            if x is None:
+                return
+            if retry:
+                self.retry.append((req_id, ) + x)
+            else:
+                self.pause["backoff"] = 0
+                # Window shrunk after errors grows back by one line per full window finished
+                self.finished = self.finished + 1
+                if self.finished >= self.lines and self.lines < self.max_lines:
+                    self.lines = self.lines + 1
+                    self.finished = 0
+            self.pacing.notify_all()
+
+    def wait_in_flight(self, timeout: float = None) -> bool:
+        """
+        Waits until all snapshots have finished, sending again the ones rejected for pacing
+        :param timeout: seconds, no limit if None
+        :return: True if nothing is in flight any more
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.resend()
+            with self.pacing:
+                if len(self.in_flight) == 0 and len(self.retry) == 0:
+                    return True
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                self.pacing.wait(0.1)
+
+    def tickSnapshotEnd(self, req_id: int):
+        """
+        End of a market data snapshot, frees its line
+        :param req_id:
+        :return:
+        """
+        self.release(req_id)
+        w = self.waiting.get(req_id)
+        if w is not None:
+            w["done"].set()
 
-    def connect(self, host: str, port: int, con_id):
+    def connect(self, host: str, port: int, con_id, timeout: float = 10):
         """
         Connect to TWS override
         :param host:
         :param port:
         :param con_id:
+        :param timeout: seconds to wait for the next order ID
         :return:
         """
         self.logger.log("Connecting to TWS at " + host + ":" + str(port))
@@ -143,9 +278,14 @@ class TwsTool(TwsWrapper, TwsClient):
         self.thread.start()
         setattr(self, "_thread", self.thread)
 
-        # Wait until next id
+        # Wait until next id, TWS closes the connection ie. when the client ID is already in use
         self.logger.verbose("Waiting for next order ID")
+        deadline = time.monotonic() + timeout
         while self.nextId == -1:
+            if not self.isConnected():
+                raise TwsException("Connection to TWS closed before the next order ID")
+            if time.monotonic() >= deadline:
+                raise TwsException("Timeout waiting for the next order ID")
             time.sleep(0.1)
 
     def disconnect(self):
@@ -155,35 +295,87 @@ class TwsTool(TwsWrapper, TwsClient):
         """
         super().disconnect()
 
-    def get_contract_id(self, cont: Contract):
+    def request_grid(self, cont: Contract, months: list, strikes: list, discovery: bool = True,
+                     path: str = "./tmp/chains/", client_id: int = None) -> dict:
+        """
+        Strikes to request by contract month. With discovery only listed strikes within the range
+        of the strike grid are returned, the strike grid is used if discovery fails.
+        :param cont: option contract with symbol, exchange, currency and trading class
+        :param months: contract months, yyyymm
+        :param strikes: strike grid, numbers or strings
+        :param discovery: use listed strikes
+        :param path: chain cache directory
+        :param client_id: client ID for the discovery connection, own client ID + 3 if None
+        :return: dict of contract month and list of strikes
+        """
+        grid = {m: [float(k) for k in strikes] for m in months}
+        if not discovery or len(strikes) == 0 or len(months) == 0:
+            return grid
+
+        from tws import chains
+        if client_id is None:
+            client_id = self.clientId + 3
+        chain = chains.get_chain(cont, months, self.host, self.port, client_id, path, self.logger.logLevel)
+        if chain is None:
+            self.logger.log("Using strike grid instead of listed strikes")
+            return grid
+
+        listed = chains.select(chain, months, min(grid[months[0]]), max(grid[months[0]]))
+        n_grid = sum([len(v) for v in grid.values()])
+        n_listed = sum([len(v) for v in listed.values()])
+        self.logger.log(str(n_listed) + " listed strikes in " + str(len(listed)) + " months, " +
+                        str(n_grid - n_listed) + " of the strike grid skipped")
+        return listed
+
+    def next_id(self) -> int:
+        """
+        Takes the next request ID
+        :return: request ID
+        """
+        with self.pacing:
+            req_id = int(self.nextId)
+            self.nextId = req_id + 1
+        return req_id
+
+    def _wait(self, req_id: int, timeout: float):
+        """
+        Waits for the value of a request made by get_contract_id or get_price_snapshot
+        :param req_id: request ID
+        :param timeout: seconds
+        :return: value, None if it did not arrive
+        """
+        w = self.waiting[req_id]
+        if not w["done"].wait(timeout):
+            self.logger.error("Timeout waiting for request " + str(req_id))
+        return self.waiting.pop(req_id)["value"]
+
+    def get_contract_id(self, cont: Contract, timeout: float = 10):
         """
         Requests and returns contract id for a given contract
         :param cont:
-        :return: contract id
+        :param timeout: seconds to wait
+        :return: contract id, None if not received
         """
         self.logger.verbose("Request contract details for " + cont.symbol)
-        self.req_val_id = self.nextId
-        self.req_val = 0
-        self.reqContractDetails(self.req_val_id, cont)
-        while self.req_val == 0:
-            time.sleep(0.01)
-
-        return self.req_val
+        req_id = self.next_id()
+        self.waiting[req_id] = {"done": Event(), "value": None}
+        self.pace()
+        self.reqContractDetails(req_id, cont)
+        return self._wait(req_id, timeout)
 
-    def get_price_snapshot(self, cont: Contract):
+    def get_price_snapshot(self, cont: Contract, timeout: float = 15):
         """
         Requests and returns the latest market price for a given contract
         :param cont:
-        :return: last known price
+        :param timeout: seconds to wait
+        :return: last known price, None if not received
         """
         self.logger.verbose("Requesting snapshot data for " + cont.symbol)
-        self.req_val_id = self.nextId
-        self.req_val = 0
-        self.reqMktData(self.req_val_id, cont, "", True, False, [])
-        while self.req_val == 0:
-            time.sleep(0.01)
-
-        return self.req_val
+        req_id = self.next_id()
+        self.waiting[req_id] = {"done": Event(), "value": None}
+        self.pace()
+        self.reqMktData(req_id, cont, "", True, False, [])
+        return self._wait(req_id, timeout)
 
     def contractDetails(self, req_id: int, contract_details: ContractDetails):
         """
@@ -192,8 +384,19 @@ class TwsTool(TwsWrapper, TwsClient):
         :param contract_details:
         :return:
         """
-        if req_id == self.req_val_id:
-            self.req_val = contract_details.contract.conId
+        w = self.waiting.get(req_id)
+        if w is not None:
+            w["value"] = contract_details.contract.conId
+
+    def contractDetailsEnd(self, req_id: int):
+        """
+        End of contract details
+        :param req_id:
+        :return:
+        """
+        w = self.waiting.get(req_id)
+        if w is not None:
+            w["done"].set()
 
     def tickPrice(self, req_id: TickerId, tick_type: TickType, price: float,
                   attrib: TickAttrib):
@@ -205,5 +408,7 @@ class TwsTool(TwsWrapper, TwsClient):
         :param attrib:
         :return:
         """
-        if req_id == self.req_val_id and tick_type == 4:
-            self.req_val = price
+        w = self.waiting.get(req_id)
+        if w is not None and tick_type == 4:
+            w["value"] = price
+            w["done"].set()
@@ -0,0 +1,52 @@
+"""
+Unit testing for TWS tool connection and request helpers
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from unittest import mock
+from threading import Timer
+
+try:
+    from tws.tws import TwsTool, TwsClient, TwsException
+    from ibapi.contract import Contract
+except ImportError:
+    TwsTool = None
+
+
+@unittest.skipIf(TwsTool is None, "ibapi not installed")
+class TwsToolTests(unittest.TestCase):
+    def test_connect_closed(self):
+        # TWS closes the connection, ie. client ID already in use, instead of sending the next ID
+        t = TwsTool()
+        with mock.patch.object(TwsClient, "connect"), mock.patch.object(TwsTool, "isConnected", return_value=False):
+            self.assertRaises(TwsException, t.connect, "localhost", 1, 99)
+
+    def test_connect_timeout(self):
+        t = TwsTool()
+        with mock.patch.object(TwsClient, "connect"), mock.patch.object(TwsTool, "isConnected", return_value=True), \
+                mock.patch.object(TwsTool, "run"):
+            self.assertRaises(TwsException, t.connect, "localhost", 1, 99, timeout=0.3)
+
+    def test_grid(self):
+        t = TwsTool()
+        self.assertEqual({}, t.request_grid(Contract(), [], [50, 51]))
+        self.assertEqual({"201902": [50.0, 51.0]}, t.request_grid(Contract(), ["201902"], ["50", 51], False))
+
+    def test_wait(self):
+        t = TwsTool()
+        t.nextId = 5
+        t.reqMktData = mock.Mock(side_effect=lambda req_id, *args:
+                                 Timer(0.05, t.tickPrice, (req_id, 4, 0.0, None)).start())
+        t.reqContractDetails = mock.Mock()
+
+        # Zero price arrives, contract details never do
+        self.assertEqual(0.0, t.get_price_snapshot(Contract(), timeout=2))
+        self.assertIsNone(t.get_contract_id(Contract(), timeout=0.1))
+        self.assertEqual(7, t.nextId)
+        self.assertEqual({}, t.waiting)
+
+
+if __name__ == "__main__":
+    unittest.main()
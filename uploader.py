@@ -9,7 +9,6 @@ Date: 17. December 2018
 import argparse
 from utils import data, logger
 from gms import code
-from tws import snapshot
 import sys
 import configparser
 
@@ -19,6 +18,8 @@ def get_mkt_data_snapshot(export_dynamo=False):
     Gets market data snapshot from TWS
     :return:
     """
+    from tws import snapshot
+
     config = configparser.ConfigParser()
     config.read("config.cf")
     opt = config["optimiser"]
@@ -19,4 +19,4 @@ def get_version_string():
 
 __version__ = get_version_string()
 
-__all__ = ["data", "logger"]
\ No newline at end of file
+__all__ = ["cache", "data", "logger", "parse", "rate", "store", "timing"]
\ No newline at end of file
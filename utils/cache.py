@@ -0,0 +1,112 @@
+"""
+Local disk cache for optimisation results.
+Entries are keyed by a hash of the input data, configuration and formulation,
+oldest used entries are evicted when the cache grows over its size limit.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import pandas as pd
+import hashlib
+import pickle
+import json
+import time
+import os
+
+
+# Options that do not affect the results, left out of the cache key: prefixes of option names
+IGNORED_OPTIONS = ["cache.", "timing.", "mip.start", "run.store", "log", "host", "port", "id", "gams",
+                   "tws.", "snapshot.", "stream.", "shards.", "chain.", "contracts.", "select.", "basket."]
+
+
+class SolutionCache:
+    """
+    Disk cache with size based LRU eviction
+    """
+    def __init__(self, path: str = "./tmp/cache/", max_mb: float = 500):
+        """
+        Constructor
+        :param path: cache directory
+        :param max_mb: maximum total size of the cache in megabytes
+        """
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def make_key(df: pd.DataFrame, opt: dict, formulation: str, *args, ignore: list = IGNORED_OPTIONS) -> str:
+        """
+        Computes cache key for the optimisation inputs
+        :param df: input data frame
+        :param opt: optimiser configuration
+        :param formulation: GAMS code of the model
+        :param args: any other values affecting the results, ie. model versions
+        :param ignore: prefixes of options left out of the key
+        :return: hex digest
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps([str(item) for item in df.columns]).encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+        h.update(json.dumps({k: v for k, v in dict(opt).items() if not any([k.startswith(i) for i in ignore])},
+                            sort_keys=True).encode())
+        h.update(formulation.encode())
+        h.update(json.dumps([str(item) for item in args]).encode())
+        return h.hexdigest()
+
+    def _file(self, key: str) -> str:
+        """
+        Path of the cache entry
+        :param key: cache key
+        :return:
+        """
+        return os.path.join(self.path, key + ".pkl")
+
+    def get(self, key: str):
+        """
+        Returns cached entry and marks it as recently used
+        :param key: cache key
+        :return: cached object, None if not found
+        """
+        fn = self._file(key)
+        if not os.path.isfile(fn):
+            return None
+
+        with open(fn, "rb") as f:
+            obj = pickle.load(f)
+        now = time.time()
+        os.utime(fn, (now, now))
+        return obj
+
+    def put(self, key: str, obj):
+        """
+        Saves entry into cache and evicts old entries if needed
+        :param key: cache key
+        :param obj: object to be cached
+        :return:
+        """
+        fn = self._file(key)
+        with open(fn + ".tmp", "wb") as f:
+            pickle.dump(obj, f, protocol=4)
+        os.replace(fn + ".tmp", fn)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits into its size limit
+        :return: number of removed entries
+        """
+        entries = []
+        for fn in os.listdir(self.path):
+            if fn.endswith(".pkl"):
+                st = os.stat(os.path.join(self.path, fn))
+                entries.append((st.st_mtime, st.st_size, fn))
+
+        total = sum([item[1] for item in entries])
+        n = 0
+        for mtime, size, fn in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, fn))
+            total = total - size
+            n = n + 1
+        return n
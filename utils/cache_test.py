@@ -0,0 +1,34 @@
+"""
+Unit testing for the solution cache
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from utils.cache import SolutionCache
+import pandas as pd
+import tempfile
+
+
+class CacheTests(unittest.TestCase):
+    def test_key(self):
+        df = pd.DataFrame({"Financial Instrument": ["A", "B"], "Bid": [1.0, 2.0]})
+        opt = {"max.delta": "0.05", "cache.path": "./tmp/cache/", "mip.start": "./tmp/mip_start.json"}
+        key = SolutionCache.make_key(df, opt, "model", False, "v1")
+
+        # Options that do not change the results do not change the key
+        self.assertEqual(key, SolutionCache.make_key(df, dict(opt, **{"cache.path": "/x", "timing.file": "t",
+                                                                     "tws.lines": "50"}), "model", False, "v1"))
+        self.assertNotEqual(key, SolutionCache.make_key(df, dict(opt, **{"max.delta": "0.1"}), "model", False, "v1"))
+        self.assertNotEqual(key, SolutionCache.make_key(df, opt, "model", False, "v2"))
+        self.assertNotEqual(key, SolutionCache.make_key(df.iloc[0:1], opt, "model", False, "v1"))
+
+    def test_get_put(self):
+        c = SolutionCache(tempfile.mkdtemp())
+        self.assertIsNone(c.get("k"))
+        c.put("k", {"x": 1})
+        self.assertEqual({"x": 1}, c.get("k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,6 @@ Simply CSV into JSON into DynamoDB
 Author: Peeter Meos, Sigma Research OÜ
 Date: 2. December 2018
 """
-import boto3
 import pandas as pd
 import os.path
 import json
@@ -40,6 +39,7 @@ def write_dynamo(filename: str, tbl: str, inst: str):
     data["inst"] = inst
     data["data"] = json.dumps(data["data"])
 
+    import boto3
     dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
                               endpoint_url="https://dynamodb.us-east-1.amazonaws.com")
     table = dynamodb.Table(tbl)
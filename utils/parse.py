@@ -0,0 +1,78 @@
+"""
+Parsing of TWS instrument strings like "CL FOP (LO) Feb'19 40 CALL @NYMEX"
+into typed columns. Parsed instruments are cached by string, so repeated
+snapshots of the same chain only parse the new instruments.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import pandas as pd
+import numpy as np
+
+
+PATTERN = r"^(?P<Symbol>\S+) (?P<SecType>\S+) \((?P<Class>[^)]*)\) (?P<mon>[A-Za-z]{3})'(?P<yr>\d{2}) " \
+          r"(?P<Strike>[0-9.]+) (?P<Right>CALL|PUT) @(?P<Exchange>\S+)$"
+
+MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+          "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+# Parsed instrument metadata indexed by instrument string
+_cache = pd.DataFrame(columns=["Symbol", "Class", "Side", "Strike", "Contract Month"])
+
+
+def _parse(names: pd.Series) -> pd.DataFrame:
+    """
+    Parses instrument strings with a single vectorised regex
+    :param names: unique instrument strings
+    :return: data frame indexed by instrument string
+    """
+    x = names.str.extract(PATTERN)
+    res = pd.DataFrame(index=names.values)
+    res["Symbol"] = x["Symbol"].values
+    res["Class"] = x["Class"].values
+    res["Side"] = np.where(x["Right"] == "PUT", "p", "c")
+    res["Strike"] = pd.to_numeric(x["Strike"], errors="coerce").values
+    res["Contract Month"] = ((pd.to_numeric(x["yr"], errors="coerce") + 2000) * 100 +
+                             x["mon"].map(MONTHS)).values
+    return res
+
+
+def parse_instruments(names: pd.Series) -> pd.DataFrame:
+    """
+    Extracts symbol, class, side, strike and contract month from instrument strings
+    :param names: series of instrument strings
+    :return: data frame with the index of the names that could be parsed, names not in the expected format
+             are left out. Columns Symbol, Class (category), Side (category, "c" or "p"), Put and Call (int8),
+             Strike (float64), Contract Month (int64 yyyymm)
+    """
+    global _cache
+
+    names = names.astype(str)
+    uniq = pd.Series(names.unique())
+    new = uniq[~uniq.isin(_cache.index)]
+    if len(new) > 0:
+        _cache = pd.concat([_cache, _parse(new)]) if len(_cache) > 0 else _parse(new)
+
+    x = _cache.loc[names.values]
+    ok = (x["Strike"].notna() & x["Contract Month"].notna()).values
+    names = names[ok]
+    x = x[ok]
+
+    res = pd.DataFrame(index=names.index)
+    res["Symbol"] = pd.Categorical(x["Symbol"].values)
+    res["Class"] = pd.Categorical(x["Class"].values)
+    res["Side"] = pd.Categorical(x["Side"].values, categories=["c", "p"])
+    res["Put"] = (x["Side"].values == "p").astype(np.int8)
+    res["Call"] = (x["Side"].values == "c").astype(np.int8)
+    res["Strike"] = x["Strike"].values.astype(np.float64)
+    res["Contract Month"] = x["Contract Month"].values.astype(np.int64)
+    return res
+
+
+def clear_cache():
+    """
+    Empties the parsed instrument cache
+    :return:
+    """
+    global _cache
+    _cache = _cache.iloc[0:0]
@@ -0,0 +1,48 @@
+"""
+Unit testing for instrument string parsing
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from utils import parse
+import pandas as pd
+
+
+class ParseTests(unittest.TestCase):
+    def test_parse(self):
+        parse.clear_cache()
+        s = pd.Series(["CL FOP (LO) Feb'19 40 CALL @NYMEX",
+                       "CL FOP (LO) Mar'19 52.5 PUT @NYMEX",
+                       "CL FOP (LO) Feb'19 40 CALL @NYMEX"], index=[5, 6, 7])
+        df = parse.parse_instruments(s)
+
+        self.assertEqual([5, 6, 7], list(df.index))
+        self.assertEqual(["c", "p", "c"], list(df["Side"]))
+        self.assertEqual([0, 1, 0], list(df["Put"]))
+        self.assertEqual([40.0, 52.5, 40.0], list(df["Strike"]))
+        self.assertEqual([201902, 201903, 201902], list(df["Contract Month"]))
+        self.assertEqual("LO", df["Class"].iloc[1])
+
+    def test_cache(self):
+        parse.clear_cache()
+        parse.parse_instruments(pd.Series(["CL FOP (LO) Feb'19 40 CALL @NYMEX"]))
+        df = parse.parse_instruments(pd.Series(["CL FOP (LO) Feb'19 40 CALL @NYMEX",
+                                                "CL FOP (LO) Dec'19 60 PUT @NYMEX"]))
+
+        self.assertEqual(2, len(parse._cache))
+        self.assertEqual([201902, 201912], list(df["Contract Month"]))
+
+    def test_unmatched(self):
+        parse.clear_cache()
+        df = parse.parse_instruments(pd.Series(["CL FOP (LO) Feb'19 52.55 CALL @NYMEX", "CL FUT Feb'19 @NYMEX",
+                                                "CL FOP (LO) Xyz'19 40 PUT @NYMEX"], index=[3, 4, 5]))
+
+        self.assertEqual([3], list(df.index))
+        self.assertEqual(52.55, df["Strike"].iloc[0])
+        self.assertEqual("float64", df["Strike"].dtype)
+        self.assertEqual("int64", df["Contract Month"].dtype)
+
+
+if __name__ == "__main__":
+    unittest.main()
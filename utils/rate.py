@@ -0,0 +1,66 @@
+"""
+Rate limiting for TWS API messages.
+TWS accepts at most 50 messages per second from a client, exceeding it
+gets the connection dropped.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from threading import Lock
+import time
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, allows bursts up to the bucket size and the given average rate
+    """
+    def __init__(self, rate: float = 45, burst: int = 10):
+        """
+        Constructor, bucket starts full
+        :param rate: tokens added per second
+        :param burst: bucket size
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = Lock()
+
+    def _refill(self):
+        """
+        Adds tokens for the time passed since the last refill
+        :return:
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_acquire(self, n: int = 1) -> bool:
+        """
+        Takes tokens if available
+        :param n: number of tokens
+        :return: True if tokens were taken
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens = self.tokens - n
+                return True
+            return False
+
+    def acquire(self, n: int = 1):
+        """
+        Takes tokens, blocks until they are available
+        :param n: number of tokens
+        :return: seconds waited
+        """
+        waited = 0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens = self.tokens - n
+                    return waited
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+            waited = waited + wait
@@ -0,0 +1,28 @@
+"""
+Unit testing for rate limiting
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from utils.rate import TokenBucket
+import time
+
+
+class RateTests(unittest.TestCase):
+    def test_burst(self):
+        b = TokenBucket(rate=1, burst=3)
+        self.assertTrue(all([b.try_acquire() for i in range(0, 3)]))
+        self.assertFalse(b.try_acquire())
+
+    def test_rate(self):
+        b = TokenBucket(rate=100, burst=5)
+        t = time.monotonic()
+        for i in range(0, 25):
+            b.acquire()
+        # 5 tokens come from the burst, remaining 20 at 100 per second
+        self.assertGreaterEqual(time.monotonic() - t, 0.18)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Local run store for optimiser artefacts.
+Artefacts (snapshots, prepared data, GDX files, solutions, curves) are saved
+once under their content hash, runs are small JSON manifests pointing to them.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+import datetime
+import hashlib
+import pickle
+import json
+import os
+
+
+class RunStore:
+    """
+    Content addressed artefact store with run manifests
+    """
+    def __init__(self, path: str = "./runs/"):
+        """
+        Constructor, creates the directory structure if necessary
+        :param path: root directory of the store
+        """
+        self.path = path
+        self.obj_path = os.path.join(path, "objects")
+        self.run_path = os.path.join(path, "runs")
+        os.makedirs(self.obj_path, exist_ok=True)
+        os.makedirs(self.run_path, exist_ok=True)
+
+    def _obj_file(self, key: str) -> str:
+        """
+        Path of the artefact file
+        :param key: content hash
+        :return:
+        """
+        return os.path.join(self.obj_path, key[:2], key)
+
+    def put_bytes(self, b: bytes) -> str:
+        """
+        Saves raw artefact, identical content is stored only once
+        :param b: content
+        :return: content hash
+        """
+        key = hashlib.sha256(b).hexdigest()
+        fn = self._obj_file(key)
+        if not os.path.isfile(fn):
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            with open(fn + ".tmp", "wb") as f:
+                f.write(b)
+            os.replace(fn + ".tmp", fn)
+        return key
+
+    def get_bytes(self, key: str) -> bytes:
+        """
+        Reads raw artefact
+        :param key: content hash
+        :return: content
+        """
+        with open(self._obj_file(key), "rb") as f:
+            return f.read()
+
+    def put(self, obj) -> str:
+        """
+        Saves a python object (data frame, dict of results, etc.)
+        :param obj: object to be stored
+        :return: content hash
+        """
+        return self.put_bytes(pickle.dumps(obj, protocol=4))
+
+    def get(self, key: str):
+        """
+        Loads a python object
+        :param key: content hash
+        :return: stored object
+        """
+        return pickle.loads(self.get_bytes(key))
+
+    def put_file(self, fn: str) -> str:
+        """
+        Saves a file, for instance GDX
+        :param fn: filename
+        :return: content hash
+        """
+        with open(fn, "rb") as f:
+            return self.put_bytes(f.read())
+
+    def get_file(self, key: str, fn: str):
+        """
+        Writes stored artefact to a file
+        :param key: content hash
+        :param fn: target filename
+        :return:
+        """
+        with open(fn, "wb") as f:
+            f.write(self.get_bytes(key))
+
+    def save_run(self, run: dict) -> dict:
+        """
+        Saves the run manifest, new runs get an id based on the creation time
+        :param run: dict with at least "artefacts" dict of stage name and content hash
+        :return: saved manifest
+        """
+        if "id" not in run:
+            now = datetime.datetime.now()
+            run["id"] = now.strftime("%y%m%d%H%M%S%f")[:-3]
+            run["created"] = now.strftime("%Y-%m-%d %H:%M:%S")
+
+        fn = os.path.join(self.run_path, run["id"] + ".json")
+        with open(fn + ".tmp", "w") as f:
+            json.dump(run, f, default=str)
+        os.replace(fn + ".tmp", fn)
+        return run
+
+    def load_run(self, run_id: str = None) -> dict:
+        """
+        Loads run manifest
+        :param run_id: run id, latest run if None
+        :return: manifest dict
+        """
+        if run_id is None:
+            runs = self.list_runs()
+            if len(runs) == 0:
+                raise FileNotFoundError("No runs in store " + self.path)
+            return runs[-1]
+
+        with open(os.path.join(self.run_path, run_id + ".json"), "r") as f:
+            return json.load(f)
+
+    def list_runs(self) -> list:
+        """
+        Lists all runs in the store
+        :return: list of manifests, oldest first
+        """
+        res = []
+        for fn in sorted(os.listdir(self.run_path)):
+            if fn.endswith(".json"):
+                with open(os.path.join(self.run_path, fn), "r") as f:
+                    res.append(json.load(f))
+        return res
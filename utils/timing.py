@@ -0,0 +1,166 @@
+"""
+Timing and resource instrumentation for pipeline stages.
+Records wall time, CPU time, peak memory and optional row counts
+and solver statistics per stage, optionally with cProfile output.
+
+Author: Peeter Meos, Sigma Research OÜ
+Date: 18. October 2026
+"""
+from contextlib import contextmanager
+from threading import Lock
+import functools
+import datetime
+import cProfile
+import json
+import time
+import sys
+import os
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Only one cProfile profiler can be active in the process, nested stages and other threads time only
+_profiling = Lock()
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process so far
+    :return: peak RSS in megabytes, None if not available on this platform
+    """
+    if resource is None:
+        return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return r / 1024 / 1024
+    return r / 1024
+
+
+class StageTimer:
+    """
+    Collects timing records for named stages
+    """
+    def __init__(self, logger=None, profile_dir: str = None):
+        """
+        Constructor
+        :param logger: logger for stage timings, nothing is logged if None
+        :param profile_dir: if given, cProfile output for each outermost stage is written there
+        """
+        self.logger = logger
+        self.profile_dir = profile_dir
+        self.records = []
+        self.lock = Lock()
+
+    def reset(self):
+        """
+        Clears the records, for instance before the next run
+        :return:
+        """
+        with self.lock:
+            self.records = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Times a stage, the yielded dict can be used to attach additional data to the record.
+        Peak RSS is the peak of the process up to the end of the stage. With profiling on, a stage is
+        profiled only when no other profiler is active, so inner stages are part of the outer profile.
+        :param name: stage name
+        :return:
+        """
+        rec = {"stage": name}
+        prof = None
+        if self.profile_dir is not None and _profiling.acquire(blocking=False):
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                # Another profiling tool, ie. a debugger, is active
+                _profiling.release()
+                prof = None
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield rec
+        finally:
+            rec["wall"] = time.perf_counter() - wall
+            rec["cpu"] = time.process_time() - cpu
+            rec["peak_rss"] = peak_rss()
+
+            if prof is not None:
+                prof.disable()
+                _profiling.release()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                prof.dump_stats(os.path.join(self.profile_dir, name.replace(" ", "_") + ".prof"))
+
+            with self.lock:
+                self.records.append(rec)
+            if self.logger is not None:
+                self.logger.verbose("Stage " + name + " took " + "{:.3f}".format(rec["wall"]) + "s wall, " +
+                                    "{:.3f}".format(rec["cpu"]) + "s CPU")
+
+    def annotate(self, name: str, **kwargs):
+        """
+        Adds data to the latest record of a stage, for example solver statistics after import
+        :param name: stage name
+        :param kwargs: values to be added
+        :return:
+        """
+        with self.lock:
+            for rec in reversed(self.records):
+                if rec["stage"] == name:
+                    rec.update(kwargs)
+                    return
+
+    def to_dict(self) -> dict:
+        """
+        Returns timing data as dict
+        :return:
+        """
+        with self.lock:
+            return {"time": datetime.datetime.now().strftime("%y%m%d%H%M%S"),
+                    "stages": [dict(item) for item in self.records]}
+
+    def to_json(self) -> str:
+        """
+        Returns timing data as JSON string
+        :return:
+        """
+        return json.dumps(self.to_dict(), default=str)
+
+    def save(self, fn: str):
+        """
+        Appends timing record as a single JSON line to a file
+        :param fn: filename
+        :return:
+        """
+        d = os.path.dirname(fn)
+        if d != "":
+            os.makedirs(d, exist_ok=True)
+        with open(fn, "a") as f:
+            f.write(self.to_json() + "\n")
+
+
+def timed(name: str):
+    """
+    Decorator that times a method of an object having a StageTimer in self.timer.
+    Row count of self.df is recorded after the stage, if present.
+    :param name: stage name
+    :return:
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.stage(name) as rec:
+                res = f(self, *args, **kwargs)
+                df = getattr(self, "df", None)
+                if hasattr(df, "shape"):
+                    rec["rows"] = df.shape[0]
+            return res
+        return wrapper
+    return decorator
@@ -0,0 +1,35 @@
+"""
+Unit testing for stage timing
+
+Author: Peeter Meos
+Date: 18. October 2026
+"""
+import unittest
+from utils.timing import StageTimer
+import tempfile
+import os
+
+
+class TimingTests(unittest.TestCase):
+    def test_nested_profile(self):
+        d = tempfile.mkdtemp()
+        t = StageTimer(profile_dir=d)
+        with t.stage("prepare"):
+            with t.stage("iv fit"):
+                sum(range(1000))
+            with t.stage("margins"):
+                sum(range(1000))
+
+        # Inner stages are timed, only the outermost one is profiled
+        self.assertEqual(["iv fit", "margins", "prepare"], [r["stage"] for r in t.records])
+        self.assertEqual(["prepare.prof"], os.listdir(d))
+        self.assertTrue(all([r["wall"] >= 0 and r["cpu"] >= 0 for r in t.records]))
+
+        # Profiler is free for the next stage
+        with t.stage("solve"):
+            pass
+        self.assertEqual(["prepare.prof", "solve.prof"], sorted(os.listdir(d)))
+
+
+if __name__ == "__main__":
+    unittest.main()